@@ -1,8 +1,7 @@
-import pyglet
-import tools.pyglet as graphics
 import tools.design as design
 import tools.math as wmath
 import tools.misc as utilities
+from tools.misc.ltl import P, T, between
 import numpy as np
 
 class TwoStoppedCars(design.Environment):
@@ -36,37 +35,40 @@ class TwoStoppedCars(design.Environment):
 
     def __init__(self, discrete = False):
 
-        # Draw canvas
+        # Build world
         static_elements = [
             ['Grass'],
             ['TwoLaneRoad', -50, +50, -5, +5, 0.5],
         ]
         agents = [
-            ['Ego', lambda: -45 + np.random.rand() * 10, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
-            ['Veh', lambda: -15 + np.random.rand() * 10, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
-            ['Veh', lambda: +15 + np.random.rand() * 10, -2.5, 0.0, wmath.Direction2D(mode = '+x')]
+            ['Ego', lambda rng: -45 + rng.random() * 10, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+            ['Veh', lambda rng: -15 + rng.random() * 10, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+            ['Veh', lambda rng: +15 + rng.random() * 10, -2.5, 0.0, wmath.Direction2D(mode = '+x')]
         ]
-        canvas = graphics.Canvas(600, 600,
+        world = design.World(600, 600,
             static_elements, agents,
             ox = 300, oy = 300, scale = 600/100)
         default_policy = lambda c: [0, 0]
-        super().__init__(canvas, default_policy, discrete = discrete)
+        # Stopped cars do not look at other agents: stepping all agents
+        # at once (simultaneous) gives the same dynamics, in one call
+        super().__init__(world, default_policy, discrete = discrete,
+            simultaneous = True)
 
         # Reward structure
         d = {
             "mid_lane": -2.5,
-            "car1": lambda p, t: p['v'][1],
-            "car2": lambda p, t: p['v'][2],
-            "deviation_mid_lane": lambda p, t: abs(p['mid_lane']-p['ego'].f['y']),
-            "moving_horizontally": lambda p, t: -5 <= p['ego'].f['y'] <= 5,
+            "car1": P['v'][1],
+            "car2": P['v'][2],
+            "deviation_mid_lane": abs(P['mid_lane']-P['ego'].f['y']),
+            "moving_horizontally": between(P['ego'].f['y'], -5, 5),
         }
         p = {
-            "stopped": lambda p, t: t > 0 and p['ego'].f['v'] == 0,
-            "out_of_bounds": lambda p, t: (not p['ego'].any_regions()) or (not p['moving_horizontally']),
-            "past_car_a": lambda p, t: p['ego'].f['x'] > p['car1'].f['x'] + 10,
-            "past_car_b": lambda p, t: p['ego'].f['x'] > p['car2'].f['x'] + 10,
-            "collided_a": lambda p, t: p['ego'].Lp(p['car1'].f['x'], p['car1'].f['y']) <= 3.0,
-            "collided_b": lambda p, t: p['ego'].Lp(p['car2'].f['x'], p['car2'].f['y']) <= 3.0,
+            "stopped": (T > 0) & (P['ego'].f['v'] == 0),
+            "out_of_bounds": ~P['ego'].any_regions() | ~P['moving_horizontally'],
+            "past_car_a": P['ego'].f['x'] > P['car1'].f['x'] + 10,
+            "past_car_b": P['ego'].f['x'] > P['car2'].f['x'] + 10,
+            "collided_a": P['ego'].Lp(P['car1'].f['x'], P['car1'].f['y']) <= 3.0,
+            "collided_b": P['ego'].Lp(P['car2'].f['x'], P['car2'].f['y']) <= 3.0,
         }
         # Reward of -1.0 every step
         # When finished, +150, since we should be able to solve in < 150 steps for sure
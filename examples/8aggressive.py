@@ -1,6 +1,4 @@
 import os, sys; sys.path += ["."]
-import pyglet
-import tools.pyglet as graphics
 import tools.design as design
 import tools.math as wmath
 import tools.misc as misc
@@ -28,12 +26,12 @@ agents = [
     ['Veh', -2.5, +15, 0.0, wmath.Direction2D(mode = '-y')],
 ]
 
-canvas = graphics.Canvas(600, 600,
+world = design.World(600, 600,
     static_elements, agents,
     ox = 300, oy = 300, scale = 600/100
 )
 default_policy = lambda agent: agent.aggressive_driving()
-env = design.Environment(canvas, default_policy)
+env = design.Environment(world, default_policy)
 ego = env.agents[env.ego_id]
 
 # Empty reward structure
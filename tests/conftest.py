@@ -0,0 +1,56 @@
+import pytest
+import tools.design as design
+import tools.math as wmath
+
+# Worlds the tests are built on: 100 x 100 m around the origin, drawn
+# at 600 x 600 pixels. The fixtures give a function building a new
+# world, since tests often need several (or one per parameter)
+
+ROAD = [
+    ['TwoLaneRoad', -50, +50, -5, +5, 0.5],
+]
+
+CROSSING = [
+    ['TwoLaneRoad', -50, -5, -5, +5, 0.5],
+    ['TwoLaneRoad', +5, +50, -5, +5, 0.5],
+    ['TwoLaneRoad', -5, +5, -50, -5, 0.5],
+    ['TwoLaneRoad', -5, +5, +5, +50, 0.5],
+    ['Intersection', -5, +5, -5, +5],
+]
+
+STOP_REGIONS = [
+    ['StopRegionX', -10, -5, -5, 0],
+    ['StopRegionX', +5, +10, 0, +5],
+    ['StopRegionY', -5, 0, +5, +10],
+    ['StopRegionY', 0, +5, -10, -5],
+]
+
+def build_world(static_elements, agents):
+    return design.World(600, 600, static_elements, agents,
+        ox = 300, oy = 300, scale = 600/100)
+
+# One road along x; by default ego and a car ahead, in the lower lane
+# road_world() => World
+# road_world(agents, grass = False, static_elements = [...]) => World
+@pytest.fixture
+def road_world():
+    def make(agents = None, grass = True, static_elements = ()):
+        if agents is None:
+            agents = [
+                ['Ego', -45, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+                ['Veh', -15, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+            ]
+        grass = [['Grass']] if grass else []
+        return build_world(grass + ROAD + list(static_elements), agents)
+    return make
+
+# Four roads meeting at an intersection (with a stop region before it
+# on each lane if stop_regions)
+# crossing_world(agents, stop_regions = True) => World
+@pytest.fixture
+def crossing_world():
+    def make(agents, stop_regions = False):
+        static_elements = [['Grass']] + CROSSING
+        if stop_regions: static_elements += STOP_REGIONS
+        return build_world(static_elements, agents)
+    return make
@@ -0,0 +1,57 @@
+import numpy as np
+import craft
+from tools.design import VectorEnvironment, BatchedRewardStructure
+
+def test_batched_rewards_match():
+    n = 4
+    np.random.seed(0)
+    venv = VectorEnvironment(craft.TwoStoppedCars, n)
+    venv.reset()
+    np.random.seed(0)
+    bvenv = VectorEnvironment(craft.TwoStoppedCars, n, batched_rewards = True)
+    bvenv.reset()
+    rng = np.random.RandomState(0)
+    for _ in range(100):
+        actions = np.stack([rng.uniform(-2, 2, n), rng.uniform(-0.3, 0.3, n)], 1)
+        state = np.random.get_state()
+        obs, reward, done, info = venv.step(actions)
+        np.random.set_state(state)
+        bobs, breward, bdone, binfo = bvenv.step(actions)
+        assert(np.array_equal(obs, bobs))
+        assert(list(reward) == list(breward))
+        assert(list(done) == list(bdone))
+        for i, bi in zip(info, binfo):
+            i.pop('terminal_observation', None)
+            bi.pop('terminal_observation', None)
+            assert(i == bi)
+        # every copy's properties end up as if stepped on their own
+        for env, benv in zip(venv.envs, bvenv.envs):
+            properties = [[(q.mc_status, q.status, q.monitor.save()) \
+                for q in getattr(e.reward_structure, g).properties] \
+                for e in [env, benv] for g in ['r', 't', 's']]
+            assert(properties[:3] == properties[3:])
+            assert(env.snapshot().tobytes() == benv.snapshot().tobytes())
+    lifted = bvenv.rewards.lifted
+    assert(('d', 'deviation_mid_lane') in lifted and ('p', 'collided_a') in lifted)
+    assert(('p', 'out_of_bounds') in lifted)
+
+def test_batched_fallback():
+    envs = [craft.NoStoppedCar() for _ in range(3)]
+    for env in envs:
+        env.reset()
+        env.agents[0].f['v'] = 1.0
+    # a closure over something different in each copy is never lifted
+    for k, env in enumerate(envs):
+        env.reward_structure.r._r['true'] = lambda p, t, k=[k]: k[0]
+    # `not` on arrays raises, so this one is evaluated per copy
+    for env in envs:
+        env.reward_structure._p._p['stopped'] = lambda p, t: not p['ego'].f['v'] > 0
+    batch = BatchedRewardStructure(envs)
+    assert(('r', 'true') not in batch.liftable)
+    masks, rewards, dones, infos = batch.step()
+    assert(list(rewards) == [0, 1, 2])
+    assert(all([info['mode'] == 'reward' for info in infos]))
+    assert(list(masks) == [int(env.reward_structure._p) for env in envs])
+    assert(all([env.reward_structure._p.t == 1 for env in envs]))
+    assert(('p', 'stopped') not in batch.lifted)
+    assert(('p', 'near_goal') in batch.lifted)
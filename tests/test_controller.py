@@ -0,0 +1,51 @@
+import pytest
+from tools.design import Controller, DefaultController, ComplexController
+
+def construct_controller(calls):
+    def record(key, value):
+        calls.append(key)
+        return value
+    return ComplexController(
+        predicates = dict(
+            a = lambda p: record('a', 1),
+            b = lambda p: record('b', p['a'] + 1),
+            c = [lambda p: p['a'] > 5, lambda p: record('c', 0)],
+            effect = lambda p: record('effect', None), # read by nobody
+        ),
+        multipliers = dict(
+            m = lambda p: record('m', p['b'] * 10),
+        ),
+        controllers = [
+            Controller(lambda p: 'c' in p, lambda p, m: (0, 0), name = 'C'),
+            Controller(lambda p: p['b'] == 2, lambda p, m: (m['m'], 0), name = 'B'),
+            DefaultController(lambda p, m: (-1, 0), name = 'Default'),
+        ],
+    )
+
+def test_complex_controller_lazy():
+    calls = []
+    controller = construct_controller(calls)
+    assert(controller.control() == (20, 0))
+    # every entry at most once; unread entries still run, in order
+    assert(calls == ['effect', 'a', 'b', 'm'])
+    calls.clear()
+    assert(controller.control() == (20, 0))
+    assert(sorted(calls) == ['a', 'b', 'effect', 'm'])
+
+def test_complex_controller_matches_sequential():
+    calls = []
+    controller = construct_controller(calls)
+    p, m = controller.plan.evaluate()
+    ep = controller.sequential_evaluate(controller.predicates)
+    em = controller.sequential_evaluate(controller.multipliers, ep)
+    for key in controller.predicates:
+        assert((key in p) == (key in ep))
+        if key in ep: assert(p[key] == ep[key])
+    assert(m['m'] == em['m'])
+    with pytest.raises(KeyError): m['a'] # multipliers only
+    with pytest.raises(KeyError): p['m'] # predicates only
+
+def test_complex_controller_collision():
+    with pytest.raises(AssertionError):
+        ComplexController(dict(a = lambda p: 1), dict(a = lambda p: 2),
+            [DefaultController(lambda p, m: (0, 0), name = 'Default')])
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from tools.design import Environment
+import tools.math as wmath
+
+# Three moving cars on the road, all stepped with method
+@pytest.fixture
+def construct_world(road_world):
+    def make(method):
+        agents = [
+            ['Ego', -45, -2.5, 5.0, wmath.Direction2D(mode = '+x')],
+            ['Veh', -15, -2.5, 3.0, wmath.Direction2D(mode = '+x')],
+            ['Veh', +15, +2.5, 4.0, wmath.Direction2D(mode = '-x')],
+        ]
+        world = road_world(agents, grass = False)
+        for agent in world.agents:
+            agent.method = method
+        return world
+    return make
+
+def test_features_are_views(construct_world):
+    world = construct_world('kinematic_bicycle_Euler')
+    ego = world.agents[0]
+    ego.f['x'] = 1.5
+    assert(world.dynamics.x[0] == 1.5)
+    world.dynamics.v[0] = 7.0
+    assert(ego.f['v'] == 7.0)
+
+@pytest.mark.parametrize('method', ['kinematic_bicycle_RK4',
+    'kinematic_bicycle_Euler', 'point_mass_Euler'])
+def test_batched_matches_single(construct_world, method):
+    u = [[1.0, 0.5], [-3.0, -0.2], [0.5, 2.0]]
+    batched, single = construct_world(method), construct_world(method)
+    for _ in range(20):
+        batched.dynamics.step(u)
+        for agent, ui in zip(single.agents, u):
+            agent.step(ui)
+    assert(np.array_equal(batched.dynamics.data, single.dynamics.data))
+
+def test_point_mass_euler(construct_world):
+    world = construct_world('point_mass_Euler')
+    world.dynamics.step([[0.0, 0.0], [-2.0, 0.0], [3.0, 0.0]])
+    ego, car1, car2 = world.agents
+    assert(ego.f['x'] == -45 + 0.5 and ego.f['y'] == -2.5)
+    assert(round(car1.f['v'], 6) == 2.8)
+    assert(car2.f['x'] == 15 - 0.4 and car2.f['acc'] == 2.0) # clipped
+    for _ in range(50):
+        world.dynamics.step([[-2.0, 0.0]] * 3)
+    assert(np.all(world.dynamics.v == 0))
+
+def test_partial_rows(construct_world):
+    world = construct_world('kinematic_bicycle_RK4')
+    before = world.dynamics.data.copy()
+    world.dynamics.step([[1.0, 0.0]], rows = [1])
+    changed = np.any(world.dynamics.data != before, axis = 0)
+    assert(list(changed) == [False, True, False])
+
+def test_step_order(construct_world):
+    for simultaneous in [False, True]:
+        world = construct_world('point_mass_Euler')
+        seen = []
+        def policy(car):
+            seen.append(world.dynamics.x.tolist())
+            return [1.0, 0.0]
+        env = Environment(world, policy, simultaneous = simultaneous)
+        env.specify_state(lambda agent, rs: {}, lambda agent, rs: {})
+        env.make_ready()
+        before = world.dynamics.x.tolist()
+        env.step([2.0, 0.0])
+        after = world.dynamics.x.tolist()
+        if simultaneous: # every policy sees the state before the step
+            assert(seen == [before, before])
+        else: # ego first, then the others in order
+            assert(seen == [after[:1] + before[1:], after[:2] + before[2:]])
@@ -0,0 +1,39 @@
+import numpy as np
+import craft
+from tools.design import EpisodeReader
+
+def test_episodes_roundtrip(tmp_path):
+    directory = str(tmp_path / 'run')
+    env = craft.NoStoppedCar(discrete = True)
+    env.reset()
+    env.start_episode_recording(directory, chunk_size = 2)
+    rewards, modes, features, aps = [], [], [], []
+    # full brake until stopped (terminates), then a few steps more
+    done = False
+    while not done:
+        _, reward, done, info = env.step([12])
+        rewards += [reward]
+        modes += [info.get('mode')]
+        features += [env.world.dynamics.data.copy()]
+        aps += [int(env.reward_structure._p)]
+    env.reset()
+    for _ in range(3):
+        env.step([4])
+    steps = len(rewards) + 3
+    # only flushed rows are visible
+    assert(len(EpisodeReader(directory)) <= steps)
+    assert(env.stop_episode_recording() == steps)
+
+    reader = EpisodeReader(directory)
+    assert(len(reader) == steps)
+    assert(len(reader.shards('reward')) == (steps+1) // 2 > 1)
+    assert(isinstance(reader.shards('reward')[0], np.memmap))
+    assert(reader['features'].shape == (steps, 7, env.num_agents))
+    assert(np.array_equal(reader['features'][:len(features)], np.stack(features)))
+    assert(reader['reward'][:len(rewards)].tolist() == rewards)
+    assert(reader['ap'][:len(aps)].tolist() == aps)
+    assert(reader['action'].shape == (steps, 2))
+    assert(reader['done'][len(rewards)-1])
+    assert([reader.modes[m] if m >= 0 else None \
+        for m in reader['mode'][:len(modes)]] == modes)
+    assert(reader.episodes() == [(0, len(rewards)), (len(rewards), steps)])
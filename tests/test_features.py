@@ -1,3 +1,5 @@
+import numpy as np
+import pytest
 from tools.design import Feature, Features
 
 def test_feature_simple():
@@ -15,4 +17,29 @@ def test_features_simple():
     assert(f.o['b'].name == 'b') # o = objects
     f['d'] = 2.20
     assert(f.o['d'] == 'd:2.2')
-    assert(round(f['a']-f['b'], 1) == 0.2)
\ No newline at end of file
+    assert(round(f['a']-f['b'], 1) == 0.2)
+
+def test_features_array():
+    f = Features({'x': 1.0, 'v': 2, 'on': True})
+    assert(f.numpy().dtype == np.float32 and f.numpy() is not f.numpy())
+    assert(list(f.numpy()) == [1.0, 2.0, 1.0])
+    assert(f.get_dict() == {'x': 1.0, 'v': 2, 'on': True})
+    assert([type(v) for v in f.get_dict().values()] == [float, int, bool])
+    f['on'], f['v'] = 0.0, 2.5
+    assert(f.get_dict()['on'] is False and f.get_dict()['v'] == 2.5)
+    f = Features({'x': 1.0, 'v': 2})
+    assert(f.x == 1.0 and f.v == 2)
+    f.x = 3.5
+    assert(f['x'] == 3.5 and f.o['x'].value == 3.5)
+    f.o['v'].value = 4
+    assert(f.data[1] == 4)
+    assert(f.get_dict() == {'x': 3.5, 'v': 4})
+    f['y'] = 1.5 # grows, same Feature objects
+    x = f.o['x']
+    assert(list(f.data) == [3.5, 4.0, 1.5] and x.value == 3.5)
+    data = np.zeros(3)
+    f.bind(data)
+    f.y = 2.5
+    assert(f.data is data and data[2] == 2.5 and x.value == 3.5)
+    with pytest.raises(AssertionError):
+        f['z'] = 0.0 # fixed layout
@@ -1,5 +1,9 @@
 from tools.misc.ltl import Bits, AP, SeqAP, SeqPredicates, \
-    LTLProperty, Parser, Scanner, LTLProperties
+    LTLProperty, Parser, Scanner, LTLProperties, CompiledProperty, Monitor, \
+    compile_property, check_traces, P, T, where, between, compile_expression, \
+    dependencies
+import numpy as np
+import pytest
 
 # T1 <= t <= T2
 def construct_trace(propositions, T1, T2):
@@ -366,4 +370,116 @@ def test_ltl_sequential_simple():
 
     check_ltl_properties(propositions, properties, maxT,
         expected_rewards, expected_num_violations, expected_num_satisfactions,
-        debug = False, sequential = True, objs = objs)
\ No newline at end of file
+        debug = False, sequential = True, objs = objs)
+# Compiled monitors give the same verdicts as the parser, step by step
+def test_monitor_matches_parser():
+    props = ["A", "B", "C"]
+    APdict = {key: i for i, key in enumerate(props)}
+    formulas = ["A", "A and not B", "A => B or C", "A U B", "(A or C) U B",
+        "F A", "G (A => B)", "X A", "F (A and (B U C))", "G (A U B)",
+        "not (F B) or C", "X ((A U B) and (G C))"]
+    trace = [5, 1, 3, 2, 6, 4, 7, 0, 1, 2, 4, 3]
+    for f in formulas:
+        monitor = Monitor(CompiledProperty(f, APdict))
+        for start in range(len(trace)):
+            p, _ = construct_parser_and_bits(props, f)
+            monitor.reset()
+            for state in trace[start:]:
+                assert(p.CheckIncremental(state) == monitor.check_incremental(state))
+        p, _ = construct_parser_and_bits(props, f)
+        assert(p.Check(trace) == monitor.check(trace))
+
+# Same formula and APs share one compiled property, not the runtime state
+def test_compiled_property_cache():
+    propositions = {"a": lambda t: t >= 2, "b": lambda t: t >= 4}
+    p1 = LTLProperty("a U b", 1, propositions)
+    p2 = LTLProperty("a U b", 1, propositions)
+    assert(p1.monitor.compiled is p2.monitor.compiled)
+    assert(p1.monitor is not p2.monitor)
+    p3 = LTLProperty("a U b", 1, {"b": None, "a": None})
+    assert(p3.monitor.compiled is not p1.monitor.compiled)
+    assert(compile_property("a U b", {"b": 1, "a": 0}) is p1.monitor.compiled)
+    p1.reset(); p2.reset()
+    assert(p1.check_incremental(1) == Parser.TRUE)
+    assert(p2.check_incremental(0) == Parser.FALSE)
+
+# Bulk checks agree with one monitor run per episode, vectorized or not
+def test_check_traces():
+    APdict = {"A": 0, "B": 1, "C": 2}
+    formulas = ["A and not B", "A U B", "F (A and C)", "G (A or B)", "X C",
+        "true", "(A U B) and C", "G (F A)", "F (A U B)"]
+    rng = np.random.RandomState(0)
+    traces = rng.randint(0, 8, size = (50, 12))
+    lengths = rng.randint(0, 13, size = 50)
+    steps, verdicts = check_traces(traces, formulas, APdict, lengths)
+    assert(steps.shape == verdicts.shape == (50, len(formulas)))
+    for i, f in enumerate(formulas):
+        monitor = Monitor(CompiledProperty(f, APdict))
+        for e in range(50):
+            monitor.reset()
+            step, verdict = -1, Parser.UNDECIDED
+            for t in range(lengths[e]):
+                verdict = monitor.check_incremental(int(traces[e, t]))
+                if verdict != Parser.UNDECIDED:
+                    step = t
+                    break
+            assert(steps[e, i] == step and verdicts[e, i] == verdict)
+    # traces without timesteps are undecided
+    steps, verdicts = check_traces(np.zeros((3, 0)), formulas, APdict)
+    assert(np.all(steps == -1) and np.all(verdicts == Parser.UNDECIDED))
+
+def test_expression():
+    class F: pass
+    class Z:
+        def __init__(self, x):
+            self.f = F()
+            self.f.data = np.array([x])
+            self.calls = 0
+        def dist(self, y):
+            self.calls += 1
+            return abs(self.f.data[0] - y)
+    z = Z(3.0)
+    objs = {'z': z, 'k': 2.0}
+    definitions = {
+        "a": P['z'].f.data[0] * P['k'] + T,
+        "b": where(P['a'] > 7, P['a'], -P['a']),
+        "c": lambda p, t: p['b'] / 2,
+    }
+    assert(dependencies(definitions) == {"a": {'z', 'k'}, "b": {'a'}, "c": None})
+    d = SeqPredicates(definitions, objs)
+    assert(d.get_dict() == {"a": 6.0, "b": -6.0, "c": -3.0})
+    propositions = {
+        "A": between(P['a'], 5, 6) & ~(T > 0),
+        "B": P['z'].dist(P['k']) <= 1,
+        "C": ~P['A'] | P['B'],
+    }
+    ap = SeqAP(propositions, objs, d)
+    assert(ap.get_dict() == {"A": 1, "B": 1, "C": 1})
+    d.step()
+    ap.step()
+    assert(d.get_dict() == {"a": 7.0, "b": -7.0, "c": -3.5})
+    assert(ap.get_dict() == {"A": 0, "B": 1, "C": 1})
+    # the method call is skipped while its inputs (z's features, k)
+    # do not change
+    assert(z.calls == 1)
+    z.f.data[0] = 4.0
+    d.step()
+    ap.step()
+    assert(z.calls == 2 and ap.get_dict()["B"] == 0)
+    # structurally equal expressions share one kernel, which also
+    # evaluates arrays
+    assert(compile_expression(P['a'] + 1) is compile_expression(P['a'] + 1))
+    kernel = compile_expression(between(P['a'], 5, 6) & ~(T > 0))
+    assert(list(kernel({'a': np.array([4.0, 5.0, 6.5])}, 0)) == [False, True, False])
+    # arrays are not compared by repr (which elides large ones): no
+    # shared kernel; slices are keys too
+    a, b = np.zeros(2000), np.zeros(2000)
+    b[1000] = 5.0
+    ka, kb = compile_expression(P['x'] + a), compile_expression(P['x'] + b)
+    assert(ka is not kb and kb({'x': 1.0}, 0)[1000] == 6.0)
+    assert(compile_expression(P['v'][1:3]) is compile_expression(P['v'][1:3]))
+    assert(compile_expression(P['v'][1:3]) is not compile_expression(P['v'][1:4]))
+    assert(list(compile_expression(P['v'][1:3])({'v': [0, 1, 2, 3]}, 0)) == [1, 2])
+    # reading a definition before it is evaluated
+    with pytest.raises(AssertionError):
+        SeqPredicates({"a": P['b'], "b": 1.0})
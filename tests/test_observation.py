@@ -0,0 +1,58 @@
+import numpy as np
+import craft
+import tools.design as design
+import tools.misc as utilities
+
+def test_layout_matches_dict_to_numpy():
+    np.random.seed(0)
+    for make_env in [craft.NoStoppedCar, craft.OneStoppedCar, craft.TwoStoppedCars,
+        craft.ThreeStoppedCarsSSO]:
+        env = make_env()
+        assert(env.layout.generic == []) # fully compiled
+        obs = env.reset()
+        for step in range(20):
+            expected = utilities.dict_to_numpy(env.state_dict())
+            assert(obs.dtype == expected.dtype)
+            assert(np.array_equal(obs, expected))
+            obs, reward, done, info = env.step(env.action_space.sample())
+            if done: obs = env.reset()
+
+def test_layout_fallback_and_padding(road_world):
+    env = design.Environment(road_world(), lambda c: [1.0, 0], zero_pad = 3)
+    env.reward_structure({}, {"fast": lambda p, t: p['ego'].f['v'] > 1}, [], [], [])
+    ego_fn = lambda agent, rs: {"f": agent.f.get_dict(), "p": rs._p.get_dict(),
+        "nothing": None, "empty": {}}
+    other_fn = lambda agent, rs: {"speed": agent.f['v'] * 2} # not traceable
+    env.specify_state(ego_fn, other_fn)
+    env.make_ready()
+    assert([aid for aid, _, _ in env.layout.generic] == [1])
+    obs = env.reset()
+    for step in range(15):
+        assert(np.array_equal(obs, utilities.dict_to_numpy(env.state_dict())))
+        obs, reward, done, info = env.step([2.0, 0.0])
+    assert(list(obs[-3:]) == [0.0, 0.0, 0.0])
+    view = env.state(copy = False)
+    assert(view is env.state(copy = False))
+    assert(env.state() is not view)
+
+def test_layout_values_from_the_environment():
+    # steps_taken changes every step: not a constant, even though it is
+    # a plain float when the layout is compiled
+    class Counted(craft.OneStoppedCar):
+        steps_taken = 0
+        def specify_state(self, ego_fn, other_fn):
+            env = self
+            def counted_fn(agent, rs):
+                return {"f": agent.f.get_dict(), "steps": float(env.steps_taken),
+                    "flag": -1}
+            super().specify_state(counted_fn, other_fn)
+        def step(self, action):
+            self.steps_taken += 1
+            return super().step(action)
+    env = Counted()
+    assert([aid for aid, _, _ in env.layout.generic] == [env.ego_id])
+    obs = env.reset()
+    for step in range(1, 6):
+        obs, reward, done, info = env.step(env.action_space.sample())
+        assert(np.array_equal(obs, utilities.dict_to_numpy(env.state_dict())))
+        assert(obs[-2] == step)
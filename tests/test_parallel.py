@@ -0,0 +1,34 @@
+import numpy as np
+import craft
+from tools.design import ParallelEnvironment
+
+def test_parallel_step_and_auto_reset():
+    penv = ParallelEnvironment(lambda: craft.NoStoppedCar(discrete = True), 4,
+        num_workers = 2)
+    try:
+        obs = penv.reset()
+        assert(obs.shape == (4,) + penv.observation_space.shape)
+        # full brake (stopped => terminates) in envs 0, 2
+        obs, reward, done, info = penv.step(np.array([12, 4, 12, 4]))
+        assert(list(done) == [True, False, True, False])
+        assert(info[0]['mode'] == 'termination')
+        assert(info[1]['mode'] == 'reward')
+        assert(info[2]['terminal_observation'].shape == obs.shape[1:])
+        assert(reward[0] == reward[2] == -100)
+        # done envs are already reset: ego is moving again
+        obs, reward, done, info = penv.step(np.array([4, 4, 4, 4]))
+        assert(not np.any(done))
+    finally:
+        penv.close()
+
+def test_parallel_ring_views():
+    penv = ParallelEnvironment(craft.OneStoppedCar, 2, num_workers = 2, slots = 2)
+    try:
+        penv.reset()
+        obs1, _, _, _ = penv.step([[1.0, 0.0], [1.0, 0.0]])
+        first = obs1.copy()
+        obs2, _, _, _ = penv.step([[1.0, 0.0], [1.0, 0.0]])
+        assert(np.array_equal(obs1, first)) # previous slot untouched
+        assert(not np.array_equal(obs1, obs2))
+    finally:
+        penv.close()
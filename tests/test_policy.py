@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import tools.design as design
+import tools.math as wmath
+
+# Environment on a crossing with stop regions: ego, two cars on each
+# road, and extra cars at random
+@pytest.fixture
+def construct_env(crossing_world):
+    def make(policy, extra = 0, seed = 0):
+        rng = np.random.RandomState(seed)
+        agents = [
+            ['Ego', -45, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+            ['Veh', -15, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+            ['Veh', +45, +2.5, 0.0, wmath.Direction2D(mode = '-x')],
+            ['Veh', +15, +2.5, 0.0, wmath.Direction2D(mode = '-x')],
+            ['Veh', +2.5, -45, 0.0, wmath.Direction2D(mode = '+y')],
+            ['Veh', +2.5, -15, 0.0, wmath.Direction2D(mode = '+y')],
+            ['Veh', -2.5, +45, 0.0, wmath.Direction2D(mode = '-y')],
+            ['Veh', -2.5, +15, 0.0, wmath.Direction2D(mode = '-y')],
+        ]
+        lanes = {'+x': (-1, -2.5), '-x': (+1, +2.5), '+y': (-1, +2.5), '-y': (+1, -2.5)}
+        for i in range(extra):
+            mode = ['+x', '-x', '+y', '-y'][rng.randint(4)]
+            side, across = lanes[mode]
+            along = side * rng.uniform(12, 50)
+            x, y = (along, across) if 'x' in mode else (across, along)
+            agents += [['Veh', x, y, rng.uniform(0, 8), wmath.Direction2D(mode = mode)]]
+        env = design.Environment(crossing_world(agents, stop_regions = True), policy)
+        env.reward_structure({}, {}, [], [], [], round_to = 3)
+        env.specify_state(lambda agent, rs: {}, lambda agent, rs: {})
+        env.make_ready()
+        return env
+    return make
+
+@pytest.mark.parametrize('extra', [0, 24])
+def test_aggressive_driving_matches_scalar(construct_env, extra):
+    env = construct_env(lambda c: c.aggressive_driving(), extra)
+    env.reset()
+    policy = design.AggressiveDriving()
+    pm = env.world.priority_manager
+    rows = [aid for aid, agent in enumerate(env.agents) if not agent.ego]
+    branches = set()
+    for step in range(150):
+        owner = pm.current_owner
+        u, names = policy.batch(env.world, rows)
+        batched_owner, pm.current_owner = pm.current_owner, owner
+        for i, aid in enumerate(rows):
+            agent = env.agents[aid]
+            assert(tuple(u[i]) == agent.aggressive_driving())
+            assert(names[i] == agent.complexcontroller.last_controller)
+        assert(batched_owner == pm.current_owner)
+        branches |= set(names)
+        pm.current_owner = owner
+        env.step(env.agents[env.ego_id].aggressive_driving())
+    assert(len(branches) >= 4)
+
+def test_aggressive_driving_environment(construct_env):
+    envs = [construct_env(lambda c: c.aggressive_driving(), 8),
+        construct_env(design.AggressiveDriving(), 8)]
+    for env in envs: env.reset()
+    for step in range(200):
+        for env in envs:
+            env.step(env.agents[env.ego_id].aggressive_driving())
+        assert(np.array_equal(envs[0].world.dynamics.data, envs[1].world.dynamics.data))
+
+def test_aggressive_driving_mixed_order(construct_env):
+    # batched and scalar agents interleaved: priority requests keep the
+    # order of the agents
+    policy = design.AggressiveDriving()
+    envs = [construct_env(lambda c: c.aggressive_driving(), 8),
+        construct_env(policy, 8)]
+    for aid in range(2, envs[1].num_agents, 2):
+        envs[1].policies[aid] = lambda c: c.aggressive_driving()
+    owners = [[], []]
+    for i, env in enumerate(envs):
+        env.simultaneous = True
+        env.reset()
+        for step in range(200):
+            env.step(env.agents[env.ego_id].aggressive_driving())
+            owners[i] += [env.world.priority_manager.current_owner]
+    assert(np.array_equal(envs[0].world.dynamics.data, envs[1].world.dynamics.data))
+    assert(owners[0] == owners[1] and len(set(owners[0])) > 2)
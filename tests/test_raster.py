@@ -0,0 +1,60 @@
+import numpy as np
+import craft
+import pytest
+from tools.design import Environment, Rasterizer, VectorEnvironment
+import tools.math as wmath
+
+# Ego, a car in the other lane and a stop region
+@pytest.fixture
+def world(road_world):
+    agents = [
+        ['Ego', -45, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+        ['Veh', -15, +2.5, 0.0, wmath.Direction2D(mode = '+x')],
+    ]
+    return road_world(agents, static_elements = [['StopRegionX', 0, 5, -5, 0]])
+
+def color(name):
+    return np.array(Rasterizer.COLORS[name], dtype = np.uint8)
+
+def test_raster_static(world):
+    raster = Rasterizer(world)
+    frame = raster.render()
+    assert(frame.shape == (600, 600, 3) and frame.dtype == np.uint8)
+    # rows are y down: y = +7 is above the road, row 300-42
+    assert((frame[300-42, 150] == color('Grass')).all())
+    assert((frame[300+20, 150] == color('Road')).all())
+    assert((frame[300, 150] == color('Separator')).all())
+    assert((frame[300+10, 315] == color('StopRegion')).all())
+    # vehicles: 2.5 x 1.7 at scale 6 => 15 x 10 pixels
+    assert((frame[300+15, 30] == color('Ego')).all())
+    assert((frame[300-15, 210] == color('Vehicle')).all())
+    assert(np.all(frame == color('Ego'), axis = -1).sum() == 150)
+
+def test_raster_rotation_and_size(world):
+    frame = Rasterizer(world, 300, 150).render()
+    assert(frame.shape == (150, 300, 3))
+    raster = Rasterizer(world, 150, 150)
+    assert(raster.render() is raster.render(out = raster.buffer))
+    # heading +y (theta is clockwise): longer along the rows
+    world.agents[1].f['x'], world.agents[1].f['theta'] = 0.0, 1.5*np.pi
+    vehicle = np.argwhere(np.all(raster.render() == color('Vehicle'), axis = -1))
+    extent = vehicle.max(axis = 0) - vehicle.min(axis = 0)
+    assert(extent[0] > extent[1])
+
+def test_raster_environment(world):
+    env = Environment(world)
+    frame = env.render(mode = 'rgb_array')
+    assert(frame is not env.render(mode = 'rgb_array'))
+    assert(env.render(mode = 'rgb_array', copy = False) is env.rasterizer.buffer)
+    env.render_size = (84, 84)
+    assert(env.render(mode = 'rgb_array').shape == (84, 84, 3))
+    assert(env.canvas == None)
+
+def test_raster_vector():
+    venv = VectorEnvironment(craft.TwoStoppedCars, 3)
+    venv.reset()
+    venv.step(np.array([[1.0, 0.0], [0.0, 0.1], [-1.0, 0.0]]))
+    images = venv.get_images()
+    assert(images.shape == (3, 600, 600, 3))
+    for image, env in zip(images, venv.envs):
+        assert(np.array_equal(image, env.render(mode = 'rgb_array')))
@@ -0,0 +1,78 @@
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+import pytest
+import craft
+from tools.design import FrameRecorder, PNGWriter
+
+class SlowWriter:
+
+    def __init__(self):
+        self.frames = []
+        self.go = threading.Event()
+        self.closed = False
+
+    def write(self, frame):
+        self.go.wait()
+        self.frames += [frame.copy()]
+
+    def close(self):
+        self.closed = True
+
+def frame(i):
+    return np.full((4, 6, 3), i, dtype = np.uint8)
+
+def test_recorder_drop():
+    writer = SlowWriter()
+    recorder = FrameRecorder(writer, queue_size = 2, policy = 'drop')
+    # the writer holds one buffer, one more is queued, the rest is dropped
+    queued = [recorder.capture(frame(i)) for i in range(5)]
+    assert(queued[:2] == [True, True] and queued.count(True) == 2)
+    writer.go.set()
+    assert(recorder.close() == {'captured': 2, 'dropped': 3, 'written': 2})
+    assert(writer.closed)
+    assert([f[0, 0, 0] for f in writer.frames] == [0, 1])
+
+def test_recorder_block():
+    writer = SlowWriter()
+    recorder = FrameRecorder(writer, queue_size = 2, policy = 'block')
+    threading.Timer(0.05, writer.go.set).start()
+    assert(all([recorder.capture(frame(i)) for i in range(6)]))
+    assert(recorder.close() == {'captured': 6, 'dropped': 0, 'written': 6})
+    assert([f[0, 0, 0] for f in writer.frames] == list(range(6)))
+
+def test_recorder_error():
+    class Failing:
+        def write(self, frame): raise IOError('disk full')
+        def close(self): pass
+    recorder = FrameRecorder(Failing(), policy = 'block')
+    recorder.capture(frame(0))
+    with pytest.raises(IOError):
+        recorder.close()
+
+def read_png(path):
+    data = open(path, 'rb').read()
+    assert(data[:8] == b'\x89PNG\r\n\x1a\n')
+    w, h = struct.unpack('>II', data[16:24])
+    size, = struct.unpack('>I', data[33:37])
+    assert(data[37:41] == b'IDAT')
+    rows = np.frombuffer(zlib.decompress(data[41:41+size]), dtype = np.uint8)
+    return rows.reshape(h, 1+w*3)[:, 1:].reshape(h, w, 3)
+
+def test_recorder_environment(tmp_path):
+    env = craft.OneStoppedCar()
+    env.reset()
+    env.render_size = (32, 24)
+    env.start_recording(str(tmp_path), policy = 'block')
+    frames = []
+    for _ in range(3):
+        env.step(np.array([1.0, 0.0]))
+        frames += [env.render(mode = 'rgb_array')]
+    assert(env.stop_recording()['written'] == 3)
+    assert(env.recorder == None)
+    names = sorted(os.listdir(str(tmp_path)))
+    assert(names == ['frame000000.png', 'frame000001.png', 'frame000002.png'])
+    for name, f in zip(names, frames):
+        assert(np.array_equal(read_png(os.path.join(str(tmp_path), name)), f))
@@ -87,4 +87,67 @@ def test_reward_structure_simple():
     assert(rs.step() == (2, {'satisfactions': ['true'], 'mode': 'reward'}, 2))
     assert(rs.step() == (2, {'satisfactions': ['true'], 'mode': 'reward'}, 3))
     assert(rs.step() == (-1, {'satisfactions': ['c'], 'mode': 'termination'}, 4))
-    assert(rs.step() == (-1, {'satisfactions': ['c'], 'mode': 'termination'}, 5))
\ No newline at end of file
+    assert(rs.step() == (-1, {'satisfactions': ['c'], 'mode': 'termination'}, 5))
+
+def test_shared_namespace():
+    class Z: pass
+    z = Z()
+    z.zz = 20
+    objs = {'z': z}
+    d = {
+        "a": lambda p, t: p['z'].zz + t,
+    }
+    p = {
+        "b": lambda p, t: p['a'] - 20,
+        "c": lambda p, t: not p['b'],
+    }
+    r = [
+        ["true", lambda p, t: p['a'] + 10 * p['b'] + 100 * p['c'], 'satisfaction'],
+    ]
+    rs = RewardStructure(d, p, r, [], [], objs)
+    assert(rs.r.evaluated() is rs.s.evaluated() is rs._p.namespace)
+    assert(rs._p.namespace == {'z': z, 'a': 20, 'b': 0, 'c': 1})
+    assert(rs._d.namespace == {'z': z, 'a': 20})
+    assert(rs.reset() == (120, {'satisfactions': ['true'], 'mode': 'reward'}, 0))
+    assert(rs.step() == (31, {'satisfactions': ['true'], 'mode': 'reward'}, 1))
+    assert(int(rs._p) == 0b01)
+    assert(rs._d.namespace == {'z': z, 'a': 21})
+    # separate objs
+    dd = SeqPredicates(d, objs)
+    pp = SeqAP(p, dict(objs), dd)
+    assert(pp.get_dict() == {'b': 0, 'c': 1})
+
+# Definitions do not see propositions, not even those of the last step
+def test_definitions_without_propositions():
+    d = {"a": lambda p, t: p['b'] if t > 0 else 0}
+    p = {"b": lambda p, t: True}
+    rs = RewardStructure(d, p, [["true", 1, 'satisfaction']], [], [])
+    rs.reset()
+    try:
+        rs.step()
+        assert(False)
+    except KeyError:
+        pass
+
+
+def test_fused_check():
+    calls = []
+    def reward(p, t):
+        calls.append(t)
+        return 1
+    p = {
+        "a": lambda p, t: t >= 2,
+        "b": lambda p, t: t >= 3,
+    }
+    r = [["true", reward, 'satisfaction']]
+    t = [["G not a", -1, 'violation']]
+    s = [["b", 10, 'satisfaction'], ["F b", 5, 'satisfaction']]
+    rs = RewardStructure({}, p, r, t, s)
+    assert(rs.reset() == (1, {'satisfactions': ['true'], 'mode': 'reward'}, 0))
+    assert(rs.step() == (1, {'satisfactions': ['true'], 'mode': 'reward'}, 1))
+    assert(rs.step() == (-1, {'violations': ['G not a'], 'mode': 'termination'}, 2))
+    assert(rs.step() == (15, {'satisfactions': ['b', 'F b'], 'mode': 'success'}, 3))
+    # rewards of groups that lost were not evaluated
+    assert(calls == [0, 1])
+    assert(rs.combine_rts(rs.r.check(), rs.t.check(), rs.s.check()) == \
+        (15, {'satisfactions': ['b', 'F b'], 'mode': 'success'}, 3))
@@ -0,0 +1,73 @@
+import numpy as np
+import craft
+from tools.design import VectorEnvironment, ParallelEnvironment, BatchedRandom, \
+    draw_initial_conditions
+
+def initial_x(env):
+    return [agent.f['x'] for agent in env.agents]
+
+def test_seed_reproducible():
+    env1, env2 = craft.TwoStoppedCars(), craft.TwoStoppedCars()
+    env1.reset(seed = 3)
+    np.random.seed(0) # the global stream is not used any more
+    env2.reset(seed = 3)
+    assert(initial_x(env1) == initial_x(env2))
+    for _ in range(3):
+        env1.reset()
+        np.random.rand()
+        env2.reset()
+        assert(initial_x(env1) == initial_x(env2))
+    env2.seed(4)
+    env1.reset(), env2.reset()
+    assert(initial_x(env1) != initial_x(env2))
+
+def test_unseeded_uses_global():
+    env1, env2 = craft.OneStoppedCar(), craft.OneStoppedCar()
+    np.random.seed(1)
+    env1.reset()
+    np.random.seed(1)
+    env2.reset()
+    assert(initial_x(env1) == initial_x(env2))
+
+def test_predraw():
+    env = craft.ThreeStoppedCarsSSO()
+    env.seed(0)
+    drawn = env.predraw(5).copy()
+    assert(drawn.shape == (5, env.num_agents, 4))
+    # one call per init function: same as drawing each column at once
+    rng = np.random.default_rng(0)
+    assert(np.array_equal(drawn[:, 0, 0], -45 + rng.random(5) * 10))
+    assert(np.all(drawn[:, 0, 1] == -2.5))
+    for row in drawn:
+        env.reset()
+        assert(initial_x(env) == row[:, 0].tolist())
+    env.reset() # used up: drawn again
+    assert(env.initial_index == 1 and not np.array_equal(env.initial_conditions, drawn))
+
+def test_predraw_unbatched():
+    class Agent:
+        INIT_FEATURES = ['x']
+        def __init__(self, fn): self.of = {'x': fn}
+    calls = []
+    def legacy(rng):
+        calls.append(rng)
+        return 1.0
+    legacy.batched = False
+    rng = np.random.default_rng(0)
+    drawn = draw_initial_conditions([Agent(legacy), Agent(lambda rng: rng.random())],
+        rng, 3)
+    assert(len(calls) == 3 and drawn[:, 0, 0].tolist() == [1.0] * 3)
+    assert(len(set(drawn[:, 1, 0].tolist())) == 3)
+    assert(BatchedRandom(np.random.default_rng(0), 2).uniform(0, 1).shape == (2,))
+
+def test_vector_and_parallel_seed():
+    venv = VectorEnvironment(craft.OneStoppedCar, 4)
+    venv.seed(7)
+    obs = venv.reset()
+    assert(len(set([o[0] for o in obs.tolist()])) == 4) # independent streams
+    penv = ParallelEnvironment(craft.OneStoppedCar, 4, num_workers = 2)
+    try:
+        penv.seed(7)
+        assert(np.array_equal(penv.reset(), obs))
+    finally:
+        penv.close()
@@ -0,0 +1,53 @@
+import numpy as np
+import craft
+from tools.misc.ltl import Monitor, Parser, compile_property
+
+def rollout(env, actions):
+    ret = []
+    for action in actions:
+        obs, reward, done, info = env.step(action)
+        ret += [(obs.tolist(), reward, done, info)]
+        if done: break
+    return ret
+
+def test_snapshot_restore():
+    np.random.seed(0)
+    env = craft.TwoStoppedCars()
+    env.reset()
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        env.step(rng.uniform(-2, 2, 2))
+    snap = env.snapshot()
+    assert(snap.dtype == np.float64 and snap.shape == (env.snapshots.size,))
+    actions = rng.uniform(-2, 2, (30, 2))
+    first = rollout(env, actions)
+    assert(env.snapshot().tobytes() != snap.tobytes())
+    env.restore(snap)
+    assert(env.snapshot().tobytes() == snap.tobytes())
+    assert(rollout(env, actions) == first)
+    # reused buffer
+    out = np.zeros_like(snap)
+    env.restore(snap)
+    assert(env.snapshot(out = out) is out and out.tobytes() == snap.tobytes())
+
+def test_snapshot_priority_and_frozen():
+    env = craft.OneStoppedCar()
+    env.reset()
+    env.world.priority_manager.request_priority(env.agents[1].name)
+    env.agents_drawn[1] = False
+    snap = env.snapshot()
+    env.world.priority_manager.release_priority(env.agents[1].name)
+    env.agents_drawn[1] = True
+    env.restore(snap)
+    assert(env.world.priority_manager.current_owner == env.agents[1].name)
+    assert(env.agents_drawn[1] == 0)
+
+def test_monitor_save_load():
+    compiled = compile_property("a U b", {"a": 0, "b": 1})
+    m1, m2 = Monitor(compiled), Monitor(compiled)
+    m1.check_incremental(0b01)
+    assert(len(m1.save()) == m1.size())
+    m2.load(m1.save())
+    for state in [0b01, 0b10]:
+        assert(m1.check_incremental(state) == m2.check_incremental(state))
+    assert(m2.check_incremental(0b10) == Parser.TRUE)
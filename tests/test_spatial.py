@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+import tools.math as wmath
+
+# Ego and n cars at random on the lane centers of a crossing
+@pytest.fixture
+def construct_world(crossing_world):
+    def make(n, seed):
+        rng = np.random.RandomState(seed)
+        agents = [['Ego', -45, -2.5, 0.0, wmath.Direction2D(mode = '+x')]]
+        for i in range(n):
+            mode = ['+x', '-x', '+y', '-y'][rng.randint(4)]
+            # lane centers, some cars share exact coordinates
+            along, across = rng.randint(-50, 51), [-2.5, 2.5][rng.randint(2)]
+            x, y = (along, across) if 'x' in mode else (across, along)
+            agents += [['Veh', float(x), float(y), 0.0, wmath.Direction2D(mode = mode)]]
+        return crossing_world(agents)
+    return make
+
+def brute_relevant_agents(car):
+    rx1, rx2, ry1, ry2 = car.lane_boundaries()
+    return [agent for agent in car.world.agents if agent is not car and \
+        rx1 <= agent.f['x'] <= rx2 and ry1 <= agent.f['y'] <= ry2]
+
+def brute_closest_agent_forward(car, agents):
+    ret, dmin = None, np.inf
+    for agent in agents:
+        u = wmath.Direction2D([agent.f['x']-car.f['x'], agent.f['y']-car.f['y']])
+        d = np.sqrt((agent.f['x']-car.f['x'])**2+(agent.f['y']-car.f['y'])**2)
+        if d < dmin and u.dot(car.direction) > 0: ret, dmin = agent, d
+    return {'d': dmin, 'o': ret}
+
+@pytest.mark.parametrize('seed', range(3))
+def test_neighbour_queries_match_scan(construct_world, seed):
+    world = construct_world(60, seed)
+    for step in range(3):
+        for car in world.agents:
+            relevant = car.get_relevant_agents()
+            assert(relevant == brute_relevant_agents(car))
+            assert(car.closest_agent_forward(relevant) == \
+                brute_closest_agent_forward(car, relevant))
+            box = world.intersections[0]
+            assert(car.any_agents_in_intersection(box) == \
+                any(box.inside(a.f['x'], a.f['y']) for a in world.agents if a is not car))
+        # index follows the batched positions
+        world.dynamics.x[:] += 7.5
+        world.dynamics.changed()
+
+def test_agent_index_box(construct_world):
+    world = construct_world(20, 0)
+    index = world.agent_index()
+    assert(index is world.agent_index())
+    assert(index.in_box(-np.inf, np.inf, -np.inf, np.inf) == world.agents)
+    ego = world.agents[0]
+    assert(ego not in index.in_box(-50, 50, -50, 50, exclude = ego))
+    assert(not index.any_in_box(100, 200, 100, 200))
+
+def test_agent_index_moves(construct_world):
+    world = construct_world(60, 1)
+    index = world.agent_index()
+    ego = world.agents[0]
+    box = (-46, -44, -3, -2)
+    assert(index.in_box(*box) == [ego] and index.rebuilds == 1)
+    version = world.dynamics.moves.version
+    ego.f['v'] = 3.0 # not a position
+    assert(world.dynamics.moves.version == version)
+    world.dynamics.x[0] = 0.0 # direct writes need changed()
+    assert(index.in_box(*box) == [ego])
+    world.dynamics.changed([0])
+    assert(index.in_box(*box) == [])
+    ego.f['x'] = -45.0
+    assert(index.in_box(*box) == [ego])
+    # a few agents at a time are moved in place, not sorted again
+    rng = np.random.RandomState(0)
+    n = len(world.agents)
+    for step in range(200):
+        rows = rng.choice(n, rng.randint(1, 4), replace = False)
+        if step % 2 == 0:
+            world.dynamics.step(rng.uniform(-3, 3, (len(rows), 2)), rows)
+        else:
+            for row in rows:
+                world.agents[row].f['y'] = float(rng.randint(-50, 51))
+        x1, y1 = rng.uniform(-60, 40, 2)
+        expected = [agent for agent in world.agents if \
+            x1 <= agent.f['x'] <= x1+20 and y1 <= agent.f['y'] <= y1+20]
+        assert(index.in_box(x1, x1+20, y1, y1+20) == expected)
+    assert(index.rebuilds == 1)
+    world.dynamics.step(np.zeros((n, 2))) # everyone: sorted again
+    index.in_box(*box)
+    assert(index.rebuilds == 2)
+
+def test_region_index_matches_boxes(construct_world):
+    world = construct_world(0, 0)
+    index = world.region_index()
+    assert(index is world.region_index())
+    rng = np.random.RandomState(0)
+    # random points, plus points exactly on the region bounds
+    x = np.concatenate([rng.uniform(-60, 60, 300), rng.choice(index.x, 300), [np.nan]])
+    y = np.concatenate([rng.uniform(-60, 60, 300), rng.choice(index.y, 300), [0.0]])
+    expected = np.array([[box.inside(px, py) for box in world.allowed_regions] \
+        for px, py in zip(x, y)])
+    assert(np.array_equal(index.inside(x, y), expected))
+    lanes = np.array(['Lane' in box.name for box in world.allowed_regions])
+    assert(np.array_equal(index.any(x, y, 'Lane'), np.any(expected & lanes, axis = 1)))
+    for i in range(0, len(x), 37):
+        assert(index.which(x[i], y[i]) == \
+            [box for box, e in zip(world.allowed_regions, expected[i]) if e])
+        assert(index.any(x[i], y[i], 'Intersection') == \
+            any(e and 'Intersection' in box.name for box, e in zip(world.allowed_regions, expected[i])))
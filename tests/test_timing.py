@@ -0,0 +1,40 @@
+import numpy as np
+import craft
+from tools.design import StepTimers, VectorEnvironment
+from tools.design.timing import PHASES, BUCKETS, DYNAMICS
+
+def test_timers_lap():
+    now = [0.0]
+    timers = StepTimers()
+    timers.clock = lambda: now[0]
+    timers.start()
+    for dt in [0.5e-6, 3e-6, 3e-6, 100.0]:
+        now[0] += dt
+        timers.lap(DYNAMICS)
+    d = timers.as_dict()['dynamics']
+    assert(d['count'] == 4 and d['max'] == 100.0)
+    assert(abs(d['total'] - (100.0 + 6.5e-6)) < 1e-9)
+    assert(d['histogram'][0] == 1 and d['histogram'][2] == 2)
+    assert(d['histogram'][BUCKETS-1] == 1)
+    snap = timers.snapshot()
+    assert(snap['histogram'].shape == (len(PHASES), BUCKETS))
+    timers.reset()
+    assert(timers.as_dict()['dynamics']['count'] == 0)
+    assert(snap['count'][DYNAMICS] == 4) # snapshots are copies
+
+def test_timers_environment():
+    env = craft.OneStoppedCar()
+    env.reset()
+    for _ in range(5):
+        env.step(np.array([1.0, 0.0]))
+    timers = env.timers.as_dict()
+    assert(set(timers) == set(PHASES))
+    for phase in PHASES:
+        assert(timers[phase]['count'] == 5)
+        assert(timers[phase]['total'] > 0)
+    venv = VectorEnvironment(craft.OneStoppedCar, 2)
+    venv.reset()
+    venv.step(np.zeros((2, 2)))
+    timers = venv.timers.as_dict()
+    assert([timers[p]['count'] for p in ['policies', 'dynamics', 'other']] == [1, 1, 1])
+    assert(venv.envs[0].timers.as_dict()['ltl']['count'] == 1)
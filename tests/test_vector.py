@@ -0,0 +1,61 @@
+import numpy as np
+import craft
+from tools.design import VectorEnvironment
+
+def test_vector_matches_single():
+    n = 3
+    np.random.seed(0)
+    venv = VectorEnvironment(craft.OneStoppedCar, n)
+    vobs = venv.reset()
+    np.random.seed(0)
+    envs = [craft.OneStoppedCar() for _ in range(n)]
+    obs = np.stack([env.reset() for env in envs])
+    assert(vobs.shape == (n,) + venv.observation_space.shape)
+    assert(np.array_equal(vobs, obs))
+    actions = np.array([[1.0, 0.0], [0.5, 0.1], [2.0, -0.1]])
+    for _ in range(10):
+        vobs, vreward, vdone, _ = venv.step(actions)
+        results = [env.step(a) for env, a in zip(envs, actions)]
+        assert(np.array_equal(vobs, np.stack([r[0] for r in results])))
+        assert(list(vreward) == [r[1] for r in results])
+        assert(list(vdone) == [r[2] for r in results] == [False] * n)
+
+def test_vector_discrete_auto_reset():
+    venv = VectorEnvironment(lambda: craft.NoStoppedCar(discrete = True), 2)
+    venv.reset()
+    # full brake in env 0 (stopped => terminates), accelerate in env 1
+    obs, reward, done, info = venv.step(np.array([12, 4]))
+    assert(list(done) == [True, False])
+    assert(info[0]['mode'] == 'termination')
+    assert('terminal_observation' in info[0])
+    assert(venv.envs[0].reward_structure._p.t == 0)
+    assert(venv.envs[1].reward_structure._p.t == 1)
+    assert(venv.envs[0].agents[0].f['v'] == 0.0)
+
+def test_vector_shares_static():
+    venv = VectorEnvironment(craft.TwoStoppedCars, 4)
+    regions = venv.envs[0].world.allowed_regions
+    assert(all(env.world.allowed_regions is regions for env in venv.envs))
+    assert(venv.dynamics.n == 4 * 3)
+
+def test_vector_sequential():
+    # policies that look at the ego: the order agents are stepped in matters
+    def make_env():
+        env = craft.TwoStoppedCars()
+        env.simultaneous = False
+        env.policies = [None if agent.ego else \
+            (lambda c: [c.world.agents[0].f['v'] - c.f['v'], 0.0]) for agent in env.agents]
+        return env
+    n = 3
+    np.random.seed(0)
+    venv = VectorEnvironment(make_env, n)
+    assert(not venv.simultaneous)
+    venv.reset()
+    np.random.seed(0)
+    envs = [make_env() for _ in range(n)]
+    for env in envs: env.reset()
+    actions = np.array([[1.0, 0.0], [0.5, 0.1], [2.0, -0.1]])
+    for _ in range(10):
+        vobs, _, _, _ = venv.step(actions)
+        obs = np.stack([env.step(a)[0] for env, a in zip(envs, actions)])
+        assert(np.array_equal(vobs, obs))
@@ -0,0 +1,55 @@
+import os
+import sys
+import subprocess
+import pytest
+from tools.design import Environment
+
+# Runs code in a fresh interpreter (from the repository root), where
+# nothing else imported pyglet yet; code asserts what it needs
+def run_isolated(code):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code], cwd = root, check = True)
+
+def test_world_is_headless(road_world):
+    world = road_world()
+    env = Environment(world, lambda agent: [0, 0])
+    assert(env.canvas == None)
+    run_isolated('''if True:
+        import sys
+        import tools.math as wmath
+        from tools.design import Environment
+        from tests.conftest import build_world, ROAD
+        env = Environment(build_world(ROAD,
+            [['Ego', -45, -2.5, 0.0, wmath.Direction2D(mode = '+x')]]))
+        env.render(mode = 'rgb_array')
+        assert('tools.pyglet' not in sys.modules)''')
+
+def test_world_ids(road_world):
+    world = road_world()
+    assert(world.get_static_id_and_increment('Lane') == (2, 'Lane2'))
+    assert(world.get_static_id_and_increment('Lane') == (3, 'Lane3'))
+    assert(world.get_agent_id_and_increment('Car') == (1, 'Car1'))
+    assert([agent.name for agent in world.agents] == ['Ego0', 'Car0'])
+
+def test_world_lane_width(road_world):
+    world = road_world()
+    assert(world.lane_width == 5)
+    world.set_lane_width(0, 100, 0, 5)
+    with pytest.raises(AssertionError):
+        world.set_lane_width(0, 100, 0, 4)
+
+def test_world_transform(road_world):
+    world = road_world()
+    assert(world.transform_x(-50) == 0)
+    assert(world.transform_y(50) == 600)
+    assert(world.transform_x_inv(world.transform_x(12.5)) == 12.5)
+    assert((world.minx, world.maxx) == (-50, 50))
+
+def test_world_regions(road_world):
+    world = road_world()
+    ego, car = world.agents
+    assert(ego.any_regions())
+    assert(ego.any_regions('Lane0'))
+    assert(not ego.any_regions('Lane1'))
+    ego.f['y'] = 20.0
+    assert(not ego.any_regions())
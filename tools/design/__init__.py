@@ -1,7 +1,20 @@
 from .car import Car
-from .road import Grass, Lane, Intersection, TwoLaneRoad, StopRegion
 from .priority import PriorityManager
+from .dynamics import Dynamics
+from .spatial import AgentIndex, RegionIndex
+from .world import World
 from .controller import Controller, DefaultController, ComplexController
+from .policy import AggressiveDriving
 from .features import Feature, Features
+from .sampling import BatchedRandom, draw_initial_conditions
+from .observation import ObservationLayout
+from .snapshot import SnapshotLayout
+from .timing import StepTimers
+from .raster import Rasterizer
+from .recorder import FrameRecorder, PNGWriter, FFmpegWriter
+from .episodes import EpisodeRecorder, EpisodeReader
 from .environment import Environment
-from .reward import RewardChecker, RewardStructure
\ No newline at end of file
+from .vector import VectorEnvironment
+from .parallel import ParallelEnvironment
+from .reward import RewardChecker, RewardStructure
+from .batched import BatchedRewardStructure
\ No newline at end of file
@@ -0,0 +1,375 @@
+import numpy as np
+from inspect import isfunction
+
+from tools.misc.ltl import Parser
+from tools.misc.ltl.monitor import LEAF
+from tools.misc.ltl.offline import evaluate
+
+class Opaque:
+    # Values (one per copy) that have no batched form; using them in a
+    # lifted lambda raises, so that lambda is evaluated per copy too
+
+    __slots__ = ['values']
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getattr__(self, name):
+        raise TypeError("opaque value")
+
+    def __getitem__(self, index):
+        raise TypeError("opaque value")
+
+    def __eq__(self, other):
+        raise TypeError("opaque value")
+
+    __ne__ = __lt__ = __le__ = __gt__ = __ge__ = __eq__
+    __hash__ = None
+
+    def __bool__(self):
+        raise TypeError("opaque value")
+
+class BatchedFeatures:
+    # agent.f of agent aid in every copy; f['x'] => (N,) array
+
+    def __init__(self, batch, aid):
+        self.batch, self.aid = batch, aid
+
+    def __getitem__(self, key):
+        return self.batch.column(self.aid, key)
+
+    def __getattr__(self, key):
+        if key.startswith('_'): raise AttributeError(key)
+        try:
+            return self.batch.column(self.aid, key)
+        except KeyError:
+            raise AttributeError(key)
+
+class BatchedAgent:
+    # Stands in for agent aid of every copy in lifted lambdas. Only
+    # what is defined here can be lifted (anything else raises)
+
+    def __init__(self, batch, aid):
+        self.batch, self.aid = batch, aid
+        self.f = self.features = BatchedFeatures(batch, aid)
+
+    def any_regions(self, search_word = ''):
+        return self.batch.any_regions(self.aid, search_word)
+
+    # Same values as Car.Lp, which takes the norm of a 2-vector
+    # through a dot product (a stacked matmul does the same)
+    def Lp(self, x, y, p = 2):
+        d = np.stack(np.broadcast_arrays(self.f['x']-x, self.f['y']-y), axis = -1)
+        if p == 2:
+            return np.sqrt((d[:, None, :] @ d[:, :, None]).reshape(-1))
+        return np.linalg.norm(d, p, axis = -1)
+
+class BatchedRewardStructure:
+    """
+    The RewardStructures of N copies of one scenario, evaluated together.
+    Definitions, propositions and rewards are called once for all
+    copies: p['ego'] (and p['v'][i]) stand for that agent in every copy,
+    so p['ego'].f['x'] is an (N,) array, and t is the timestep (an (N,)
+    array if the copies are at different timesteps). The first time a
+    lambda is lifted like this, its values are checked against the
+    values of each copy. Lambdas that raise (eg. `not`, `and` or chained
+    comparisons of arrays), return anything else, disagree, or close
+    over different values per copy, are evaluated copy by copy instead.
+    Propositional properties are checked on all AP bitmasks at once
+    (the verdict is then set on each copy's property), temporal ones by
+    the monitor of each copy.
+
+    Each copy's RewardStructure ends up as if it had been stepped itself.
+
+    batch = BatchedRewardStructure(venv.envs, venv.dynamics, venv.offsets)
+    masks, rewards, dones, infos = batch.step() => masks[i] is
+        int(rs._p) of copy i; rewards[i], infos[i] as rs.step(); dones[i]
+        if the mode is 'success' or 'termination'
+    batch.lifted => names of the lambdas evaluated for all copies at once
+    """
+
+    GROUPS = ['r', 't', 's']
+
+    def __init__(self, envs, dynamics = None, offsets = None):
+        assert(len(envs) > 0)
+        self.envs = envs
+        self.n = len(envs)
+        self.structures = [env.reward_structure for env in envs]
+        rs = self.structures[0]
+        for other in self.structures:
+            assert(other._d._k == rs._d._k and other._p._k == rs._p._k)
+            assert(other._p.pre is other._d)
+            for g in self.GROUPS:
+                assert([p.x for p in getattr(other, g).properties] == \
+                    [p.x for p in getattr(rs, g).properties])
+        assert(rs._p._n <= 63)
+        self.dynamics = dynamics
+        if dynamics is not None:
+            assert(len(offsets) == self.n)
+            self.offsets = np.asarray(offsets, dtype = int)
+        self.agents = [BatchedAgent(self, aid) for aid in range(len(envs[0].agents))]
+        self.objs = {key: self.lift_obj(key) for key in rs._d.objs}
+
+        # funcs[name] => the lambda of every copy, for names ('d', key),
+        # ('p', key), (group, property) and (group, None) for combine_rewards
+        self.checkers = {g: [getattr(s, g) for s in self.structures] for g in self.GROUPS}
+        self.funcs = {}
+        for prefix, attr in [('d', '_d'), ('p', '_p')]:
+            for key in getattr(rs, attr)._k:
+                self.funcs[(prefix, key)] = [getattr(s, attr)._p[key] for s in self.structures]
+        for g, checkers in self.checkers.items():
+            for x in checkers[0]._r:
+                self.funcs[(g, x)] = [c._r[x] for c in checkers]
+            self.funcs[(g, None)] = [c.combine_rewards for c in checkers]
+        # Lambdas that are the same in every copy
+        self.liftable = set([name for name, funcs in self.funcs.items() if self.shared(funcs)])
+        self.lifted, self.failed = set(), set()
+        self.kinds = {} # name => type of the per copy values, if numeric
+
+    # Same code, globals, defaults and closure (up to equal constants)
+    @staticmethod
+    def shared(funcs):
+        f = funcs[0]
+        if not isfunction(f): return False
+        def same(a, b):
+            if a is b: return True
+            return type(a) in [int, float, bool, str] and type(a) == type(b) and a == b
+        def cells(fn):
+            try:
+                return [c.cell_contents for c in fn.__closure__ or ()]
+            except ValueError:
+                return None
+        for g in funcs[1:]:
+            if not isfunction(g) or g.__code__ is not f.__code__ or \
+                g.__globals__ is not f.__globals__:
+                return False
+            for a, b in [(f.__defaults__ or (), g.__defaults__ or ()), (cells(f), cells(g))]:
+                if a is None or b is None or len(a) != len(b): return False
+                if not all([same(x, y) for x, y in zip(a, b)]): return False
+        return True
+
+    def lift_obj(self, key):
+        values = [s._d.objs[key] for s in self.structures]
+        agents = self.envs[0].agents
+        def aid(value):
+            for i, agent in enumerate(agents):
+                if agent is value: return i
+            return None
+        if aid(values[0]) != None:
+            return self.batched(values)
+        if type(values[0]) == list and len(values[0]) > 0 and \
+            all([aid(v) != None for v in values[0]]):
+            return [self.agents[aid(v)] for v in values[0]]
+        if all([v is values[0] for v in values]): return values[0]
+        return Opaque(values)
+
+    def column(self, aid, key):
+        index = self.envs[0].agents[aid].f.index[key]
+        if self.dynamics is not None:
+            return self.dynamics.data[index, self.offsets+aid]
+        return np.array([env.agents[aid].f.data[index] for env in self.envs])
+
+    def any_regions(self, aid, search_word):
+        index = self.envs[0].world.region_index()
+        x, y = self.column(aid, 'x'), self.column(aid, 'y')
+        if all([env.world.region_index() is index for env in self.envs[1:]]):
+            return index.any(x, y, search_word)
+        return np.array([bool(env.world.region_index().any(xi, yi, search_word)) \
+            for env, xi, yi in zip(self.envs, x, y)])
+
+    # Batched form of a lambda's return value, or None
+    def lift(self, value):
+        if type(value) == BatchedAgent: return value
+        if type(value) == list and len(value) > 0 and \
+            all([type(v) == BatchedAgent for v in value]):
+            return value
+        if isinstance(value, (int, float, bool, np.number, np.bool_, np.ndarray)):
+            value = np.asarray(value)
+            if value.dtype.kind in 'biuf' and value.shape in [(), (self.n,)]:
+                return value
+        return None
+
+    # Batched form of one value per copy
+    def batched(self, values):
+        if all([isinstance(v, (int, float, bool, np.number, np.bool_)) for v in values]):
+            return np.array(values)
+        agents = self.envs[0].agents
+        for aid, agent in enumerate(agents):
+            if values[0] is agent:
+                if all([v is env.agents[aid] for v, env in zip(values, self.envs)]):
+                    return self.agents[aid]
+                break
+        return Opaque(values)
+
+    # One value per copy of a batched value, of type kind if given (the
+    # type the lambda returns per copy, see call)
+    def copies(self, value, kind = None):
+        if type(value) == BatchedAgent:
+            return [env.agents[value.aid] for env in self.envs]
+        if type(value) == list:
+            return [[env.agents[v.aid] for v in value] for env in self.envs]
+        values = np.broadcast_to(value, (self.n,))
+        if kind is None: return values.tolist()
+        if issubclass(kind, np.generic): return list(values.astype(kind))
+        return values.astype(kind).tolist()
+
+    def same(self, value, values, rows):
+        if type(value) == BatchedAgent or type(value) == list:
+            copies = self.copies(value)
+            return all([copies[i] is v or copies[i] == v for i, v in zip(rows, values)])
+        values = np.array(values)
+        if values.dtype.kind not in 'biuf': return False
+        return np.array_equal(np.broadcast_to(value, (self.n,))[rows], values)
+
+    # lifted() once for all copies if name can be lifted, else
+    # per_copy(i) for every row; returns (batched value, None) or
+    # (None, [value of each row])
+    def call(self, name, lifted, per_copy, rows):
+        value = None
+        if name in self.liftable and name not in self.failed:
+            try:
+                with np.errstate(all = 'ignore'):
+                    value = self.lift(lifted())
+            except Exception:
+                value = None
+            if value is not None and name in self.lifted: return value, None
+        values = [per_copy(i) for i in rows]
+        if value is not None:
+            if self.same(value, values, rows):
+                self.lifted.add(name)
+                kinds = set([type(v) for v in values])
+                kind = kinds.pop() if len(kinds) == 1 else None
+                if kind != None and issubclass(kind, (bool, int, float, np.number, np.bool_)):
+                    self.kinds[name] = kind
+            else:
+                self.failed.add(name)
+        return None, values
+
+    def step(self):
+        N, structures = self.n, self.structures
+        rs = structures[0]
+        for s in structures:
+            assert(s._d.t == s._p.t)
+            s._d.t += 1
+            s._p.t += 1
+        ts = [s._p.t for s in structures]
+        t = ts[0] if all([ti == ts[0] for ti in ts]) else np.array(ts)
+        everyone = range(N)
+
+        # definitions, then propositions (raw values, then bits)
+        ns = dict(self.objs)
+        keys, columns = [], [] # one value per copy, per key
+        synced = [0]
+        nd = rs._d._n
+        # values so far into the namespaces of each copy: definitions
+        # into both, propositions only into the SeqAP's
+        def sync():
+            rows = list(zip(*columns[synced[0]:]))
+            for s, row in zip(structures, rows):
+                s._p.namespace.update(zip(keys[synced[0]:], row))
+                if synced[0] < nd:
+                    s._d.namespace.update(zip(keys[synced[0]:nd], row))
+            synced[0] = len(keys)
+        truth = []
+        for prefix, attr in [('d', '_d'), ('p', '_p')]:
+            for key in getattr(rs, attr)._k:
+                funcs = self.funcs[(prefix, key)]
+                if not isfunction(funcs[0]):
+                    value, values = None, funcs
+                else:
+                    def per_copy(i, attr = attr):
+                        if synced[0] < len(keys): sync()
+                        s = structures[i]
+                        return funcs[i](getattr(s, attr).namespace, s._d.t)
+                    value, values = self.call((prefix, key), lambda: funcs[0](ns, t),
+                        per_copy, everyone)
+                if value is None:
+                    value = self.batched(values)
+                else:
+                    values = self.copies(value, self.kinds.get((prefix, key)))
+                ns[key] = value
+                keys += [key]
+                columns += [values]
+                if prefix == 'p':
+                    if type(value) == np.ndarray:
+                        truth += [np.broadcast_to(value.astype(bool), (N,))]
+                    else:
+                        truth += [np.array([bool(v) for v in values])]
+
+        masks = np.zeros(N, dtype = np.int64)
+        for i, b in enumerate(truth):
+            masks |= b.astype(np.int64) << i
+        for i, key in enumerate(rs._p._k):
+            ns[key] = (masks >> i) & 1
+        masks_list = masks.tolist()
+        rows = list(zip(*columns[:nd])) if nd > 0 else [()] * N
+        for s, row, mask in zip(structures, rows, masks_list):
+            s._d._d.update(enumerate(row))
+            s._d.namespace.update(zip(rs._d._k, row))
+            s._p._d._d = mask
+            s._p.namespace.update(zip(rs._d._k, row))
+            s._p.namespace.update([(key, (mask >> i) & 1) \
+                for i, key in enumerate(rs._p._k)])
+
+        # properties: holds[g] is (properties, N)
+        holds = {}
+        for g in self.GROUPS:
+            checkers = self.checkers[g]
+            holds[g] = np.zeros((len(checkers[0].properties), N), dtype = bool)
+            for k, p in enumerate(checkers[0].properties):
+                root = p.monitor.compiled.root
+                if root[0] == LEAF and all([c.properties[k].active for c in checkers]):
+                    value = evaluate(root, masks)
+                    verdicts = np.where(value, Parser.TRUE, Parser.FALSE).tolist()
+                    for c, mask, verdict in zip(checkers, masks_list, verdicts):
+                        c.properties[k].set_verdict(mask, verdict)
+                    holds[g][k] = value if p.mode == 'satisfaction' else ~value
+                else:
+                    holds[g][k] = [c.properties[k](m)[0] for c, m in zip(checkers, masks_list)]
+        success = np.any(holds['s'], axis = 0)
+        termination = ~success & np.any(holds['t'], axis = 0)
+        chosen = {'s': success, 't': termination, 'r': ~success & ~termination}
+
+        # rewards of the chosen group, combined in order
+        total = np.full(N, -np.inf)
+        for g in self.GROUPS:
+            checkers = self.checkers[g]
+            for k, p in enumerate(checkers[0].properties):
+                h = holds[g][k] & chosen[g]
+                rows = np.flatnonzero(h)
+                if len(rows) == 0: continue
+                funcs = self.funcs[(g, p.x)]
+                value, values = self.call((g, p.x), lambda: funcs[0](ns, t),
+                    lambda i: funcs[i](checkers[i].evaluated(), ts[i]), rows)
+                new = np.full(N, np.nan)
+                if value is None:
+                    new[rows] = values
+                else:
+                    new[:] = value
+                both = h & (total != -np.inf)
+                if np.any(both):
+                    combine = self.funcs[(g, None)]
+                    value, values = self.call((g, None), lambda: combine[0](total, new),
+                        lambda i: combine[i](total[i], new[i]), np.flatnonzero(both))
+                    combined = np.full(N, np.nan)
+                    if value is None:
+                        combined[both] = values
+                    else:
+                        combined[:] = value
+                    new = np.where(both, combined, new)
+                total = np.where(h, new, total)
+        rewards = np.where(total == -np.inf, 0, total)
+
+        infos = []
+        for i in range(N):
+            g = 's' if success[i] else ('t' if termination[i] else 'r')
+            properties = getattr(rs, g).properties
+            holding = [p for p, h in zip(properties, holds[g][:, i]) if h]
+            info = {}
+            violations = [p.x for p in holding if p.mode == 'violation']
+            satisfactions = [p.x for p in holding if p.mode == 'satisfaction']
+            if len(violations) > 0: info["violations"] = violations
+            if len(satisfactions) > 0: info["satisfactions"] = satisfactions
+            info['mode'] = {'s': 'success', 't': 'termination', 'r': 'reward'}[g]
+            infos += [info]
+        return masks, rewards, success | termination, infos
@@ -1,14 +1,10 @@
-import pyglet
-from pyglet import gl
 import numpy as np
-from inspect import isfunction
+from inspect import isfunction, signature
 
-import tools.pyglet as graphics
-import tools.misc as utilities
 import tools.math as wmath
 import tools.design as design
 
-class Car(graphics.Group):
+class Car:
 
     MAX_ACCELERATION = 2.0
     MAX_STEERING_ANGLE_RATE = 1.0
@@ -24,14 +20,20 @@ class Car(graphics.Group):
     MAX_STEERING_ANGLE = np.pi/3
     SAFETY_GAP = 6.0
     SPEED_MAX = 11.176 # 11.176 = 40kmph
+    # features drawn by reset
+    INIT_FEATURES = ['x', 'y', 'v', 'theta']
+    # aggressive_driving gains
+    K1, K2 = 31.6228, 7.9527
+    A1, A2 = 100.0, 10.0 # arbitrary constants
 
     # theta, psi cannot be specified, it is created based on direction
-    def __init__(self, x, y, v, ego = False, direction = None, canvas = None,
+    def __init__(self, x, y, v, ego = False, direction = None, world = None,
         name = None):
         assert(type(direction) == wmath.Direction2D)
-        assert(canvas != None)
+        assert(world != None)
         assert(name != None)
         self.name = name
+        self.dynamics, self.row = None, None # set by bind
         self.method = 'kinematic_bicycle_RK4'
         self.ego = ego
         self.direction = direction
@@ -44,44 +46,58 @@ class Car(graphics.Group):
         }
         self.of = self.original_features
         self.features = design.Features({
-            'x': self.of['x'](), 'y': self.of['y'](), 'v': self.of['v'](),
-            'acc': 0.0, 'psi_dot': 0.0, 'psi': 0.0,
-            'theta': self.of['theta'](),
+            'x': self.of['x'](np.random), 'y': self.of['y'](np.random),
+            'v': self.of['v'](np.random), 'acc': 0.0, 'psi_dot': 0.0, 'psi': 0.0,
+            'theta': self.of['theta'](np.random),
         })
         self.f = self.features # shorthand
-        self.canvas = canvas
-        ox, oy, scale = canvas.ox, canvas.oy, canvas.scale
-        x = ox + self.f['x'] * scale
-        y = oy + self.f['y'] * scale
-        w = self.VEHICLE_X * scale
-        h = self.VEHICLE_Y * scale
-        vehicle_url = utilities.get_file_from_root('static/vehicle.png')
-        car = graphics.Image(vehicle_url, x, y, w, h, np.rad2deg(self.f['theta']), anchor_centered=True)
-        super().__init__(items = [car])
+        self.world = world
+
+    # Attach this car to a row of a design.Dynamics; from now on the
+    # features are a view onto that row
+    def bind(self, dynamics, row):
+        self.dynamics, self.row = dynamics, row
+        self.f.bind(dynamics.view(row), dynamics.mover(row), ['x', 'y'])
+        dynamics.set_method(row, self.method)
+
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self, method):
+        self._method = method
+        if self.dynamics != None:
+            self.dynamics.set_method(self.row, method)
     
-    # Produces an intialization function; if passed a constant
-    # lambda-wrap it, else return it as is
+    # Produces an intialization function of rng, the environment's
+    # np.random.Generator (np.random itself if it was never seeded):
+    # constants are lambda-wrapped, lambda rng: ... is returned as is,
+    # and functions of nothing (eg. using np.random) ignore rng. Those
+    # cannot draw many values at once (see design.draw_initial_conditions)
+    # -45 => lambda rng = np.random: -45
+    # lambda rng: -45 + rng.random() * 10
     def parse_init_function(self, x):
         if not isfunction(x):
-            return lambda: x
+            return lambda rng = np.random: x
+        elif len(signature(x).parameters) == 0:
+            fn = lambda rng = np.random: x()
+            fn.batched = False
+            return fn
         else:
             return x
 
-    # Reset this agent
-    def reset(self):
-        for attr in ['x', 'y', 'v', 'theta']:
-            self.f[attr] = self.of[attr]()
+    # Reset this agent, drawing from rng (see parse_init_function)
+    def reset(self, rng = np.random):
+        for attr in self.INIT_FEATURES:
+            self.f[attr] = self.of[attr](rng)
 
     def which_regions(self, filter_fn = None):
-        in_regions = []
-        for region in self.canvas.allowed_regions:
-            if type(region) == wmath.Box and region.inside(self.f['x'], self.f['y']):
-                if filter_fn and filter_fn(region):
-                    in_regions += [region]
-        return in_regions
+        in_regions = self.world.region_index().which(self.f['x'], self.f['y'])
+        return [region for region in in_regions if filter_fn and filter_fn(region)]
     
     def any_regions(self, search_word = ''):
-        return self.which_regions(filter_fn = lambda x: search_word in x.name) != []
+        return bool(self.world.region_index().any(self.f['x'], self.f['y'], search_word))
     
     # Lp norm of displacement from (x, y)
     def Lp(self, x, y, p = 2):
@@ -89,19 +105,16 @@ class Car(graphics.Group):
 
     # return relevant agents (TODO: just cars for now)
     def get_relevant_agents(self):
-        all_cars = [agent for agent in self.canvas.agents if agent is not self]
         rx1, rx2, ry1, ry2 = self.lane_boundaries() # cars we really want to consider
-        within_range_cars = [agent for agent in all_cars \
-            if (rx1 <= agent.f['x'] <= rx2 and ry1 <= agent.f['y'] <= ry2)]
-        return within_range_cars
+        return self.world.agent_index().in_box(rx1, rx2, ry1, ry2, exclude = self)
 
     # Return lane bounds (x1, x2, y1, y2)
     # Either x1/x2 or y1/y2 is supposed to be -np.inf/np.inf
     # Will not work if direction is not exactly vertical or horizontal
     def lane_boundaries(self):
         assert(self.direction.mode in ['+x', '-x', '+y', '-y'])
-        assert(self.canvas.lane_width > 0)
-        half_lane_width = self.canvas.lane_width / 2.0
+        assert(self.world.lane_width > 0)
+        half_lane_width = self.world.lane_width / 2.0
         if 'x' in self.direction.mode:
             return -np.inf, np.inf, self.f['y']-half_lane_width, self.f['y']+half_lane_width
         else:
@@ -109,16 +122,14 @@ class Car(graphics.Group):
 
     # Return the displacement, agent that is the closest and in the forward direction as self
     def closest_agent_forward(self, list_of_agents):
-        my_direction = self.direction
-        ret_agent = None
-        min_displacement = np.inf
-        for agent in list_of_agents:
-            displacement_unit_vector = wmath.Direction2D([agent.f['x']-self.f['x'], agent.f['y']-self.f['y']])
-            displacement = np.sqrt((agent.f['x']-self.f['x'])**2+(agent.f['y']-self.f['y'])**2)
-            if displacement < min_displacement and displacement_unit_vector.dot(my_direction) > 0:
-                min_displacement = displacement
-                ret_agent = agent
-        return {'d': min_displacement, 'o': ret_agent}
+        if len(list_of_agents) == 0: return {'d': np.inf, 'o': None}
+        dx = np.array([agent.f['x'] for agent in list_of_agents])-self.f['x']
+        dy = np.array([agent.f['y'] for agent in list_of_agents])-self.f['y']
+        displacement = np.sqrt(dx**2+dy**2)
+        forward = dx*self.direction.value[0]+dy*self.direction.value[1] > 0
+        if not np.any(forward): return {'d': np.inf, 'o': None}
+        i = np.argmin(np.where(forward, displacement, np.inf))
+        return {'d': displacement[i], 'o': list_of_agents[i]}
     
     # if we do max deceleration, what is the distance needed to stop?
     def minimal_stopping_distance(self):
@@ -139,8 +150,8 @@ class Car(graphics.Group):
         ret_stopregion = None
         min_displacement = np.inf
         my_direction = self.direction
-        if 'x' in self.direction.mode: stopregions = self.canvas.stopx
-        if 'y' in self.direction.mode: stopregions = self.canvas.stopy
+        if 'x' in self.direction.mode: stopregions = self.world.stopx
+        if 'y' in self.direction.mode: stopregions = self.world.stopy
         for stopregion in stopregions:
             stopregion = stopregion.clip(rx1, rx2, ry1, ry2)
             if stopregion.empty(): continue
@@ -161,7 +172,7 @@ class Car(graphics.Group):
         ret_intersection = None
         min_displacement = np.inf
         my_direction = self.direction
-        for intersection in self.canvas.intersections:
+        for intersection in self.world.intersections:
             clipped_intersection = intersection.clip(rx1, rx2, ry1, ry2) # clip to compute displacement,
                 # but return the complete intersection
             if intersection.empty(): continue
@@ -174,13 +185,11 @@ class Car(graphics.Group):
         return {'d': min_displacement, 'o': ret_intersection}
     
     def any_agents_in_intersection(self, intersection):
-        all_agents = [agent for agent in self.canvas.agents if agent is not self]
-        for agent in all_agents:
-            if intersection.inside(agent.f['x'], agent.f['y']): return True
-        return False
+        return self.world.agent_index().any_in_box(intersection.x1, intersection.x2,
+            intersection.y1, intersection.y2, exclude = self)
 
     def in_any_intersection(self):
-        for intersection in self.canvas.intersections:
+        for intersection in self.world.intersections:
             if intersection.inside(self.f['x'], self.f['y']): return True
         return False
 
@@ -204,8 +213,8 @@ class Car(graphics.Group):
     def aggressive_driving(self, debug = False):
 
         if not hasattr(self, 'complexcontroller'):
-            K1, K2 = 31.6228, 7.9527
-            A1, A2 = 100.0, 10.0 # arbitrary constants
+            K1, K2 = self.K1, self.K2
+            A1, A2 = self.A1, self.A2
             self.complexcontroller = design.ComplexController(
                 predicates = dict(
                     ego = lambda p: self,
@@ -241,12 +250,12 @@ class Car(graphics.Group):
                     in_any_intersection = lambda p: p['ego'].in_any_intersection(),
                     requested_priority = [
                         lambda p: p['within_stop_region'] and 'intersection_clear' in p and p['intersection_clear'],
-                        lambda p: p['ego'].canvas.priority_manager.request_priority(p['ego'].name),
+                        lambda p: p['ego'].world.priority_manager.request_priority(p['ego'].name),
                     ],
-                    has_priority = lambda p: p['ego'].canvas.priority_manager.has_priority(p['ego'].name),
+                    has_priority = lambda p: p['ego'].world.priority_manager.has_priority(p['ego'].name),
                     released_priority = [
                         lambda p: not p['within_stop_region'] and p['has_priority'],
-                        lambda p: p['ego'].canvas.priority_manager.release_priority(p['ego'].name),
+                        lambda p: p['ego'].world.priority_manager.release_priority(p['ego'].name),
                     ],
                     # Not used
                     # init_angle = lambda p: p['ego'].direction.angle(),
@@ -321,88 +330,7 @@ class Car(graphics.Group):
     # u[0] is acceleration (-2, +2)
     # u[1] is psi_dot (-1, +1)
     # Note that positive psi_dot will increase counter-clockwise angle
+    # Prefer stepping all agents at once through self.dynamics.step
     def step(self, u):
-        # input clipping.
-        if abs(u[0]) > self.MAX_ACCELERATION:
-            self.f['acc'] = np.clip(u[0], -self.MAX_ACCELERATION, self.MAX_ACCELERATION)
-        else:
-            self.f['acc'] = u[0]
-
-        if abs(u[1]) > self.MAX_STEERING_ANGLE_RATE:
-            self.f['psi_dot'] = np.clip(u[1], -self.MAX_STEERING_ANGLE_RATE,
-                self.MAX_STEERING_ANGLE_RATE)
-        else:
-            self.f['psi_dot'] = u[1]
-
-        theta = 2*np.pi-self.f['theta']
-        if self.method == 'kinematic_bicycle_RK4':
-            K1x = self.f['v'] * np.cos(theta)
-            K1y = self.f['v'] * np.sin(theta)
-            K1th = self.f['v'] * np.tan(self.f['psi']) / self.VEHICLE_WHEEL_BASE
-
-            theta_temp = theta + self.DT_over_2 * K1th
-            v_temp = max([0.0, self.f['v'] + self.DT_over_2 * self.f['acc']])
-            psi_temp = np.clip(self.f['psi'] + self.DT_over_2 * self.f['psi_dot'],
-                -self.MAX_STEERING_ANGLE, self.MAX_STEERING_ANGLE)
-
-            K23x = np.cos(theta_temp)
-            K23y = np.sin(theta_temp)
-            K23th = v_temp * np.tan(psi_temp) / self.VEHICLE_WHEEL_BASE
-
-            theta_temp = theta + self.DT_over_2 * K23th
-
-            K23x += np.cos(theta_temp)
-            K23y += np.sin(theta_temp)
-            K23x *= v_temp
-            K23y *= v_temp
-
-            v_temp = max([0.0, self.f['v'] + self.DT * self.f['acc']])
-            psi_temp = np.clip(self.f['psi'] + self.DT * self.f['psi_dot'],
-                -self.MAX_STEERING_ANGLE, self.MAX_STEERING_ANGLE)
-
-            K4x = v_temp * np.cos(theta_temp)
-            K4y = v_temp * np.sin(theta_temp)
-            K4th = v_temp * np.tan(psi_temp) / self.VEHICLE_WHEEL_BASE
-
-            self.f['x'] += self.DT_over_6 * (K1x + K4x) + self.DT_over_3 * K23x
-            self.f['y'] += self.DT_over_6 * (K1y + K4y) + self.DT_over_3 * K23y
-            theta += self.DT_over_6 * (K1th + K4th) + self.DT_2_over_3 * K23th
-            self.f['theta'] = 2*np.pi-theta
-            self.f['v'] = v_temp
-            self.psi = psi_temp
-
-        elif self.method == 'kinematic_bicycle_Euler':
-            self.f['x'] += self.DT * self.f['v'] * np.cos(theta)
-            self.f['y'] += self.DT * self.f['v'] * np.sin(theta)
-            theta += self.DT * self.f['v'] * np.tan(self.f['psi']) / self.VEHICLE_WHEEL_BASE
-            self.f['theta'] = 2*np.pi-theta
-
-            self.f['v'] = max([0.0, self.f['v'] + self.DT * self.f['acc']])
-            self.f['psi'] = np.clip(self.f['psi'] + self.DT * self.f['psi_dot'],
-                -self.MAX_STEERING_ANGLE, self.MAX_STEERING_ANGLE)
-
-        elif self.method == 'point_mass_Euler':
-            dv = self.f['acc'] * self.DT
-            dx = self.f['v'] * self.DT
-            self.f['v'] += dv
-            if self.f['v'] < 0: self.f['v'] = 0
-            self.f['x'] += self.direction.value[0] * dx
-            self.f['y'] += self.direction.value[1] * dx
-
-        else:
-            # point_mass_RK4 method is not implemented yet.
-            raise ValueError
-
-        if 'kinematic' in self.method:
-            theta = 2*np.pi-self.f['theta']
-            orig_theta = 2*np.pi-self.direction.angle()
-            if theta > orig_theta+self.THETA_DEVIATION_ALLOWED:
-                theta = orig_theta+self.THETA_DEVIATION_ALLOWED
-            if theta < orig_theta-self.THETA_DEVIATION_ALLOWED:
-                theta = orig_theta-self.THETA_DEVIATION_ALLOWED
-            self.f['theta'] = 2*np.pi-theta
-        
-        ox, oy, scale = self.canvas.ox, self.canvas.oy, self.canvas.scale
-        x = ox + self.f['x'] * scale
-        y = oy + self.f['y'] * scale
-        self.items[0].items[0].update(x = x, y = y, rotation = np.rad2deg(self.f['theta']))
\ No newline at end of file
+        assert(self.dynamics != None)
+        self.dynamics.step([u], [self.row])
\ No newline at end of file
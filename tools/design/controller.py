@@ -1,3 +1,5 @@
+import types
+
 import tools.misc as utilities
 
 # Every controller has a precondition_fn and a rule_fn to produce control inputs
@@ -33,6 +35,94 @@ class DefaultController:
         return self.rule_fn(p, m)
 
 
+# Names an evaluation function may read: string constants in its code
+# (eg. 'cc' in lambda p: p['cc']['o']); None if it cannot be inspected
+def read_names(fn):
+    if not hasattr(fn, '__code__'): return None
+    names, codes = set(), [fn.__code__]
+    while len(codes) > 0:
+        for const in codes.pop().co_consts:
+            if type(const) == str: names.add(const)
+            elif type(const) == types.CodeType: codes += [const]
+    return names
+
+# Predicates and multipliers of a ComplexController compiled once.
+# Values are computed lazily (and once per step) when a precondition,
+# rule or another entry reads them. Entries nothing reads can only
+# matter for their side effects (eg. requesting priority), so those
+# are evaluated every step, in the original order. If some function
+# cannot be inspected, everything is evaluated every step.
+class EvaluationPlan:
+
+    def __init__(self, predicates, multipliers, controllers):
+        self.entries = {}
+        for group in [predicates, multipliers]:
+            for key, fn in group.items():
+                assert(key not in self.entries.keys())
+                if type(fn) == list: assert(len(fn) == 2)
+                self.entries[key] = fn if type(fn) == list else [None, fn]
+        # predicates only see predicates; multipliers see both
+        self.predicate_keys = set(predicates.keys())
+        self.all_keys = set(self.entries.keys())
+        self.multiplier_keys = set(multipliers.keys())
+        self.sees_all = {key: key in self.multiplier_keys for key in self.entries.keys()}
+
+        # (owner, fn): an entry naming itself does not count as a read
+        fns = [(key, fn) for key, entry in self.entries.items() for fn in entry if fn]
+        for controller in controllers:
+            fns += [(None, controller.rule_fn)]
+            if hasattr(controller, 'precondition_fn'):
+                fns += [(None, controller.precondition_fn)]
+        read = set()
+        for key, fn in fns:
+            names = read_names(fn)
+            if names == None:
+                read = set()
+                break
+            read |= names - {key}
+        self.eager = [key for key in self.entries.keys() if key not in read]
+
+    # Returns (p, m) views for one step
+    def evaluate(self):
+        values, done = {}, {}
+        p = LazyValues(self, values, done, self.predicate_keys)
+        m = LazyValues(self, values, done, self.multiplier_keys)
+        total = LazyValues(self, values, done, self.all_keys)
+        for view in [p, m, total]:
+            view.predicates, view.total = p, total
+        for key in self.eager: p.compute(key)
+        return p, m
+
+class LazyValues:
+
+    def __init__(self, plan, values, done, keys):
+        self.plan = plan
+        self.values = values
+        self.done = done
+        self.keys = keys
+
+    def compute(self, key):
+        done = self.done.get(key)
+        if done: return
+        # reading an entry from inside its own evaluation
+        if done == False: raise KeyError(key)
+        self.done[key] = False
+        total = self.total if self.plan.sees_all[key] else self.predicates
+        condition_fn, fn = self.plan.entries[key]
+        if condition_fn == None or condition_fn(total):
+            self.values[key] = fn(total)
+        self.done[key] = True
+
+    def __getitem__(self, key):
+        if key not in self.keys: raise KeyError(key)
+        if not self.done.get(key): self.compute(key)
+        return self.values[key]
+
+    def __contains__(self, key):
+        if key not in self.keys: return False
+        if not self.done.get(key): self.compute(key)
+        return key in self.values
+
 # Combination of controllers
 class ComplexController:
 
@@ -48,6 +138,8 @@ class ComplexController:
         for controller in self.controllers:
             assert(controller.name not in names_of_controllers)
             names_of_controllers += [controller.name]
+        self.last_controller = None # name of the last one used
+        self.plan = EvaluationPlan(predicates, multipliers, controllers)
 
     # Sequentially evaluate the dict x.
     # x has key, value pairs such that the key is the name
@@ -72,12 +164,15 @@ class ComplexController:
                 total[key] = new_value
         return ret
 
+    # Predicates and multipliers are only computed when read (see
+    # EvaluationPlan), not all of them up front
     def control(self, debug = False):
-        ep = self.sequential_evaluate(self.predicates)
-        em = self.sequential_evaluate(self.multipliers, ep)
+        ep, em = self.plan.evaluate()
         for controller in self.controllers:
             if controller.active(ep):
                 if debug: print(controller.name)
+                self.last_controller = controller.name
                 return controller.control(ep, em)
         if debug: print(self.default_controller.name)
-        return self.default_controller.control(ep, em)
\ No newline at end of file
+        self.last_controller = self.default_controller.name
+        return self.default_controller.control(ep, em)
@@ -0,0 +1,196 @@
+from collections import deque
+import numpy as np
+
+import tools.design as design
+
+class Moves:
+    # Log of the agents whose x or y changed, shared by a Dynamics and
+    # its parts (rows of the whole Dynamics); version counts the entries.
+    # Only the last size entries are kept
+
+    def __init__(self, size = 64):
+        self.version = 0
+        self.log = deque(maxlen = size)
+
+    def add(self, rows):
+        self.version += 1
+        self.log.append((self.version, rows))
+
+    # Rows in [start, stop) that moved after version (local to start,
+    # maybe repeated), or None if the log does not reach back that far
+    def since(self, version, start, stop):
+        if version == self.version: return np.zeros(0, dtype = int)
+        if len(self.log) == 0 or self.log[0][0] > version+1: return None
+        if version+1 == self.version: rows = np.atleast_1d(self.log[-1][1])
+        else: rows = np.concatenate([np.atleast_1d(r) for v, r in self.log if v > version])
+        rows = rows[(start <= rows) & (rows < stop)]
+        return rows-start
+
+
+class Dynamics:
+    """
+    Struct-of-arrays vehicle dynamics for all agents of a world.
+    Every feature in FEATURES is one contiguous row of self.data, with
+    one column per agent; each Car's features are a view onto its column.
+    All agents (any mix of methods) are advanced in one batched call.
+
+    dynamics = Dynamics(world.agents)
+    dynamics.x => array of all x
+    dynamics.step([[acc0, psi_dot0], [acc1, psi_dot1]], rows = [0, 1])
+    dynamics.moves => rows whose x/y changed, logged by step, Car.f
+        writes and changed() (see design.AgentIndex); call changed()
+        after writing to x/y directly
+    """
+
+    FEATURES = ['x', 'y', 'v', 'acc', 'psi_dot', 'psi', 'theta']
+    METHODS = ['kinematic_bicycle_RK4', 'kinematic_bicycle_Euler', 'point_mass_Euler']
+
+    def __init__(self, agents):
+        assert(type(agents) == list)
+        self.agents = agents
+        self.n = len(agents)
+        self.data = np.zeros((len(self.FEATURES), self.n))
+        for i, name in enumerate(self.FEATURES):
+            setattr(self, name, self.data[i])
+        self.method = np.zeros(self.n, dtype = int)
+        self.direction = np.zeros((2, self.n))
+        self.orig_theta = np.zeros(self.n)
+        self.moves = Moves() # shared with parts
+        self.offset = 0 # of the first row, in the moves log
+        for aid, agent in enumerate(agents):
+            assert(list(agent.f.keys()) == self.FEATURES)
+            self.direction[:, aid] = agent.direction.value
+            self.orig_theta[aid] = 2*np.pi-agent.direction.angle()
+            agent.bind(self, aid)
+
+    # Dynamics over agents [start, stop) whose arrays are views into
+    # this one; rows passed to it are local (0 is agent start)
+    def part(self, start, stop):
+        ret = Dynamics.__new__(Dynamics)
+        ret.agents = self.agents[start:stop]
+        ret.n = stop-start
+        ret.data = self.data[:, start:stop]
+        for i, name in enumerate(self.FEATURES):
+            setattr(ret, name, ret.data[i])
+        ret.method = self.method[start:stop]
+        ret.direction = self.direction[:, start:stop]
+        ret.orig_theta = self.orig_theta[start:stop]
+        ret.moves = self.moves
+        ret.offset = self.offset+start
+        return ret
+
+    # x/y of rows (all if None) changed: see design.AgentIndex
+    def changed(self, rows = None):
+        if rows is None: rows = np.arange(self.n)
+        self.moves.add(np.asarray(rows)+self.offset)
+
+    # Called after Car.f writes to x/y of row
+    def mover(self, row):
+        moves, row = self.moves, row+self.offset
+        return lambda: moves.add(row)
+
+    # Unknown methods are only rejected on step, like Car.step used to
+    def set_method(self, row, method):
+        if method in self.METHODS:
+            self.method[row] = self.METHODS.index(method)
+        else:
+            self.method[row] = -1
+
+    # Column view for agent row (used as the backing store of Car.f)
+    def view(self, row):
+        return self.data[:, row]
+
+    # u[:, 0] is acceleration, u[:, 1] is psi_dot for agents in rows
+    # (all agents if rows is None)
+    def step(self, u, rows = None):
+        Car = design.Car
+        if rows is None: rows = np.arange(self.n)
+        rows = np.asarray(rows, dtype = int)
+        if len(rows) == 0: return
+        u = np.asarray(u, dtype = np.float64).reshape(len(rows), 2)
+        self.moves.add(rows+self.offset)
+
+        # input clipping.
+        self.acc[rows] = np.clip(u[:, 0], -Car.MAX_ACCELERATION, Car.MAX_ACCELERATION)
+        self.psi_dot[rows] = np.clip(u[:, 1], -Car.MAX_STEERING_ANGLE_RATE,
+            Car.MAX_STEERING_ANGLE_RATE)
+
+        method = self.method[rows]
+        if np.any(method < 0):
+            # point_mass_RK4 method is not implemented yet.
+            raise ValueError
+        for code, fn in enumerate([self.kinematic_bicycle_RK4,
+            self.kinematic_bicycle_Euler, self.point_mass_Euler]):
+            selected = rows[method == code]
+            if len(selected) > 0: fn(selected)
+
+        kinematic = rows[method <= 1]
+        if len(kinematic) > 0:
+            theta = 2*np.pi-self.theta[kinematic]
+            orig_theta = self.orig_theta[kinematic]
+            theta = np.minimum(theta, orig_theta+Car.THETA_DEVIATION_ALLOWED)
+            theta = np.maximum(theta, orig_theta-Car.THETA_DEVIATION_ALLOWED)
+            self.theta[kinematic] = 2*np.pi-theta
+
+    def kinematic_bicycle_RK4(self, i):
+        Car = design.Car
+        v, psi = self.v[i], self.psi[i]
+        acc, psi_dot = self.acc[i], self.psi_dot[i]
+        theta = 2*np.pi-self.theta[i]
+
+        K1x = v * np.cos(theta)
+        K1y = v * np.sin(theta)
+        K1th = v * np.tan(psi) / Car.VEHICLE_WHEEL_BASE
+
+        theta_temp = theta + Car.DT_over_2 * K1th
+        v_temp = np.maximum(0.0, v + Car.DT_over_2 * acc)
+        psi_temp = np.clip(psi + Car.DT_over_2 * psi_dot,
+            -Car.MAX_STEERING_ANGLE, Car.MAX_STEERING_ANGLE)
+
+        K23x = np.cos(theta_temp)
+        K23y = np.sin(theta_temp)
+        K23th = v_temp * np.tan(psi_temp) / Car.VEHICLE_WHEEL_BASE
+
+        theta_temp = theta + Car.DT_over_2 * K23th
+
+        K23x += np.cos(theta_temp)
+        K23y += np.sin(theta_temp)
+        K23x *= v_temp
+        K23y *= v_temp
+
+        v_temp = np.maximum(0.0, v + Car.DT * acc)
+        psi_temp = np.clip(psi + Car.DT * psi_dot,
+            -Car.MAX_STEERING_ANGLE, Car.MAX_STEERING_ANGLE)
+
+        K4x = v_temp * np.cos(theta_temp)
+        K4y = v_temp * np.sin(theta_temp)
+        K4th = v_temp * np.tan(psi_temp) / Car.VEHICLE_WHEEL_BASE
+
+        self.x[i] += Car.DT_over_6 * (K1x + K4x) + Car.DT_over_3 * K23x
+        self.y[i] += Car.DT_over_6 * (K1y + K4y) + Car.DT_over_3 * K23y
+        theta += Car.DT_over_6 * (K1th + K4th) + Car.DT_2_over_3 * K23th
+        self.theta[i] = 2*np.pi-theta
+        self.v[i] = v_temp
+        # psi is intentionally not written back here (as in the original
+        # per-car integrator), only the Euler variant integrates it
+
+    def kinematic_bicycle_Euler(self, i):
+        Car = design.Car
+        v, psi = self.v[i], self.psi[i]
+        theta = 2*np.pi-self.theta[i]
+        self.x[i] += Car.DT * v * np.cos(theta)
+        self.y[i] += Car.DT * v * np.sin(theta)
+        theta += Car.DT * v * np.tan(psi) / Car.VEHICLE_WHEEL_BASE
+        self.theta[i] = 2*np.pi-theta
+
+        self.v[i] = np.maximum(0.0, v + Car.DT * self.acc[i])
+        self.psi[i] = np.clip(psi + Car.DT * self.psi_dot[i],
+            -Car.MAX_STEERING_ANGLE, Car.MAX_STEERING_ANGLE)
+
+    def point_mass_Euler(self, i):
+        Car = design.Car
+        dv = self.acc[i] * Car.DT
+        dx = self.v[i] * Car.DT
+        self.v[i] = np.maximum(0.0, self.v[i] + dv)
+        self.x[i] += self.direction[0, i] * dx
+        self.y[i] += self.direction[1, i] * dx
@@ -1,7 +1,14 @@
-import tools.pyglet as graphics
 from tools.misc.ltl import Bits, SeqAP
 import tools.misc as utilities
 from .reward import RewardStructure
+from .world import World
+from .observation import ObservationLayout
+from .raster import Rasterizer
+from .recorder import FrameRecorder
+from .episodes import EpisodeRecorder
+from .snapshot import SnapshotLayout
+from .sampling import draw_initial_conditions
+from .timing import StepTimers, POLICIES, DYNAMICS, OTHER, STATE
 import numpy as np
 import time, datetime
 import gym
@@ -10,21 +17,35 @@ import json
 
 class Environment(gym.Env):
     """
-    Gym based environment that needs a canvas.
-    Canvas cannot have more than 32 agents (32-bit int).
+    Gym based environment that needs a world.
+    World cannot have more than 32 agents (32-bit int).
     zero_pad zero_pads by a certain number of features.
 
+    The world is headless; a tools.pyglet.Canvas is only created
+    (and pyglet only imported) on the first call to render(). With
+    mode = 'rgb_array', frames come from a design.Rasterizer instead
+    (numpy only, no window), at env.render_size = (w, h) if set.
+
     Eg.
 
-    canvas = ...
+    world = design.World(...)
     default_policy = lambda c: c.aggressive_driving()
-    env = Environment(canvas, default_policy, zero_pad = 3)
+    env = Environment(world, default_policy, zero_pad = 3)
 
     Freeze/unfreeze agents which you want to be updated. If
     frozen, these agents won't move, i.e. their policies
     will not be called. If agent.ego is True, then 
     default_policy doesn't apply to it.
 
+    Agents are stepped one by one (ego first, then the others in
+    order), so a policy sees the agents stepped before it in the same
+    step. With simultaneous = True, all policies are computed from the
+    state before the step and all agents are advanced in one
+    design.Dynamics call (faster, but policies that look at other
+    agents can behave differently).
+
+    env = Environment(world, default_policy, simultaneous = True)
+
     env.agents_unfrozen() => all by default
     env.agent_freeze(...)
     env.agent_unfreeze(...)
@@ -38,24 +59,48 @@ class Environment(gym.Env):
 
     ...
     env.reset() => return env.state()
+    env.seed(0) => initial conditions from env.rng, a np.random.Generator
+        of this env only (np.random until seeded)
+    env.reset(seed = 0) => same, then reset
+    env.predraw(1000) => initial conditions of the next 1000 resets,
+        drawn at once (and again when used up)
     env.state() => get numpy representation of state (mostly trimmed)
+    env.state(copy = False) => same, as a view of a reused buffer
     env.f[a]['b'] => get agent (id:a)'s feature 'b'
     ...
+    snap = env.snapshot() => flat float64 array (see design.SnapshotLayout)
+    env.restore(snap) => back to that state, eg. to branch rollouts
+    ...
     next_obs, reward, done, info = env.step()
+    env.timers.as_dict() => time spent per phase of step (see
+        design.StepTimers), env.timers.reset()
+    env.render(mode = 'rgb_array') => (h, w, 3) uint8 frame
+    env.render(mode = 'rgb_array', copy = False) => same, reused buffer
+    env.start_recording('rollout.mp4') => frames of every render() go
+        to a design.FrameRecorder, encoded in the background
+    env.stop_recording() => {'captured': ., 'dropped': ., 'written': .}
+    env.start_episode_recording('runs/eval') => every step (features,
+        action, APs, reward, done, mode) to a design.EpisodeRecorder
+    env.stop_episode_recording() => number of steps recorded
     ...
     env.close()
     """
-    metadata = {'render.modes': ['human']}
+    metadata = {'render.modes': ['human', 'rgb_array']}
 
-    def __init__(self, canvas, default_policy = None, zero_pad = 0,
-        discrete = False):
+    def __init__(self, world, default_policy = None, zero_pad = 0,
+        discrete = False, simultaneous = False):
 
-        assert(type(canvas) == graphics.Canvas)
-        self.canvas = canvas
+        assert(type(world) == World)
+        self.world = world
+        self.canvas = None # renderer, created on first render()
         self.rendering = False
-        assert(hasattr(self.canvas, 'agents'))
-        assert(type(self.canvas.agents) == list)
-        self.agents = self.canvas.agents        
+        self.rasterizer = None # offscreen, created on first rgb_array render
+        self.render_size = None # (w, h) of rgb_array frames, world's if None
+        self.recorder = None # see start_recording
+        self.episode_recorder = None # see start_episode_recording
+        assert(hasattr(self.world, 'agents'))
+        assert(type(self.world.agents) == list)
+        self.agents = self.world.agents
         num_egos = sum([agent.ego for agent in self.agents])
         self.ego_id = None
         for aid, agent in enumerate(self.agents):
@@ -103,12 +148,31 @@ class Environment(gym.Env):
         # Discrete actions
         self.discrete = discrete
 
+        # Step all agents from the same state (see step)
+        self.simultaneous = simultaneous
+
+        # Compiled observation layout, see make_ready
+        self.layout = None
+
+        # Layout of snapshot(), made on first use
+        self.snapshots = None
+
+        # Time spent in each phase of step
+        self.timers = StepTimers()
+
+        # Random initial conditions, see seed and predraw
+        self.rng = np.random
+        self.initial_conditions = None # predrawn, one row per reset
+        self.initial_index = 0
+
     # Create obs space and action space after everything is set
     def make_ready(self):
         self.ready = True
 
         # Observation space (TODO: can be better defined)
         s = self.state()
+        if self.state_specified:
+            self.layout = ObservationLayout(self, self.state_dict())
         self.observation_space = gym.spaces.Box(
             low = -np.inf,
             high = np.inf,
@@ -182,21 +246,32 @@ class Environment(gym.Env):
         # self.debug['state_inspect'] = True
         # self.debug['kill_after_state_inspect'] = True
 
-    def state(self):
+    # State as a dict: {aid: ego_fn/other_fn(...), "null": zero padding}
+    def state_dict(self):
+        ret = {}
+        for aid, agent in enumerate(self.agents):
+            if aid == self.ego_id:
+                ret[aid] = self.ego_fn(agent, self.reward_structure)
+            else:
+                ret[aid] = self.other_fn(agent, self.reward_structure)
+        
+        if self.zero_pad > 0:
+            ret["null"] = {("null_feature_%d" % ki): 0.0 for ki in range(self.zero_pad)}
+        return ret
+
+    # Flattened state_dict(), written into a preallocated buffer by the
+    # layout compiled in make_ready (see design.ObservationLayout)
+    # If copy is False, returns that buffer (overwritten on every call)
+    def state(self, copy = True):
         assert(hasattr(self, 'f'))
 
         ret = None
         if self.state_specified:
-            ret = {}
-            for aid, agent in enumerate(self.agents):
-                if aid == self.ego_id:
-                    ret[aid] = self.ego_fn(agent, self.reward_structure)
-                else:
-                    ret[aid] = self.other_fn(agent, self.reward_structure)
-            
-            if self.zero_pad > 0:
-                ret["null"] = {("null_feature_%d" % ki): 0.0 for ki in range(self.zero_pad)}
+            if self.layout != None and not self.debug['state_inspect']:
+                ret = self.layout.fill()
+                return ret.copy() if copy else ret
 
+            ret = self.state_dict()
             if self.debug['state_inspect']: 
                 print('Dict:')
                 print(json.dumps(ret, indent = 2))
@@ -216,7 +291,7 @@ class Environment(gym.Env):
 
     def debug_intersection_enter(self):
         self.new_debug_variable('order', [])
-        ii = self.canvas.intersections[0]
+        ii = self.world.intersections[0]
         inside = []
         for aid, agent in enumerate(self.agents):
             if ii.x1 <= agent.f['x'] <= ii.x2 and \
@@ -228,13 +303,50 @@ class Environment(gym.Env):
             print("Inside the intersection: %s" % inside)
     
     def is_agent_in_bounds(self, agent):
-        return self.canvas.is_agent_in_bounds(agent)
+        return self.world.is_agent_in_bounds(agent)
 
-    def reset(self):
+    # Everything that affects future steps, as one flat array
+    # If out is given (a previous snapshot), it is overwritten
+    def snapshot(self, out = None):
+        assert(self.ready)
+        if self.snapshots == None: self.snapshots = SnapshotLayout(self)
+        return self.snapshots.save(out)
+
+    def restore(self, snap):
+        assert(self.snapshots != None)
+        self.snapshots.load(snap)
+
+    # Own random stream for initial conditions; seed can be anything
+    # np.random.default_rng takes (eg. a SeedSequence)
+    def seed(self, seed = None):
+        self.rng = np.random.default_rng(seed)
+        self.initial_conditions = None
+        return [seed]
+
+    # Initial conditions of the next episodes resets, drawn in one
+    # vectorized call per init function (see design.draw_initial_conditions)
+    def predraw(self, episodes):
+        assert(episodes > 0)
+        self.initial_conditions = draw_initial_conditions(self.agents,
+            self.rng, episodes)
+        self.initial_index = 0
+        return self.initial_conditions
+
+    def reset(self, seed = None):
         assert(self.ready)
+        if seed is not None: self.seed(seed)
         self.init_time = time.time()
-        for agent in self.agents:
-            agent.reset()
+        if self.initial_conditions is None:
+            for agent in self.agents:
+                agent.reset(self.rng)
+        else:
+            if self.initial_index == len(self.initial_conditions):
+                self.predraw(len(self.initial_conditions))
+            row = self.initial_conditions[self.initial_index]
+            self.initial_index += 1
+            for agent, values in zip(self.agents, row):
+                for attr, value in zip(agent.INIT_FEATURES, values.tolist()):
+                    agent.f[attr] = value
 
         if self.reward_specified:
             self.total_reward = 0.0
@@ -242,6 +354,8 @@ class Environment(gym.Env):
 
         if self.debug['record_reward_trajectory']:
             self.trajectory = []
+        if self.episode_recorder != None:
+            self.episode_recorder.reset()
 
         return self.state()
     
@@ -270,31 +384,90 @@ class Environment(gym.Env):
 
     def step(self, action):
         assert(self.ready)
-        agents_in_bounds = 0
+        timers = self.timers
+        timers.start()
+        if self.simultaneous:
+            action, rows, inputs = self.control_inputs(action)
+            timers.lap(POLICIES)
+            self.world.dynamics.step(inputs, rows)
+            timers.lap(DYNAMICS)
+        else:
+            action = self.step_agents(action)
+        reward, done, info = self.evaluate(action)
+        state = self.state()
+        timers.lap(STATE)
+        return state, reward, done, info
+
+    def map_action(self, action):
+        if self.discrete:
+            return self.action_mapping[action[0]]
+        return action
+
+    # Order of step_agents: ego first, then the non-egos
+    def step_order(self):
+        ret = [self.ego_id] if self.ego_id != None else []
+        return ret + [aid for aid, agent in enumerate(self.agents) if not agent.ego]
+
+    # First phase of step when not simultaneous: agent by agent, each
+    # policy sees the agents stepped before it. Returns the (mapped)
+    # ego action
+    def step_agents(self, action):
+        action = self.map_action(action)
+        dynamics, timers = self.world.dynamics, self.timers
+        for aid in self.step_order():
+            if not self.agents_drawn[aid]: continue
+            agent = self.agents[aid]
+            if agent.ego:
+                u = action
+            else:
+                u = self.policies[aid](agent)
+                timers.lap(POLICIES)
+            dynamics.step([u], [aid])
+            timers.lap(DYNAMICS)
+        return action
+
+    # First phase of step when simultaneous: control inputs for ego and
+    # non-egos, all computed from the current state. Returns the
+    # (mapped) ego action, and the agent rows and inputs to pass to the
+    # dynamics.
+    def control_inputs(self, action):
+        action = self.map_action(action)
+
+        rows, inputs = [], []
+        if self.ego_id != None and self.agents_drawn[self.ego_id]:
+            rows += [self.ego_id]
+            inputs += [action]
+        # Batched policies (eg. design.AggressiveDriving) are called once
+        # per run of consecutive agents using them: side effects (eg.
+        # priority requests) keep the order of the agents
+        others = [aid for aid, agent in enumerate(self.agents) \
+            if not agent.ego and self.agents_drawn[aid]]
+        i = 0
+        while i < len(others):
+            policy, j = self.policies[others[i]], i+1
+            if getattr(policy, 'batched', False):
+                while j < len(others) and self.policies[others[j]] is policy: j += 1
+                u, _ = policy.batch(self.world, others[i:j])
+                inputs += list(u)
+            else:
+                inputs += [policy(self.agents[others[i]])]
+            i = j
+        rows += others
+        return action, rows, inputs
+
+    # Last phase of step, after the dynamics have been updated:
+    # returns reward, done, info. result is the (reward, info, t) of
+    # the reward structure if it was already stepped (eg. batched)
+    def evaluate(self, action, result = None):
         reward = 0
         done = False
         info = {}
-
-        if self.discrete:
-            action = self.action_mapping[action[0]]
-
-        # update ego
-        if self.ego_id != None:
-            if self.agents_drawn[self.ego_id]:
-                self.agents[self.ego_id].step(action)
-            agents_in_bounds += \
-                self.is_agent_in_bounds(self.agents[self.ego_id])
-
-        # update non-egos
-        for aid, agent in enumerate(self.agents):
-            if not agent.ego and self.agents_drawn[aid]:
-                control_inputs = self.policies[aid](agent)
-                agent.step(control_inputs)
-            agents_in_bounds += self.is_agent_in_bounds(agent)
+        self.timers.start()
 
         # ask the reward structure: what is the reward?
         if self.reward_specified:
-            reward, info, _ = self.reward_structure.step()
+            if result == None: result = self.reward_structure.step(self.timers)
+            reward, info, _ = result
             if self.total_reward + reward > self.clip_to[1]:
                 if self.clip_to[1] != np.inf:
                     reward = self.clip_to[1]-self.total_reward
@@ -315,7 +488,7 @@ class Environment(gym.Env):
             if info['mode'] == 'termination': done = True
 
         # terminate if nothing is within bounds
-        if agents_in_bounds == 0: done = True
+        if self.world.num_agents_in_bounds() == 0: done = True
 
         # debugging
         if self.debug['intersection_enter']:
@@ -334,8 +507,11 @@ class Environment(gym.Env):
             print(info)
         if self.debug['action_buckets']: # bucketize actions
             self.debug_variables['buckets'].add(tuple(action))
+        if self.episode_recorder != None:
+            self.episode_recorder.record(self, action, reward, done, info)
 
-        return self.state(), reward, done, info
+        self.timers.lap(OTHER)
+        return reward, done, info
 
     def get_action_buckets(self, intervals = 10):
         assert(self.debug['action_buckets'] == True)
@@ -354,7 +530,27 @@ class Environment(gym.Env):
             grid[i][j] += 1
         return grid
 
-    def render(self, mode = 'human'):
+    # Offscreen renderer at the current render_size
+    def get_rasterizer(self):
+        w, h = self.render_size if self.render_size != None else \
+            (self.world.w, self.world.h)
+        raster = self.rasterizer
+        if raster == None or raster.world is not self.world or \
+            (raster.w, raster.h) != (w, h):
+            self.rasterizer = Rasterizer(self.world, w, h)
+        return self.rasterizer
+
+    def render(self, mode = 'human', copy = True):
+        assert(mode in self.metadata['render.modes'])
+        if mode == 'rgb_array':
+            frame = self.get_rasterizer().render()
+            if self.recorder != None: self.recorder.capture(frame)
+            return frame.copy() if copy else frame
+
+        if self.canvas == None:
+            import tools.pyglet as graphics
+            self.canvas = graphics.Canvas(self.world)
+
         if not self.rendering:
             self.rendering = True
             self.canvas.set_visible(True)
@@ -363,9 +559,45 @@ class Environment(gym.Env):
         self.canvas.switch_to()
         self.canvas.dispatch_events()
         drew_agents = self.canvas.on_draw()
+        if self.recorder != None: self.recorder.capture(self.canvas.grab())
         self.canvas.flip()
 
         # turn off rendering if nothing is drawn
         if drew_agents == 0:
             self.rendering = False
-            self.canvas.set_visible(False)
\ No newline at end of file
+            self.canvas.set_visible(False)
+
+    # Records the frames of render() calls (any mode) until
+    # stop_recording; arguments are those of design.FrameRecorder
+    def start_recording(self, writer, **kwargs):
+        assert(self.recorder == None)
+        self.recorder = FrameRecorder(writer, **kwargs)
+        return self.recorder
+
+    # Waits for the queued frames to be written
+    def stop_recording(self):
+        assert(self.recorder != None)
+        recorder, self.recorder = self.recorder, None
+        return recorder.close()
+
+    # Records every step into column files (see design.EpisodeRecorder)
+    # until stop_episode_recording
+    def start_episode_recording(self, directory, **kwargs):
+        assert(self.episode_recorder == None)
+        self.episode_recorder = EpisodeRecorder(directory, **kwargs)
+        return self.episode_recorder
+
+    def stop_episode_recording(self):
+        assert(self.episode_recorder != None)
+        recorder, self.episode_recorder = self.episode_recorder, None
+        return recorder.close()
+
+    def close(self):
+        if self.recorder != None:
+            self.stop_recording()
+        if self.episode_recorder != None:
+            self.stop_episode_recording()
+        if self.canvas != None:
+            self.canvas.close()
+            self.canvas = None
+            self.rendering = False
\ No newline at end of file
@@ -0,0 +1,161 @@
+import json
+import os
+import numpy as np
+
+from .parallel import MODES
+
+INDEX = 'index.json'
+
+class EpisodeRecorder:
+    """
+    Streams every step of an Environment into columns of preallocated,
+    memory-mapped .npy shards of chunk_size rows each (a new shard is
+    opened when one is full), so RAM use stays at one chunk per column
+    whatever the number of steps. index.json lists the columns and the
+    shards with their row counts; it is rewritten on every new shard
+    and on flush/close, and readers only see the rows it counts.
+
+    Columns (one row per step, after the dynamics and rewards):
+    features (num_features, num_agents) float64 as in design.Dynamics,
+    action (ego, as passed to the dynamics) float64, ap (SeqAP bitmask)
+    int64, reward float64, done bool, mode int8 (index in MODES, -1 for
+    none), t int32 (steps since reset, 1 for the first step).
+
+    recorder = env.start_episode_recording('runs/eval', chunk_size = 2**16)
+    ... env.step(...) ...
+    env.stop_episode_recording() => number of steps recorded
+    reader = EpisodeReader('runs/eval')
+    """
+
+    def __init__(self, directory, chunk_size = 2**16):
+        assert(chunk_size > 0)
+        os.makedirs(directory, exist_ok = True)
+        assert(not os.path.exists(os.path.join(directory, INDEX)))
+        self.directory, self.chunk_size = directory, chunk_size
+        self.columns = None # name => (dtype, row shape)
+        self.shards = [] # row counts
+        self.chunk = None # name => memmap of the current shard
+        self.row = chunk_size # in the current shard (full: open one)
+        self.steps = 0
+        self.t = 0
+
+    def reset(self):
+        self.t = 0
+
+    # Column layout from the first row
+    def describe(self, row):
+        self.columns = {name: (np.asarray(value).dtype.str, np.shape(value)) \
+            for name, value in row.items()}
+
+    def open_shard(self):
+        self.flush()
+        shard = len(self.shards)
+        self.chunk = {}
+        for name, (dtype, shape) in self.columns.items():
+            path = os.path.join(self.directory, '%s.%06d.npy' % (name, shard))
+            self.chunk[name] = np.lib.format.open_memmap(path, mode = 'w+',
+                dtype = np.dtype(dtype), shape = (self.chunk_size,) + tuple(shape))
+        self.shards += [0]
+        self.row = 0
+        self.write_index()
+
+    def write_index(self):
+        index = {
+            'chunk_size': self.chunk_size,
+            'columns': {name: {'dtype': dtype, 'shape': list(shape)} \
+                for name, (dtype, shape) in self.columns.items()},
+            'shards': self.shards,
+            'modes': MODES,
+        }
+        path = os.path.join(self.directory, INDEX)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def record(self, env, action, reward, done, info):
+        self.t += 1
+        rs = env.reward_structure if env.reward_specified else None
+        mode = MODES.index(info['mode']) if 'mode' in info else -1
+        if self.columns == None:
+            self.describe({
+                'features': env.world.dynamics.data,
+                'action': np.asarray(action, dtype = np.float64),
+                'ap': np.int64(0), 'reward': np.float64(0),
+                'done': np.bool_(False), 'mode': np.int8(0), 't': np.int32(0),
+            })
+        if self.row == self.chunk_size: self.open_shard()
+        chunk, row = self.chunk, self.row
+        chunk['features'][row] = env.world.dynamics.data
+        chunk['action'][row] = action
+        chunk['ap'][row] = int(rs._p) if rs != None else 0
+        chunk['reward'][row] = reward
+        chunk['done'][row] = done
+        chunk['mode'][row] = mode
+        chunk['t'][row] = self.t
+        self.row += 1
+        self.shards[-1] = self.row
+        self.steps += 1
+
+    # Makes the recorded rows visible to readers
+    def flush(self):
+        if self.chunk == None: return
+        for column in self.chunk.values():
+            column.flush()
+        self.write_index()
+
+    def close(self):
+        self.flush()
+        self.chunk = None
+        return self.steps
+
+class EpisodeReader:
+    """
+    Opens what an EpisodeRecorder wrote, without copying: every shard
+    of a column is a read-only memory map, cut to its recorded rows.
+
+    reader = EpisodeReader('runs/eval')
+    len(reader) => number of steps
+    reader.shards('reward') => [(rows,) memmap, ...], zero-copy
+    reader['reward'] => (steps,) array, zero-copy if there is one shard
+        (else the shards are concatenated)
+    reader.episodes() => [(start, stop), ...] rows of each episode
+    reader.modes => names of the mode column values
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX)) as f:
+            index = json.load(f)
+        self.chunk_size = index['chunk_size']
+        self.columns = index['columns']
+        self.counts = index['shards']
+        self.modes = index['modes']
+        self.cache = {}
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def keys(self):
+        return self.columns.keys()
+
+    def shards(self, name):
+        assert(name in self.columns)
+        if name not in self.cache:
+            self.cache[name] = [np.load(os.path.join(self.directory,
+                '%s.%06d.npy' % (name, shard)), mmap_mode = 'r')[:count] \
+                for shard, count in enumerate(self.counts)]
+        return self.cache[name]
+
+    def __getitem__(self, name):
+        shards = self.shards(name)
+        if len(shards) == 1: return shards[0]
+        column = self.columns[name]
+        if len(shards) == 0:
+            return np.zeros((0,) + tuple(column['shape']), dtype = column['dtype'])
+        return np.concatenate(shards)
+
+    def episodes(self):
+        t = self['t']
+        starts = np.flatnonzero(t == 1).tolist()
+        if len(t) > 0 and (len(starts) == 0 or starts[0] != 0): starts = [0] + starts
+        return list(zip(starts, starts[1:] + [len(t)]))
@@ -4,17 +4,34 @@ import numpy as np
 
 @total_ordering
 class Feature:
-    # holds a certain feature
+    # holds a certain feature; the value can also live in a shared
+    # array, data[index] (eg. a Features array, or an agent's column
+    # in design.Dynamics), in which case this is just a view; writes
+    # call _moved() if set (see Features.bind)
 
-    def __init__(self, name, value):
+    __slots__ = ['name', 'dtype', '_data', '_index', '_moved']
+
+    def __init__(self, name, value, data = None, index = 0):
         self.name = name
-        self.value = value
         self.dtype = type(value)
         assert(type(value) in [float, int, bool])
-   
+        if data is None: data = [value]
+        self._data, self._index = data, index
+        self._moved = None
+        self.value = value
+
+    @property
+    def value(self):
+        return self._data[self._index]
+
+    @value.setter
+    def value(self, value):
+        self._data[self._index] = value
+        if self._moved is not None: self._moved()
+
     def __repr__(self):
         return "%s:%g" % (self.name, self.value)
-    
+
     def __eq__(self, v):
         if type(v) in [float, int, bool]:
             return self.value == v
@@ -24,7 +41,7 @@ class Feature:
             return str(self) == v
         else:
             return NotImplementedError()
-    
+
     def __lt__(self, v):
         if type(v) in [float, int, bool]:
             return self.value < v
@@ -39,28 +56,86 @@ class Feature:
 class Features:
     # holds a bunch of features, almost like utilities.ltl.Bits
     # but the features can be any value
+    # Values live in one float64 array (self.data, feature i at
+    # data[i]); self.o has a Feature view per key. If data is given,
+    # it is used as the (fixed layout) array, else one is allocated.
+    # Once bound with moved, writes to the features in watch call
+    # moved() (eg. design.Dynamics logs which agents moved)
+    # f = Features({'x': 1.0, 'v': 0.0})
+    # f['x'], f.x => 1.0
+    # f.numpy() => new float32 array
+    # f.data => the array itself (float64, no copy)
 
-    def __init__(self, f):
+    def __init__(self, f, data = None):
         assert(type(f) == dict)
-        self.o = {key: Feature(key, value) for key, value in f.items()}
-    
+        self.fixed = data is not None
+        self.moved, self.watch = None, ()
+        if data is None:
+            data = np.array(list(f.values()), dtype = np.float64)
+        else:
+            assert(len(data) == len(f))
+        self.data = data
+        self.index = {key: i for i, key in enumerate(f.keys())}
+        self.o = {key: Feature(key, value, data, i) \
+            for i, (key, value) in enumerate(f.items())}
+
+    # Move all features into data (fixed layout from now on), keeping
+    # the same Feature objects
+    def bind(self, data, moved = None, watch = ()):
+        assert(len(data) == len(self.o))
+        data[:] = self.data
+        for key, feature in self.o.items():
+            feature._data = data
+            feature._moved = moved if key in watch else None
+        self.data = data
+        self.moved, self.watch = moved, tuple(watch)
+        self.fixed = True
+
     def __getitem__(self, index):
-        return self.o[index].value
-    
+        return self.data[self.index[index]]
+
     def __setitem__(self, index, value):
-        if index not in self.o:
-            self.o[index] = Feature(index, value)
+        if index not in self.index:
+            assert(not self.fixed) # fixed layout
+            self.data = np.append(self.data, np.float64(value))
+            self.index[index] = len(self.o)
+            self.o[index] = Feature(index, value, self.data, len(self.o))
+            for feature in self.o.values():
+                feature._data = self.data
         else:
-            self.o[index].value = value
+            self.data[self.index[index]] = value
+            if index in self.watch: self.moved()
+
+    # f.x is f['x']
+    def __getattr__(self, name):
+        index = self.__dict__.get('index')
+        if index is None or name not in index: raise AttributeError(name)
+        return self.data[index[name]]
+
+    def __setattr__(self, name, value):
+        index = self.__dict__.get('index')
+        if index is not None and name in index and name not in self.__dict__:
+            self.data[index[name]] = value
+            if name in self.watch: self.moved()
+        else:
+            object.__setattr__(self, name, value)
 
     def __repr__(self):
         return ", ".join([str(item) for item in self.o.values()])
-    
+
     def keys(self):
         return self.o.keys()
-    
+
+    # A new array (f.data is the array itself)
     def numpy(self, dtype = np.float32):
-        return np.array([item.numpy(dtype) for item in self.o.values()])
-    
+        return self.data.astype(dtype)
+
+    # int/bool features are given back as such, unless they were set to
+    # another value since (eg. a float x)
     def get_dict(self):
-        return {key: self.o[key].value for key in self.o.keys()}
\ No newline at end of file
+        ret = dict(zip(self.index.keys(), self.data.tolist()))
+        for key, feature in self.o.items():
+            value = ret[key]
+            if feature.dtype != float and feature.dtype(value) == value:
+                ret[key] = feature.dtype(value)
+        return ret
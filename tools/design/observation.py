@@ -0,0 +1,168 @@
+import numpy as np
+
+import tools.misc as utilities
+
+# A value of the traced state dict that is read from the environment
+# on every step: agent features ('f', aid, index) or APs ('p', None, bit)
+class Source:
+    __slots__ = ['kind', 'aid', 'index']
+
+    def __init__(self, kind, aid, index):
+        self.kind, self.aid, self.index = kind, aid, index
+
+class TracedFeatures:
+
+    def __init__(self, aid, keys):
+        self.aid, self._k = aid, keys
+
+    def get_dict(self):
+        return {k: Source('f', self.aid, i) for i, k in enumerate(self._k)}
+
+class TracedAP:
+
+    def __init__(self, keys):
+        self._k = keys
+
+    def get_dict(self, keys = None):
+        return {k: Source('p', None, i) for i, k in enumerate(self._k) \
+            if keys == None or k in keys}
+
+class TracedAgent:
+
+    def __init__(self, aid, agent):
+        self.f = TracedFeatures(aid, list(agent.f.keys()))
+
+class TracedRewardStructure:
+
+    def __init__(self, rs):
+        self._p = TracedAP(list(rs._p._k))
+
+class ObservationLayout:
+    """
+    Compiled layout of Environment.state(), derived once (at make_ready)
+    from the state dict. ego_fn/other_fn are traced with stand-ins for
+    the agent and the reward structure: values coming from
+    agent.f.get_dict() and rs._p.get_dict() are then copied straight
+    from the feature arrays / AP bits into a preallocated buffer, and
+    literals written in the function (or None) are constants. Agents
+    whose function returns anything else (eg. a value read from the
+    environment, which may change) are evaluated as before, on every
+    step, into their slice of the buffer.
+    Same values, order, dtype and zero padding as dict_to_numpy.
+
+    layout = ObservationLayout(env, env.state_dict())
+    layout.fill() => the buffer, overwritten by the next fill()
+    """
+
+    def __init__(self, env, reference):
+        self.env = env
+        flat = np.asarray(utilities.dict_to_numpy(reference))
+        self.buffer = np.zeros(flat.shape, dtype = flat.dtype)
+        self.generic = [] # (aid, start, stop)
+        self.feature_runs = [] # (aid, start, feature index, length)
+        self.ap_runs = [] # (start, bit, length)
+        const_pos, const_val = [], []
+        rs = env.reward_structure if env.reward_specified else None
+
+        start = 0
+        for aid, agent in enumerate(env.agents):
+            size = np.size(utilities.dict_to_numpy(reference[aid]))
+            leaves = self.trace(aid, agent, rs)
+            if leaves == None or len(leaves) != size:
+                self.generic += [(aid, start, start+size)]
+            else:
+                for pos, leaf in enumerate(leaves, start):
+                    if type(leaf) != Source:
+                        const_pos += [pos]
+                        const_val += [leaf]
+                    elif leaf.kind == 'f':
+                        self.add_run(self.feature_runs, (aid, pos, leaf.index, 1))
+                    else:
+                        self.add_run(self.ap_runs, (pos, leaf.index, 1))
+            start += size
+        self.padding = start # zero_pad features from here on
+        self.const_pos = np.array(const_pos, dtype = int)
+        self.const_val = np.array(const_val, dtype = flat.dtype)
+
+        if rs != None:
+            self.shifts = np.arange(len(rs._p._k), dtype = np.int64)
+            self.bits = np.zeros(len(rs._p._k), dtype = np.int64)
+        if len(self.ap_runs) > 0: assert(len(rs._p._k) <= 63)
+
+        # anything we cannot reproduce is evaluated as before
+        if not np.array_equal(self.fill(), flat):
+            self.generic, start = [], 0
+            for aid in range(len(env.agents)):
+                size = np.size(utilities.dict_to_numpy(reference[aid]))
+                self.generic += [(aid, start, start+size)]
+                start += size
+            self.feature_runs, self.ap_runs = [], []
+            self.const_pos, self.const_val = self.const_pos[:0], self.const_val[:0]
+
+    # Extends the last run if (start, index) continue it
+    @staticmethod
+    def add_run(runs, run):
+        if len(runs) > 0:
+            last = runs[-1]
+            if last[:-3] == run[:-3] and last[-3]+last[-1] == run[-3] and \
+                last[-2]+last[-1] == run[-2]:
+                runs[-1] = last[:-1]+(last[-1]+1,)
+                return
+        runs += [run]
+
+    # (type, value) of the numbers written in the code of fn (and of the
+    # functions defined inside it)
+    @staticmethod
+    def literals(fn):
+        ret = set()
+        def collect(code):
+            for const in code.co_consts:
+                if type(const) in [float, int, bool]:
+                    ret.add((type(const), const))
+                elif type(const) == type(code):
+                    collect(const)
+        collect(fn.__code__)
+        return ret
+
+    # Flattened leaves of the state dict of agent aid (as dict_to_numpy
+    # would flatten them), or None if it cannot be traced
+    def trace(self, aid, agent, rs):
+        env = self.env
+        fn = env.ego_fn if aid == env.ego_id else env.other_fn
+        literals = self.literals(fn)
+        try:
+            traced = fn(TracedAgent(aid, agent),
+                TracedRewardStructure(rs) if rs != None else None)
+        except Exception:
+            return None
+        leaves = []
+        def flatten(x):
+            if type(x) == dict:
+                for value in x.values():
+                    if not flatten(value): return False
+                return True
+            if x is None: x = -1.0
+            elif type(x) != Source:
+                if type(x) not in [float, int, bool]: return False
+                if (type(x), x) not in literals: return False # eg. read from env
+            leaves.append(x)
+            return True
+        if type(traced) != dict or not flatten(traced): return None
+        return leaves
+
+    def fill(self):
+        env, buffer = self.env, self.buffer
+        for aid, start, stop in self.generic:
+            fn = env.ego_fn if aid == env.ego_id else env.other_fn
+            buffer[start:stop] = utilities.dict_to_numpy(fn(env.agents[aid],
+                env.reward_structure))
+        for aid, start, index, n in self.feature_runs:
+            buffer[start:start+n] = env.agents[aid].f.data[index:index+n]
+        if len(self.ap_runs) > 0:
+            np.right_shift(int(env.reward_structure._p), self.shifts, out = self.bits)
+            np.bitwise_and(self.bits, 1, out = self.bits)
+            for start, index, n in self.ap_runs:
+                buffer[start:start+n] = self.bits[index:index+n]
+        buffer[self.const_pos] = self.const_val
+        buffer[self.padding:] = 0
+        return buffer
@@ -0,0 +1,174 @@
+import multiprocessing as mp
+import traceback
+import numpy as np
+
+import tools.design as design
+
+# Result modes written to shared memory instead of info dicts
+MODES = ['reward', 'termination', 'success']
+
+def _shared(ctx, typecode, dtype, shape):
+    raw = ctx.RawArray(typecode, int(np.prod(shape)))
+    return raw, shape, dtype
+
+def _view(buf):
+    raw, shape, dtype = buf
+    return np.frombuffer(raw, dtype = dtype).reshape(shape)
+
+def _worker(conn, make_env, ids, buffers):
+    try:
+        venv = design.VectorEnvironment(make_env, len(ids))
+        b = {key: _view(buf) for key, buf in buffers.items()}
+        conn.send(('ready', None))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        return
+    while True:
+        cmd, slot = conn.recv()
+        try:
+            if cmd == 'step':
+                actions = b['actions'][slot, ids]
+                if venv.envs[0].discrete: actions = actions.astype(int)
+                obs, reward, done, info = venv.step(actions)
+                b['reward'][slot, ids] = reward
+                b['done'][slot, ids] = done
+                b['mode'][slot, ids] = [MODES.index(i['mode']) \
+                    if 'mode' in i else -1 for i in info]
+                for k, i in enumerate(info):
+                    if done[k]: b['terminal'][slot, ids[k]] = i['terminal_observation']
+            elif cmd == 'reset':
+                obs = venv.reset()
+            elif cmd == 'seed': # slot holds the seeds of our copies
+                venv.seed(slot)
+                conn.send(('ok', None))
+                continue
+            elif cmd == 'close':
+                venv.close()
+                conn.send(('closed', None))
+                return
+            b['obs'][slot, ids] = obs
+            conn.send(('ok', None))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+class ParallelEnvironment:
+    """
+    N copies of an Environment scenario spread over worker processes,
+    for policies that cannot be vectorized (arbitrary lambdas).
+    Each worker hosts a VectorEnvironment over its share of the copies.
+
+    Actions, observations, rewards, done flags and result modes are
+    exchanged through a shared-memory ring of `slots` slots; per tick
+    each worker only receives a ('step', slot) command. Returned arrays
+    are views into the ring and stay valid for the next slots-1 steps.
+    info[i] only carries 'mode' (and 'terminal_observation' on
+    auto-reset), not the violation/satisfaction lists.
+
+    penv = ParallelEnvironment(craft.OneStoppedCar, 64, num_workers = 8)
+    obs = penv.reset() => (N, obs_dim)
+    penv.seed(0) => same streams as VectorEnvironment.seed(0)
+    obs, reward, done, info = penv.step(actions)
+    penv.step_async(actions); ...; penv.step_wait()
+    penv.close()
+    """
+
+    def __init__(self, make_env, n, num_workers = None, slots = 2, context = None):
+        assert(n > 0 and slots > 0)
+        if num_workers == None: num_workers = min(n, mp.cpu_count())
+        assert(0 < num_workers <= n)
+        ctx = mp.get_context(context)
+        self.num_envs = n
+        self.slots = slots
+        self.slot = 0
+
+        # probe one copy for spaces and sizes
+        env = make_env()
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        self.discrete = env.discrete
+        obs_dim = env.state().shape[0]
+        action_dim = 1 if env.discrete else env.action_space.shape[0]
+        env.close()
+
+        self.buffers = {
+            'actions': _shared(ctx, 'd', np.float64, (slots, n, action_dim)),
+            'obs': _shared(ctx, 'd', np.float64, (slots, n, obs_dim)),
+            'terminal': _shared(ctx, 'd', np.float64, (slots, n, obs_dim)),
+            'reward': _shared(ctx, 'd', np.float64, (slots, n)),
+            'done': _shared(ctx, 'B', np.bool_, (slots, n)),
+            'mode': _shared(ctx, 'b', np.int8, (slots, n)),
+        }
+        self.b = {key: _view(buf) for key, buf in self.buffers.items()}
+
+        self.conns, self.workers = [], []
+        self.ids = np.array_split(np.arange(n), num_workers)
+        for ids in self.ids:
+            conn, child_conn = ctx.Pipe()
+            worker = ctx.Process(target = _worker,
+                args = (child_conn, make_env, ids, self.buffers), daemon = True)
+            worker.start()
+            child_conn.close()
+            self.conns += [conn]
+            self.workers += [worker]
+        self._wait()
+        self.waiting = False
+
+    def _send(self, cmd):
+        for conn in self.conns:
+            conn.send((cmd, self.slot))
+
+    def _wait(self):
+        errors = []
+        for conn in self.conns:
+            status, msg = conn.recv()
+            if status == 'error': errors += [msg]
+        if len(errors) > 0:
+            raise RuntimeError('Worker failed:\n%s' % errors[0])
+
+    def seed(self, seed = None):
+        assert(not self.waiting)
+        seeds = np.random.SeedSequence(seed).spawn(self.num_envs)
+        for conn, ids in zip(self.conns, self.ids):
+            conn.send(('seed', [seeds[i] for i in ids]))
+        self._wait()
+        return seeds
+
+    def reset(self):
+        assert(not self.waiting)
+        self._send('reset')
+        self._wait()
+        return self.b['obs'][self.slot]
+
+    def step_async(self, actions):
+        assert(not self.waiting)
+        self.slot = (self.slot + 1) % self.slots
+        a = self.b['actions'][self.slot]
+        a[:] = np.asarray(actions, dtype = np.float64).reshape(a.shape)
+        self._send('step')
+        self.waiting = True
+
+    def step_wait(self):
+        assert(self.waiting)
+        self._wait()
+        self.waiting = False
+        s = self.slot
+        done, mode = self.b['done'][s], self.b['mode'][s]
+        info = []
+        for i in range(self.num_envs):
+            info += [{'mode': MODES[mode[i]]} if mode[i] >= 0 else {}]
+            if done[i]: info[i]['terminal_observation'] = self.b['terminal'][s, i]
+        return self.b['obs'][s], self.b['reward'][s], done, info
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.waiting: self._wait()
+        self.waiting = False
+        for conn in self.conns:
+            conn.send(('close', None))
+        for conn, worker in zip(self.conns, self.workers):
+            conn.recv()
+            worker.join()
+        self.conns, self.workers = [], []
@@ -0,0 +1,168 @@
+import numpy as np
+
+import tools.design as design
+
+class AggressiveDriving:
+    """
+    Car.aggressive_driving for many agents of a world in one pass over
+    the arrays of world.dynamics, with the same output per agent. Only
+    the priority requests/releases are done agent by agent (in order),
+    and only for agents in a stop region or holding priority.
+
+    Can be used as the default policy of an Environment. With
+    simultaneous = True, consecutive agents sharing it are computed
+    together on every step (one batch per run, so priority requests
+    keep the order of the agents); otherwise it is called agent by
+    agent, as agents are stepped one by one.
+
+    policy = AggressiveDriving()
+    env = design.Environment(world, policy)
+    u, branches = policy.batch(world, rows) => u is (len(rows), 2),
+        branches[i] is the controller that fired, eg. 'LQR0'
+    policy(agent) => (acc, psi_dot), like agent.aggressive_driving()
+    """
+
+    batched = True
+    BRANCHES = ['EmergencyStop0', 'EmergencyStop1', 'Decelerate0', 'Enter0',
+        'EmergencyStop2', 'LQR0', 'Default0']
+
+    def __init__(self):
+        self.branches = [] # of the last batch
+
+    def __call__(self, agent):
+        row = agent.world.agents.index(agent)
+        u, _ = self.batch(agent.world, [row])
+        return u[0, 0], u[0, 1]
+
+    # Closest box ahead of each agent, clipped to its lane as in
+    # Car.closest_{stop_region,intersection}_forward; boxes[r] only
+    # applies to agents with applies[:, r]. Returns index (-1 if none)
+    # and displacement
+    @staticmethod
+    def closest_box_forward(boxes, applies, ex, ey, eux, euy, horizontal, hw,
+        skip_clipped_empty):
+        k = len(ex)
+        if len(boxes) == 0: return np.full(k, -1), np.full(k, np.inf)
+        bx1, bx2, by1, by2 = [np.array([getattr(b, a) for b in boxes], dtype = float)[None, :] \
+            for a in ['x1', 'x2', 'y1', 'y2']]
+        lane = np.where(horizontal, ey, ex)[:, None]
+        l1, l2 = lane-hw, lane+hw
+        c1 = np.where(horizontal[:, None], by1, bx1)
+        c2 = np.where(horizontal[:, None], by2, bx2)
+        # Box.clip along the lane's (finite) bounds
+        below, above = l2 <= c1, c2 <= l1
+        n1 = np.where(below, c1, np.where(above, c2, np.where(l1 >= c1, l1, c1)))
+        n2 = np.where(below, c1, np.where(above, c2, np.where(l2 <= c2, l2, c2)))
+        cx1, cx2 = np.where(horizontal[:, None], bx1, n1), np.where(horizontal[:, None], bx2, n2)
+        cy1, cy2 = np.where(horizontal[:, None], n1, by1), np.where(horizontal[:, None], n2, by2)
+        if skip_clipped_empty:
+            empty = (cx1 == cx2) | (cy1 == cy2)
+        else:
+            empty = (bx1 == bx2) | (by1 == by2)
+        dx = (cx1+cx2)/2-ex[:, None]
+        dy = (cy1+cy2)/2-ey[:, None]
+        displacement = np.sqrt(dx**2+dy**2)
+        valid = applies & ~empty & (dx*eux[:, None]+dy*euy[:, None] > 0)
+        displacement = np.where(valid, displacement, np.inf)
+        index = np.argmin(displacement, axis = 1)
+        d = displacement[np.arange(k), index]
+        return np.where(np.any(valid, axis = 1), index, -1), d
+
+    def batch(self, world, rows):
+        Car = design.Car
+        rows = np.asarray(rows, dtype = int)
+        k = len(rows)
+        if k == 0:
+            self.branches = []
+            return np.zeros((0, 2)), []
+        dyn = world.dynamics
+        x, y, v, acc = dyn.x, dyn.y, dyn.v, dyn.acc
+        ux, uy = dyn.direction
+        ex, ey, ev, eux, euy = x[rows], y[rows], v[rows], ux[rows], uy[rows]
+        modes = [world.agents[i].direction.mode for i in rows]
+        assert(all([mode in ['+x', '-x', '+y', '-y'] for mode in modes]))
+        assert(world.lane_width > 0)
+        hw = world.lane_width / 2.0
+        horizontal = np.array(['x' in mode for mode in modes])
+        ar = np.arange(k)
+
+        with np.errstate(invalid = 'ignore'):
+            # cc: closest agent ahead in the lane (Car.get_relevant_agents
+            # and Car.closest_agent_forward), over (k, N) arrays rather
+            # than k design.AgentIndex queries: a lane band holds O(N)
+            # agents anyway, and one vectorized pass is much faster
+            lane = np.where(horizontal, ey, ex)[:, None]
+            across = np.where(horizontal[:, None], y[None, :], x[None, :])
+            relevant = (lane-hw <= across) & (across <= lane+hw)
+            relevant[ar, rows] = False
+            dx, dy = x[None, :]-ex[:, None], y[None, :]-ey[:, None]
+            forward = relevant & (dx*eux[:, None]+dy*euy[:, None] > 0)
+            displacement = np.where(forward, np.sqrt(dx**2+dy**2), np.inf)
+            cc = np.argmin(displacement, axis = 1)
+            cc_d = displacement[ar, cc]
+            has_cc = np.any(forward, axis = 1)
+
+            # csr, cif: closest stop region / intersection ahead
+            stops = world.stopx+world.stopy
+            applies = np.array([[horizontal[i] if r < len(world.stopx) else not horizontal[i] \
+                for r in range(len(stops))] for i in range(k)], dtype = bool).reshape(k, -1)
+            csr, csr_d = self.closest_box_forward(stops, applies, ex, ey, eux, euy,
+                horizontal, hw, True)
+            intersections = world.intersections
+            cif, _ = self.closest_box_forward(intersections,
+                np.ones((k, len(intersections)), dtype = bool), ex, ey, eux, euy,
+                horizontal, hw, False)
+            has_csr, has_cif = csr >= 0, cif >= 0
+
+            # agents inside each intersection
+            inside = np.zeros((len(intersections), dyn.n), dtype = bool)
+            for r, box in enumerate(intersections):
+                inside[r] = (box.x1 <= x) & (x <= box.x2) & (box.y1 <= y) & (y <= box.y2)
+            others = inside[np.maximum(cif, 0)] if len(intersections) > 0 \
+                else np.zeros((k, dyn.n), dtype = bool)
+            others[ar, rows] = False
+            intersection_clear = has_cif & ~np.any(others, axis = 1)
+            in_any_intersection = np.any(inside[:, rows], axis = 0)
+            within_stop_region = world.region_index().any(ex, ey, 'StopRegion')
+
+            # priority, agent by agent (requests/releases are ordered)
+            pm = world.priority_manager
+            has_priority = np.zeros(k, dtype = bool)
+            owner = pm.current_owner
+            for i in np.flatnonzero((within_stop_region & intersection_clear) | \
+                np.array([world.agents[r].name == owner for r in rows])):
+                name = world.agents[rows[i]].name
+                if within_stop_region[i] and intersection_clear[i]:
+                    pm.request_priority(name)
+                has_priority[i] = pm.has_priority(name)
+                if not within_stop_region[i] and has_priority[i]:
+                    pm.release_priority(name)
+
+            # the controller cascade of Car.aggressive_driving
+            ego_after_stop = (0.5 * ev ** 2) / Car.MAX_ACCELERATION
+            cc_v = v[cc]
+            cc_after_stop = cc_d+(0.5 * cc_v ** 2) / Car.MAX_ACCELERATION
+            max_v_stop = (0.5 * Car.SPEED_MAX ** 2) / Car.MAX_ACCELERATION
+            conditions = [
+                has_cc & (ux[cc]*eux+uy[cc]*euy <= 0),
+                has_cc & (cc_after_stop-ego_after_stop <= Car.SAFETY_GAP),
+                has_csr & (csr_d > 0) & (csr_d <= max_v_stop) & (csr_d <= ego_after_stop),
+                (within_stop_region & intersection_clear & has_priority) | in_any_intersection,
+                within_stop_region,
+                ~within_stop_region & has_cc & (cc_d-Car.SAFETY_GAP > 0),
+            ]
+            choices = [
+                np.full(k, -Car.MAX_ACCELERATION),
+                np.full(k, -Car.MAX_ACCELERATION),
+                Car.K1*(0-csr_d)+Car.K2*(0-ev),
+                Car.A1*(Car.SPEED_MAX-ev),
+                np.full(k, -Car.MAX_ACCELERATION),
+                acc[cc]+Car.K1*(cc_d-Car.SAFETY_GAP)+Car.K2*(cc_v-ev),
+            ]
+            u = np.zeros((k, 2))
+            u[:, 0] = np.clip(np.select(conditions, choices, Car.A2*(Car.SPEED_MAX-ev)),
+                -Car.MAX_ACCELERATION, Car.MAX_ACCELERATION)
+            branch = np.select(conditions, np.arange(len(conditions)), len(conditions))
+
+        self.branches = [self.BRANCHES[b] for b in branch]
+        return u, self.branches
@@ -0,0 +1,140 @@
+import numpy as np
+
+class Rasterizer:
+    """
+    Draws a design.World into an (h, w, 3) uint8 array with numpy only,
+    so frames can be made without a display (video logs, pixel based
+    agents). Same picture as a tools.pyglet.Canvas in flat colors: grass,
+    roads (lanes, intersections), markings (stop regions, lane
+    separators) on top, then one rotated rectangle per agent in bounds.
+    Row 0 is the top of the window. The static part is drawn once; a
+    frame is a copy of it plus the vehicles. width/height (default the
+    world's) set the resolution.
+
+    raster = Rasterizer(world, 84, 84)
+    raster.render() => (84, 84, 3) buffer, overwritten by the next call
+    raster.render(out = frame) => frame
+    raster.render_many([world, ...]) => (N, 84, 84, 3) buffer, worlds
+        with the same static elements (eg. of a VectorEnvironment)
+    """
+
+    COLORS = {
+        'Grass': (105, 240, 92),
+        'Road': (132, 130, 133),
+        'StopRegion': (204, 204, 204),
+        'Separator': (255, 255, 255),
+        'Vehicle': (141, 47, 47),
+        'Ego': (47, 47, 141),
+    }
+
+    def __init__(self, world, width = None, height = None, colors = {}):
+        self.world = world
+        self.w = world.w if width == None else width
+        self.h = world.h if height == None else height
+        assert(self.w > 0 and self.h > 0)
+        self.colors = dict(self.COLORS, **colors)
+        # world pixels => output pixels
+        self.sx, self.sy = self.w / world.w, self.h / world.h
+        self.background = self.draw_static()
+        self.buffer = np.empty((self.h, self.w, 3), dtype = np.uint8)
+        self.buffers = None
+
+        # Pixel offsets covering a vehicle at any rotation
+        agent = world.agents[0] if len(world.agents) > 0 else None
+        self.vehicle = (0.0, 0.0) if agent == None else \
+            (agent.VEHICLE_X * world.scale, agent.VEHICLE_Y * world.scale)
+        radius = np.hypot(self.vehicle[0] * self.sx, self.vehicle[1] * self.sy) / 2
+        offsets = np.arange(-int(np.ceil(radius)), int(np.ceil(radius))+1)
+        self.dy, self.dx = np.meshgrid(offsets, offsets, indexing = 'ij')
+
+    # Fills pixels whose centers are in [x1, x2) x [y1, y2) (window
+    # coordinates, y up) of image (rows are y down)
+    def fill(self, image, x1, x2, y1, y2, color):
+        tx, ty = self.world.transform_x, self.world.transform_y
+        c1 = max(int(np.ceil(tx(x1) * self.sx - 0.5)), 0)
+        c2 = min(int(np.ceil(tx(x2) * self.sx - 0.5)), self.w)
+        r1 = max(int(np.ceil(ty(y1) * self.sy - 0.5)), 0)
+        r2 = min(int(np.ceil(ty(y2) * self.sy - 0.5)), self.h)
+        if c1 < c2 and r1 < r2:
+            image[self.h-r2:self.h-r1, c1:c2] = color
+
+    def draw_static(self):
+        image = np.empty((self.h, self.w, 3), dtype = np.uint8)
+        image[:] = self.colors['Grass']
+        markings = []
+        for item in self.world.static:
+            if item[0] in ['Lane', 'Intersection']:
+                self.fill(image, *item[1:5], self.colors['Road'])
+            elif item[0] in ['StopRegionX', 'StopRegionY']:
+                markings += [(item[1:5], self.colors['StopRegion'])]
+            elif item[0] == 'TwoLaneRoad':
+                x1, x2, y1, y2, sep = item[1:]
+                self.fill(image, x1, x2, y1, y2, self.colors['Road'])
+                if abs(y1-y2) < abs(x1-x2):
+                    mid = (y1+y2) / 2
+                    box = (x1, x2, mid-sep/2, mid+sep/2)
+                else:
+                    mid = (x1+x2) / 2
+                    box = (mid-sep/2, mid+sep/2, y1, y2)
+                markings += [(box, self.colors['Separator'])]
+        # markings on top of all roads (as in Canvas)
+        for box, color in markings:
+            self.fill(image, *box, color)
+        return image
+
+    # Rows, columns and agent of all vehicle pixels, for agents at x, y
+    # (world coordinates) with headings theta (clockwise, as in
+    # Dynamics); later agents are drawn over earlier ones
+    def vehicle_pixels(self, x, y, theta):
+        world = self.world
+        cx = world.transform_x(x) * self.sx
+        cy = world.transform_y(y) * self.sy
+        inside = (world.minx <= x) & (x <= world.maxx) & \
+            (world.miny <= y) & (y <= world.maxy)
+        # pixel centers around each vehicle, (n, S, S)
+        px = np.floor(cx)[:, None, None] + self.dx + 0.5
+        py = np.floor(cy)[:, None, None] + self.dy + 0.5
+        c, s = np.cos(theta)[:, None, None], np.sin(theta)[:, None, None]
+        ux, uy = (px-cx[:, None, None]) / self.sx, (py-cy[:, None, None]) / self.sy
+        along, across = ux*c - uy*s, ux*s + uy*c
+        l, w = self.vehicle[0]/2, self.vehicle[1]/2
+        mask = (-l <= along) & (along < l) & (-w <= across) & (across < w) & \
+            inside[:, None, None] & \
+            (px >= 0) & (px < self.w) & (py >= 0) & (py < self.h)
+        agent = np.broadcast_to(np.arange(len(x))[:, None, None], mask.shape)[mask]
+        rows = self.h-1 - py[mask].astype(int)
+        return rows, px[mask].astype(int), agent
+
+    def agent_colors(self, world):
+        return np.array([self.colors['Ego'] if agent.ego else self.colors['Vehicle'] \
+            for agent in world.agents], dtype = np.uint8).reshape(-1, 3)
+
+    def render(self, out = None):
+        out = self.buffer if out is None else out
+        assert(out.shape == self.buffer.shape and out.dtype == np.uint8)
+        out[:] = self.background
+        d = self.world.dynamics
+        rows, cols, agent = self.vehicle_pixels(d.x, d.y, d.theta)
+        out[rows, cols] = self.agent_colors(self.world)[agent]
+        return out
+
+    def render_many(self, worlds, out = None):
+        shape = (len(worlds), self.h, self.w, 3)
+        if out is None:
+            if self.buffers is None or self.buffers.shape != shape:
+                self.buffers = np.empty(shape, dtype = np.uint8)
+            out = self.buffers
+        assert(out.shape == shape and out.dtype == np.uint8)
+        out[:] = self.background
+        index, colors, x, y, theta = [], [], [], [], []
+        for i, world in enumerate(worlds):
+            assert(world.static == self.world.static)
+            d = world.dynamics
+            index += [np.full(d.n, i)]
+            colors += [self.agent_colors(world)]
+            x, y, theta = x + [d.x], y + [d.y], theta + [d.theta]
+        if len(index) > 0:
+            rows, cols, agent = self.vehicle_pixels(np.concatenate(x),
+                np.concatenate(y), np.concatenate(theta))
+            out[np.concatenate(index)[agent], rows, cols] = np.concatenate(colors)[agent]
+        return out
@@ -0,0 +1,181 @@
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+import zlib
+import numpy as np
+
+# What to do with a frame when all buffers are waiting to be encoded
+POLICIES = ['drop', 'block']
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv', '.mov', '.webm', '.gif']
+
+class PNGWriter:
+    # (h, w, 3) uint8 frames to directory/prefix000000.png, ...
+    # (zlib only; compression runs without the GIL)
+
+    def __init__(self, directory, prefix = 'frame', level = 6):
+        os.makedirs(directory, exist_ok = True)
+        self.directory, self.prefix, self.level = directory, prefix, level
+        self.count = 0
+        self.rows = None
+
+    @staticmethod
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    def encode(self, frame):
+        h, w = frame.shape[:2]
+        # every row starts with its filter type (0, none)
+        if self.rows is None or self.rows.shape != (h, 1+w*3):
+            self.rows = np.zeros((h, 1+w*3), dtype = np.uint8)
+        self.rows[:, 1:] = frame.reshape(h, w*3)
+        return b'\x89PNG\r\n\x1a\n' + \
+            self.chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)) + \
+            self.chunk(b'IDAT', zlib.compress(self.rows.tobytes(), self.level)) + \
+            self.chunk(b'IEND', b'')
+
+    def write(self, frame):
+        name = '%s%06d.png' % (self.prefix, self.count)
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(self.encode(frame))
+        self.count += 1
+
+    def close(self):
+        pass
+
+class FFmpegWriter:
+    # (h, w, 3) uint8 frames piped (raw) to an ffmpeg process that
+    # encodes them to a video file; started on the first frame
+
+    def __init__(self, path, fps = 30):
+        assert(shutil.which('ffmpeg') != None) # ffmpeg must be installed
+        self.path, self.fps = path, fps
+        self.process = None
+
+    def write(self, frame):
+        if self.process == None:
+            h, w = frame.shape[:2]
+            self.process = subprocess.Popen(['ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '%dx%d' % (w, h),
+                '-r', str(self.fps), '-i', '-',
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+                self.path], stdin = subprocess.PIPE)
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self):
+        if self.process != None:
+            self.process.stdin.close()
+            assert(self.process.wait() == 0)
+            self.process = None
+
+# Writer for a path: a video file by extension, else a PNG directory
+def open_writer(path, fps = 30):
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        return FFmpegWriter(path, fps)
+    return PNGWriter(path)
+
+class FrameRecorder:
+    """
+    Records frames (eg. env.render(mode = 'rgb_array', copy = False),
+    or a tools.pyglet.Canvas' grab()) without making the caller wait
+    for encoding. capture() copies the frame into one of queue_size
+    preallocated buffers and queues it; a background thread hands
+    queued frames to the writer (PNGWriter, FFmpegWriter, or anything
+    with write(frame) and close()), then frees their buffers.
+    When all buffers are queued, the policy decides: 'drop' skips the
+    frame (capture returns False, counted in dropped), 'block' waits
+    for a free buffer. Writer errors are raised by the next capture()
+    or close().
+
+    recorder = FrameRecorder('rollout.mp4') => video (needs ffmpeg)
+    recorder = FrameRecorder('frames/', queue_size = 64, policy = 'block')
+    recorder.capture(frame) => True if queued
+    recorder.stats() => {'captured': ., 'dropped': ., 'written': .}
+    recorder.close() => waits for the queued frames
+    with FrameRecorder(writer) as recorder: ...
+    """
+
+    def __init__(self, writer, queue_size = 16, policy = 'drop', fps = 30):
+        assert(queue_size > 0)
+        assert(policy in POLICIES)
+        if type(writer) == str: writer = open_writer(writer, fps)
+        self.writer = writer
+        self.queue_size, self.policy = queue_size, policy
+        self.frames = queue.Queue() # buffers to encode, None to stop
+        self.free = queue.Queue(queue_size) # buffers to capture into
+        self.buffers = None
+        self.captured, self.dropped, self.written = 0, 0, 0
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            buffer = self.frames.get()
+            if buffer is None: return
+            try:
+                if self.error is None:
+                    self.writer.write(buffer)
+                    self.written += 1
+            except Exception as e:
+                self.error = e
+            self.free.put(buffer)
+
+    # A failed writer stays failed: every later capture/close raises
+    def check(self):
+        if self.error is not None: raise self.error
+
+    # Waits for a free buffer, but not for a failed writer
+    def acquire(self):
+        if self.policy == 'drop':
+            try:
+                return self.free.get_nowait()
+            except queue.Empty:
+                return None
+        while True:
+            try:
+                return self.free.get(timeout = 0.1)
+            except queue.Empty:
+                self.check()
+
+    def capture(self, frame):
+        assert(not self.closed)
+        self.check()
+        frame = np.asarray(frame)
+        if self.buffers is None:
+            self.buffers = [np.empty_like(frame, dtype = np.uint8) \
+                for _ in range(self.queue_size)]
+            for buffer in self.buffers:
+                self.free.put(buffer)
+        assert(frame.shape == self.buffers[0].shape)
+        buffer = self.acquire()
+        if buffer is None:
+            self.dropped += 1
+            return False
+        np.copyto(buffer, frame, casting = 'unsafe')
+        self.frames.put(buffer)
+        self.captured += 1
+        return True
+
+    def stats(self):
+        return {'captured': self.captured, 'dropped': self.dropped,
+            'written': self.written}
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.frames.put(None)
+            self.thread.join()
+            self.writer.close()
+        self.check()
+        return self.stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -3,6 +3,8 @@ from tools.misc import combine_dicts, combine_infos
 from inspect import isfunction
 import numpy as np
 
+from .timing import DEFINITIONS, PROPOSITIONS, LTL
+
 class RewardChecker(LTLProperties):
     """
     Slightly faster version of LTLProperties, suitable for reward
@@ -39,24 +41,25 @@ class RewardChecker(LTLProperties):
             ] # if 1, then evaluate the reward function
             self.properties[-1].reset()
 
-    def check(self):
-        assert(self._d.t == self._p.t)
-        t = self._d.t
+    # Advances every property on state; the ones that hold
+    def holding(self, state):
+        return [p for p in self.properties if p(state)[0]]
+
+    # reward, info, t of the properties that hold
+    def combine(self, holding, t):
         total_reward = -np.inf
         violations = []
         satisfactions = []
-        for p in self.properties:
-            status, info = p(int(self._p)) # list(self._p) to see the APs
-            if status:
-                evaluated = combine_dicts(self.objs, self._d.get_dict())
-                evaluated = combine_dicts(evaluated, self._p.get_dict())
-                new_reward = self._r[p.x](evaluated, t)
-                if total_reward == -np.inf:
-                    total_reward = new_reward
-                else:
-                    total_reward = self.combine_rewards(total_reward, new_reward)
-                if "violation" in info: violations += [info["violation"]]
-                if "satisfaction" in info: satisfactions += [info["satisfaction"]]
+        evaluated = None
+        for p in holding:
+            if evaluated == None: evaluated = self.evaluated()
+            new_reward = self._r[p.x](evaluated, t)
+            if total_reward == -np.inf:
+                total_reward = new_reward
+            else:
+                total_reward = self.combine_rewards(total_reward, new_reward)
+            violations += [p.x] if p.mode == 'violation' else []
+            satisfactions += [p.x] if p.mode == 'satisfaction' else []
         info = {}
         if len(violations) > 0: info["violations"] = violations
         if len(satisfactions) > 0: info["satisfactions"] = satisfactions
@@ -64,6 +67,18 @@ class RewardChecker(LTLProperties):
             total_reward = 0
         return total_reward, info, t
 
+    def check(self):
+        assert(self._d.t == self._p.t)
+        return self.combine(self.holding(int(self._p)), self._d.t)
+
+    # objs, definitions and propositions of this step; the namespace
+    # of p if it holds exactly that
+    def evaluated(self):
+        if self._p.pre is self._d and self._p.objs is self.objs:
+            return self._p.namespace
+        evaluated = combine_dicts(self.objs, self._d.get_dict())
+        return combine_dicts(evaluated, self._p.get_dict())
+
     def reset(self):
         for p in self.properties:
             p.reset()
@@ -103,18 +118,38 @@ class RewardStructure:
         r[1]['mode'] = 'reward'
         return r
 
+    # r, t and s in one pass over the same state. Every property is
+    # advanced (the monitors must see each state), but only the rewards
+    # of the group combine_rts would pick are evaluated
+    def check(self):
+        assert(self._d.t == self._p.t)
+        state, t = int(self._p), self._p.t
+        rh, th, sh = [c.holding(state) for c in [self.r, self.t, self.s]]
+        if len(sh) > 0:
+            ret = self.s.combine(sh, t)
+            ret[1]['mode'] = 'success'
+        elif len(th) > 0:
+            ret = self.t.combine(th, t)
+            ret[1]['mode'] = 'termination'
+        else:
+            ret = self.r.combine(rh, t)
+            ret[1]['mode'] = 'reward'
+        return ret
+
     def reset(self):
         self._d.reset()
         self._p.reset()
-        rr = self.r.reset()
-        tt = self.t.reset()
-        ss = self.s.reset()
-        return self.combine_rts(rr, tt, ss)
+        for c in [self.r, self.t, self.s]:
+            for p in c.properties:
+                p.reset()
+        return self.check()
 
-    def step(self):
+    # timers (a design.StepTimers) gets a lap per part, if given
+    def step(self, timers = None):
         self._d.step()
+        if timers != None: timers.lap(DEFINITIONS)
         self._p.step()
-        rr = self.r.check()
-        tt = self.t.check()
-        ss = self.s.check()
-        return self.combine_rts(rr, tt, ss)
+        if timers != None: timers.lap(PROPOSITIONS)
+        ret = self.check()
+        if timers != None: timers.lap(LTL)
+        return ret
@@ -0,0 +1,34 @@
+import numpy as np
+
+class BatchedRandom:
+    # Stand-in for an rng that draws size values per call, so that
+    # lambda rng: -45 + rng.random() * 10 returns (size,) values
+    # BatchedRandom(rng, 4).uniform(0, 1) => rng.uniform(0, 1, size = 4)
+
+    def __init__(self, rng, size):
+        self.rng, self.size = rng, size
+
+    def __getattr__(self, name):
+        method = getattr(self.rng, name)
+        return lambda *args, **kwargs: method(*args, size = self.size, **kwargs)
+
+def draw_initial_conditions(agents, rng, episodes):
+    """
+    Initial features (Car.INIT_FEATURES) of agents for many episodes,
+    drawn from rng: every init function of rng is called once for all
+    episodes (with a BatchedRandom), the others once per episode.
+
+    draw_initial_conditions(env.agents, env.rng, 1000)
+        => (1000, len(agents), 4) array, [e, a] is for agents[a]
+    """
+    ret = np.empty((episodes, len(agents), len(agents[0].INIT_FEATURES) \
+        if len(agents) > 0 else 0))
+    batched = BatchedRandom(rng, episodes)
+    for aid, agent in enumerate(agents):
+        for i, attr in enumerate(agent.INIT_FEATURES):
+            fn = agent.of[attr]
+            if getattr(fn, 'batched', True):
+                ret[:, aid, i] = fn(batched)
+            else:
+                ret[:, aid, i] = [fn(rng) for _ in range(episodes)]
+    return ret
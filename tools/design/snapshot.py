@@ -0,0 +1,91 @@
+import numpy as np
+
+# Types of definition values that can be saved (as float64); agents
+# are saved as their index (AGENT), anything else is not saved (OTHER)
+VALUE_TYPES = [float, bool, int, np.float64, np.bool_, np.int64, np.float32]
+AGENT, OTHER = len(VALUE_TYPES), -1
+
+class SnapshotLayout:
+    """
+    Layout of Environment.snapshot(): everything that affects future
+    steps, in one flat float64 array of size values. The first part
+    holds floats: agent features (the design.Dynamics rows), total
+    reward, definition values. The second part is read as int64 (same
+    bytes): frozen mask, priority owner (agent index, -1 for none),
+    t and value types of the definitions, t and bits of the
+    propositions, verdict and monitor state of every LTL property.
+    Policies, lambdas, the world geometry and renderers are not part of
+    it (they do not change). Definition values that are neither
+    numbers nor agents are left as they are on load (every definition
+    is evaluated again on the next step, only reads of older values
+    would see them). Compare snapshots by their bytes: int64 fields can
+    be NaN as floats.
+
+    layout = SnapshotLayout(env)
+    snap = layout.save() => (layout.size,) float64
+    layout.save(out = snap) => snap, no allocation
+    layout.load(snap)
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.rs = env.reward_structure if env.reward_specified else None
+        self.properties = [] if self.rs == None else \
+            [p for c in [self.rs.r, self.rs.t, self.rs.s] for p in c.properties]
+        if self.rs != None: assert(self.rs._p._n <= 63)
+        self.num_features = env.world.dynamics.data.size
+        num_values = self.rs._d._n if self.rs != None else 0
+        self.floats = self.num_features + 1 + num_values
+        self.ints = 2 + (2 + num_values + 2 if self.rs != None else 0) + \
+            sum([p.size() for p in self.properties])
+        self.size = self.floats + self.ints
+        self.names = {agent.name: aid for aid, agent in enumerate(env.agents)}
+        self.ids = {id(agent): aid for aid, agent in enumerate(env.agents)}
+
+    def save(self, out = None):
+        if out is None: out = np.empty(self.size, dtype = np.float64)
+        assert(out.shape == (self.size,))
+        env, rs = self.env, self.rs
+        floats, ints = out[:self.floats], out[self.floats:].view(np.int64)
+        floats[:self.num_features] = env.world.dynamics.data.ravel()
+        floats[self.num_features] = getattr(env, 'total_reward', 0.0)
+        owner = env.world.priority_manager.current_owner
+        saved = [int(env.agents_drawn), -1 if owner == None else self.names[owner]]
+        if rs != None:
+            t, values = rs._d.save()
+            codes = [self.code(v) for v in values]
+            floats[self.num_features+1:] = [self.ids[id(v)] if c == AGENT else \
+                v if c != OTHER else 0.0 for v, c in zip(values, codes)]
+            saved += [t, len(values)] + codes
+            saved += list(rs._p.save())
+            for p in self.properties:
+                saved += p.save()
+        ints[:] = saved
+        return out
+
+    def code(self, value):
+        if type(value) in VALUE_TYPES: return VALUE_TYPES.index(type(value))
+        return AGENT if id(value) in self.ids else OTHER
+
+    def load(self, snap):
+        assert(snap.shape == (self.size,))
+        env, rs = self.env, self.rs
+        floats, ints = snap[:self.floats], snap[self.floats:].view(np.int64).tolist()
+        data = env.world.dynamics.data
+        data[:] = floats[:self.num_features].reshape(data.shape)
+        env.world.dynamics.changed()
+        env.total_reward = float(floats[self.num_features])
+        env.agents_drawn._d = ints[0]
+        env.world.priority_manager.current_owner = \
+            None if ints[1] == -1 else env.agents[ints[1]].name
+        if rs != None:
+            t, n = ints[2:4]
+            values = floats[self.num_features+1:].tolist()
+            rs._d.load(t, [env.agents[int(v)] if c == AGENT else old if c == OTHER \
+                else VALUE_TYPES[c](v) for v, c, old in zip(values, ints[4:4+n], rs._d)])
+            i = 4+n
+            rs._p.load(ints[i], ints[i+1])
+            i += 2
+            for p in self.properties:
+                p.load(ints[i:i+p.size()])
+                i += p.size()
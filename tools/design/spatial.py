@@ -0,0 +1,146 @@
+import numpy as np
+
+import tools.math as wmath
+
+class AgentIndex:
+    """
+    Spatial index over the agents of a world for neighbour queries.
+    Agents are kept sorted by x and by y, so lane bands and boxes are
+    answered with a binary search instead of a scan over all agents.
+    It follows the batched positions in world.dynamics: on the first
+    query after agents moved (see Dynamics.moves), only the moved rows
+    are taken out of the sorted orders and inserted again at their new
+    positions (a full sort if many moved, or too long ago). Writes to
+    other features (v, acc, ...) do not touch it.
+
+    index = world.agent_index()
+    index.in_box(x1, x2, y1, y2, exclude = car) => [agent, ...] inside
+        the closed box, in world.agents order (bounds may be -/+np.inf)
+    index.any_in_box(x1, x2, y1, y2, exclude = car) => True/False
+    index.rebuilds => number of full sorts so far
+    """
+
+    def __init__(self, dynamics):
+        self.dynamics = dynamics
+        self.agents = dynamics.agents
+        self.rows = {id(agent): i for i, agent in enumerate(self.agents)}
+        self.version = None
+        self.rebuilds = 0
+
+    def update(self):
+        dyn = self.dynamics
+        moves = dyn.moves
+        if moves.version == self.version: return
+        moved = None
+        if self.version is not None:
+            moved = moves.since(self.version, dyn.offset, dyn.offset+dyn.n)
+        self.version = moves.version
+        if moved is None or 8*len(moved) > dyn.n:
+            self.rebuild()
+        elif len(moved) > 0:
+            self.move(moved if len(moved) == 1 else np.unique(moved))
+
+    def rebuild(self):
+        self.rebuilds += 1
+        self.xy = self.dynamics.data[:2].copy()
+        self.order = np.argsort(self.xy, axis = 1, kind = 'stable')
+        self.sorted = np.take_along_axis(self.xy, self.order, axis = 1)
+
+    # Moves each row from its old to its new place in both sorted
+    # orders (shifting the entries in between)
+    def move(self, rows):
+        data = self.dynamics.data
+        for row in rows.tolist():
+            for axis in range(2):
+                order, values = self.order[axis], self.sorted[axis]
+                old, new = self.xy[axis, row], data[axis, row]
+                if old == new: continue
+                p = values.searchsorted(old, 'left')
+                hi = values.searchsorted(old, 'right')
+                if hi-p > 1: p += (order[p:hi] == row).argmax() # ties
+                q = values.searchsorted(new, 'right')
+                if q > p:
+                    q -= 1
+                    order[p:q], values[p:q] = order[p+1:q+1], values[p+1:q+1]
+                else:
+                    q = values.searchsorted(new, 'left')
+                    order[q+1:p+1], values[q+1:p+1] = order[q:p], values[q:p]
+                order[q], values[q] = row, new
+                self.xy[axis, row] = new
+
+    # Rows (sorted) of agents inside the closed box
+    def rows_in_box(self, x1, x2, y1, y2, exclude = None):
+        self.update()
+        # Binary search along x unless the box is unbounded there
+        axis = 1 if np.isinf(x1) and np.isinf(x2) else 0
+        lo, hi = [(x1, x2), (y1, y2)][axis]
+        rows = self.order[axis, np.searchsorted(self.sorted[axis], lo, 'left'):
+            np.searchsorted(self.sorted[axis], hi, 'right')]
+        lo, hi = [(x1, x2), (y1, y2)][1-axis]
+        other = self.xy[1-axis, rows]
+        rows = np.sort(rows[(lo <= other) & (other <= hi)])
+        if exclude is not None:
+            rows = rows[rows != self.rows[id(exclude)]]
+        return rows
+
+    def in_box(self, x1, x2, y1, y2, exclude = None):
+        return [self.agents[i] for i in self.rows_in_box(x1, x2, y1, y2, exclude)]
+
+    def any_in_box(self, x1, x2, y1, y2, exclude = None):
+        return len(self.rows_in_box(x1, x2, y1, y2, exclude)) > 0
+
+class RegionIndex:
+    """
+    Lookup table from points to the static Box regions containing them.
+    The region bounds split each axis into slots (every bound value, and
+    the open intervals between them); a slot is either fully inside or
+    fully outside each box, so a point only needs one binary search per
+    axis. Matches Box.inside, bounds included.
+
+    index = world.region_index()
+    index.inside(x, y) => bool per region, (R,) or (P, R) for P points
+    index.which(x, y, 'Lane') => [Box, ...] containing (x, y) whose name
+        contains 'Lane'
+    index.any(x, y, 'StopRegion') => True/False, or (P,) for P points
+    """
+
+    def __init__(self, regions):
+        self.regions = regions
+        self.size = len(regions)
+        self.boxes = [region for region in regions if type(region) == wmath.Box]
+        bounds = np.array([[b.x1, b.x2, b.y1, b.y2] for b in self.boxes]).reshape(-1, 4)
+        self.x = np.unique(bounds[:, :2])
+        self.y = np.unique(bounds[:, 2:])
+        self.mx = self.table(self.x, bounds[:, 0], bounds[:, 1])
+        self.my = self.table(self.y, bounds[:, 2], bounds[:, 3])
+        self.names = {}
+
+    # Slot 2i+1 is the value v[i], slot 2i the interval before it
+    @staticmethod
+    def table(v, lo, hi):
+        slots = np.zeros((2*len(v)+1, len(lo)), dtype = bool)
+        slots[1::2] = (lo <= v[:, None]) & (v[:, None] <= hi)
+        slots[2:-1:2] = (lo <= v[:-1, None]) & (v[1:, None] <= hi)
+        return slots
+
+    @staticmethod
+    def slot(v, p):
+        i = np.searchsorted(v, p)
+        hit = v[np.minimum(i, len(v)-1)] == p if len(v) > 0 else False
+        return 2*i+hit
+
+    # Regions whose name contains name (cached per name)
+    def name_mask(self, name):
+        if name not in self.names:
+            self.names[name] = np.array([name in b.name for b in self.boxes], dtype = bool)
+        return self.names[name]
+
+    def inside(self, x, y):
+        return self.mx[self.slot(self.x, x)] & self.my[self.slot(self.y, y)]
+
+    def which(self, x, y, name = ''):
+        hits = self.inside(x, y) & self.name_mask(name)
+        return [self.boxes[i] for i in np.flatnonzero(hits)]
+
+    def any(self, x, y, name = ''):
+        return np.any(self.inside(x, y) & self.name_mask(name), axis = -1)
@@ -0,0 +1,76 @@
+import time
+import numpy as np
+
+# Phases of Environment.step, in order. Ego and non-ego dynamics are one
+# batched call (design.Dynamics), so they are one phase
+PHASES = ['policies', 'dynamics', 'definitions', 'propositions', 'ltl', 'other', 'state']
+POLICIES, DYNAMICS, DEFINITIONS, PROPOSITIONS, LTL, OTHER, STATE = range(len(PHASES))
+# Histogram bucket b counts durations in [2**(b-1), 2**b) us (b = 0: < 1 us)
+BUCKETS = 24
+
+class StepTimers:
+    """
+    Always-on wall time counters of the phases of a step: count, total,
+    max and a log2 histogram (in microseconds) per phase. start() marks
+    the beginning of a step, lap(phase) adds the time since the last
+    mark to phase. A lap costs a clock read and a few list updates
+    (counts are the sums of the histograms).
+
+    policies: control inputs of all agents (non-ego policies)
+    dynamics: design.Dynamics.step, ego and non-ego together
+    definitions, propositions, ltl: RewardStructure (SeqPredicates,
+        SeqAP, LTL monitors and rewards)
+    other: rest of evaluate (clipping, bounds, debugging, recording)
+    state: Environment.state()
+
+    timers = env.timers
+    timers.as_dict() => {'dynamics': {'count': ., 'total': . (s),
+        'mean': ., 'max': ., 'histogram': [...]}, ...}
+    timers.snapshot() => {'count': (phases,), 'total': ..., 'max': ...,
+        'histogram': (phases, BUCKETS)} arrays (copies)
+    timers.reset()
+    """
+
+    def __init__(self):
+        self.clock = time.perf_counter
+        self.reset()
+
+    def reset(self):
+        n = len(PHASES)
+        self.total, self.max = [0.0] * n, [0.0] * n
+        self.histogram = [[0] * BUCKETS for _ in range(n)]
+        self.last = self.clock()
+
+    def start(self):
+        self.last = self.clock()
+
+    def lap(self, phase):
+        now = self.clock()
+        dt = now - self.last
+        self.last = now
+        self.total[phase] += dt
+        if dt > self.max[phase]: self.max[phase] = dt
+        b = int(dt * 1e6).bit_length()
+        self.histogram[phase][b if b < BUCKETS else BUCKETS-1] += 1
+
+    @property
+    def count(self):
+        return [sum(h) for h in self.histogram]
+
+    def snapshot(self):
+        return {
+            'count': np.array(self.count, dtype = np.int64),
+            'total': np.array(self.total),
+            'max': np.array(self.max),
+            'histogram': np.array(self.histogram, dtype = np.int64),
+        }
+
+    def as_dict(self):
+        count = self.count
+        return {name: {
+            'count': count[i],
+            'total': self.total[i],
+            'mean': self.total[i] / count[i] if count[i] > 0 else 0.0,
+            'max': self.max[i],
+            'histogram': list(self.histogram[i]),
+        } for i, name in enumerate(PHASES)}
@@ -0,0 +1,142 @@
+import numpy as np
+
+import tools.design as design
+from .timing import StepTimers, POLICIES, DYNAMICS, OTHER
+
+class VectorEnvironment:
+    """
+    N copies of the same Environment scenario stepped together.
+    All copies share the static geometry of the first one, and the
+    agents of all copies live in a single design.Dynamics, so one
+    step() integrates every vehicle of every copy in one call.
+    Finished copies are reset automatically; the last observation
+    before the reset is in info[i]['terminal_observation'].
+
+    venv = VectorEnvironment(craft.OneStoppedCar, 16)
+    venv = VectorEnvironment(lambda: craft.OneStoppedCar(discrete = True), 16)
+    venv = VectorEnvironment(craft.OneStoppedCar, 16, batched_rewards = True)
+        => rewards of all copies through one design.BatchedRewardStructure
+    obs = venv.reset() => (N, obs_dim)
+    venv.seed(0) => every copy gets its own stream (SeedSequence(0).spawn)
+    obs, reward, done, info = venv.step(actions) => actions is (N, 2),
+        or (N,) / (N, 1) for discrete environments
+    Copies that are simultaneous (see design.Environment) are advanced
+    in one design.Dynamics call, others agent by agent, each agent of
+    all copies at once (the same order as stepping each copy).
+    venv.timers => design.StepTimers of policies and dynamics (all
+        copies at once) and other (rewards, states and resets of all
+        copies); env.timers of each copy has its reward phases
+    venv.get_images() => (N, h, w, 3) uint8 frames of all copies, drawn
+        at once by the first copy's design.Rasterizer (reused buffer)
+    """
+
+    def __init__(self, make_env, n, batched_rewards = False):
+        assert(n > 0)
+        self.envs = [make_env() for _ in range(n)]
+        self.num_envs = n
+        for env in self.envs:
+            assert(isinstance(env, design.Environment))
+            assert(env.ready)
+        self.simultaneous = all([env.simultaneous for env in self.envs])
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+
+        # Batched agent state for all copies
+        agents = []
+        self.offsets = []
+        for env in self.envs:
+            self.offsets += [len(agents)]
+            agents += env.agents
+        self.dynamics = design.Dynamics(agents)
+        for env, offset in zip(self.envs, self.offsets):
+            env.world.dynamics = self.dynamics.part(offset, offset+env.num_agents)
+            env.world.share_static(self.envs[0].world)
+        self.timers = StepTimers()
+        self.rewards = None
+        if batched_rewards and self.envs[0].reward_specified:
+            self.rewards = design.BatchedRewardStructure(self.envs, self.dynamics,
+                self.offsets)
+
+    def __len__(self):
+        return self.num_envs
+
+    # seed is one seed for all copies (spawned into independent
+    # streams), or a list of one per copy
+    def seed(self, seed = None):
+        if type(seed) != list:
+            seed = np.random.SeedSequence(seed).spawn(self.num_envs)
+        assert(len(seed) == self.num_envs)
+        for env, s in zip(self.envs, seed):
+            env.seed(s)
+        return seed
+
+    def reset(self):
+        return np.stack([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        assert(len(actions) == self.num_envs)
+        self.timers.start()
+        if self.simultaneous:
+            mapped, rows, inputs = [], [], []
+            for env, offset, action in zip(self.envs, self.offsets, actions):
+                if env.discrete: action = np.atleast_1d(action)
+                action, env_rows, env_inputs = env.control_inputs(action)
+                mapped += [action]
+                rows += [offset+row for row in env_rows]
+                inputs += env_inputs
+            self.timers.lap(POLICIES)
+            self.dynamics.step(inputs, rows)
+            self.timers.lap(DYNAMICS)
+        else:
+            mapped = self.step_agents(actions)
+
+        results = [None] * self.num_envs
+        if self.rewards != None:
+            _, reward, _, info = self.rewards.step()
+            results = [(r, i, env.reward_structure._p.t) \
+                for r, i, env in zip(reward.tolist(), info, self.envs)]
+
+        obs, rewards, dones, infos = [], [], [], []
+        for env, action, result in zip(self.envs, mapped, results):
+            reward, done, info = env.evaluate(action, result)
+            o = env.state(copy = False) # copied by np.stack
+            if done:
+                info['terminal_observation'] = o.copy()
+                o = env.reset()
+            obs += [o]
+            rewards += [reward]
+            dones += [done]
+            infos += [info]
+        ret = np.stack(obs), np.array(rewards), np.array(dones), infos
+        self.timers.lap(OTHER)
+        return ret
+
+    # Environment.step_agents of every copy: copies are independent, so
+    # agent aid can be stepped in all copies at once
+    def step_agents(self, actions):
+        mapped = []
+        for env, action in zip(self.envs, actions):
+            if env.discrete: action = np.atleast_1d(action)
+            mapped += [env.map_action(action)]
+        for aid in self.envs[0].step_order():
+            rows, inputs = [], []
+            for env, offset, action in zip(self.envs, self.offsets, mapped):
+                if not env.agents_drawn[aid]: continue
+                agent = env.agents[aid]
+                rows += [offset+aid]
+                inputs += [action if agent.ego else env.policies[aid](agent)]
+            self.timers.lap(POLICIES)
+            self.dynamics.step(inputs, rows)
+            self.timers.lap(DYNAMICS)
+        return mapped
+
+    def render(self, i = 0, mode = 'human'):
+        return self.envs[i].render(mode = mode)
+
+    def get_images(self, out = None):
+        raster = self.envs[0].get_rasterizer()
+        return raster.render_many([env.world for env in self.envs], out)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
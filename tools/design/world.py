@@ -0,0 +1,202 @@
+import numpy as np
+
+import tools.design as design
+import tools.math as wmath
+
+class World:
+    """
+    Headless world model: static regions, lane width, agents and the
+    priority manager. Nothing here touches pyglet/GL, so environments
+    can be stepped on machines without a display. A tools.pyglet.Canvas
+    can be attached later to draw it.
+
+    static_elements = [
+        ['Grass'],
+        ['TwoLaneRoad', -50, +50, -5, +5, 0.5],
+    ]
+    agents = [
+        ['Ego', -45, -2.5, 0.0, wmath.Direction2D(mode = '+x')],
+    ]
+    world = World(600, 600, static_elements, agents,
+        ox = 300, oy = 300, scale = 600/100)
+    world.agents => [Car, ...]
+    world.dynamics => design.Dynamics over all agents
+    world.allowed_regions => [Box, ...]
+    """
+
+    ALLOWED_STATIC_ELEMENTS = ['Grass', 'Lane', 'Intersection', 'TwoLaneRoad',
+        'StopRegionX', 'StopRegionY']
+    ALLOWED_AGENTS = ['Ego', 'Veh']
+
+    def __init__(self, w, h, static, agents, ox = 0.0, oy = 0.0, scale = 1.0):
+        self.w, self.h = w, h
+        self.static = list(static) # kept around for renderers
+        self.ox, self.oy, self.scale = ox, oy, scale
+        self.allowed_regions = []
+        self.agents = []
+        self.static_ids = {'Lane': 0, 'Intersection': 0,
+            'TwoLaneRoad': 0, 'StopRegion': 0}
+        self.agent_ids = {'Car': 0, 'Ego': 0}
+        self.lane_width = 0
+        # Only x/y stop regions are supported
+        self.stopx = []
+        self.stopy = []
+        self.intersections = []
+        self.priority_manager = design.PriorityManager()
+        self.minx, self.maxx = self.transform_x_inv(0), self.transform_x_inv(w)
+        self.miny, self.maxy = self.transform_y_inv(0), self.transform_y_inv(h)
+        self._add_static_elements(*static)
+        self._add_agents(*agents)
+        self.dynamics = design.Dynamics(self.agents)
+        self._agent_index = None
+        self._region_index = None
+
+    def get_static_id_and_increment(self, x):
+        assert(x in self.static_ids.keys())
+        curr_id = self.static_ids[x]
+        self.static_ids[x] += 1
+        return curr_id, "%s%d" % (x, curr_id)
+
+    def get_agent_id_and_increment(self, x):
+        assert(x in self.agent_ids.keys())
+        curr_id = self.agent_ids[x]
+        self.agent_ids[x] += 1
+        return curr_id, "%s%d" % (x, curr_id)
+
+    # Sets world lane width
+    # This function enforces a consistent lane width throughout the world
+    # If it detects a different lane width, it will throw an error
+    def set_lane_width(self, x1, x2, y1, y2):
+        lane_width = abs(x1-x2) if abs(x1-x2) < abs(y1-y2) else abs(y1-y2)
+        if self.lane_width == 0: self.lane_width = lane_width
+        else: assert(self.lane_width == lane_width)
+
+    # Use the (identical) static geometry of another world instead of
+    # our own copy, eg. for many copies of the same scenario
+    def share_static(self, other):
+        assert(type(other) == World)
+        assert(self.static == other.static)
+        self.allowed_regions = other.allowed_regions
+        self.stopx, self.stopy = other.stopx, other.stopy
+        self.intersections = other.intersections
+        self._region_index = other.region_index()
+
+    def show_allowed_regions(self):
+        for item in self.allowed_regions:
+            print(item)
+
+    def _add_static_elements(self, *args):
+        for item in args:
+            assert(type(item) == list)
+
+            if item[0] == 'Grass':
+                pass # purely visual
+
+            elif item[0] == 'Lane':
+                x1, x2, y1, y2 = item[1:]
+                sid, boxname = self.get_static_id_and_increment('Lane')
+                self.allowed_regions += [wmath.Box(x1, x2, y1, y2, boxname)]
+                self.set_lane_width(x1, x2, y1, y2)
+
+            elif item[0] == 'Intersection':
+                x1, x2, y1, y2 = item[1:]
+                sid, boxname = self.get_static_id_and_increment('Intersection')
+                self.allowed_regions += [wmath.Box(x1, x2, y1, y2, boxname)]
+                self.intersections.append(self.allowed_regions[-1])
+
+            elif item[0] == 'StopRegionX' or item[0] == 'StopRegionY':
+                x1, x2, y1, y2 = item[1:]
+                sid, boxname = self.get_static_id_and_increment('StopRegion')
+                self.allowed_regions += [wmath.Box(x1, x2, y1, y2, boxname)]
+                if 'X' in item[0]: self.stopx.append(self.allowed_regions[-1])
+                if 'Y' in item[0]: self.stopy.append(self.allowed_regions[-1])
+
+            elif item[0] == 'TwoLaneRoad':
+                x1, x2, y1, y2, sep = item[1:]
+                sid, boxname = self.get_static_id_and_increment('TwoLaneRoad')
+                if abs(x1-x2) < abs(y1-y2):
+                    width = abs(x1-x2) / 2
+                    sid1, _ = self.get_static_id_and_increment('Lane')
+                    laneboxname1 = "%s_Lane%d" % (boxname, sid1)
+                    sid2, _ = self.get_static_id_and_increment('Lane')
+                    laneboxname2 = "%s_Lane%d" % (boxname, sid2)
+                    self.allowed_regions += [wmath.Box(x1, x1+width, y1, y2, laneboxname1)]
+                    self.allowed_regions += [wmath.Box(x1+width, x2, y1, y2, laneboxname2)]
+                    self.set_lane_width(x1, x1+width, y1, y2)
+                    self.set_lane_width(x1+width, x2, y1, y2)
+                else:
+                    width = abs(y1-y2) / 2
+                    sid1, _ = self.get_static_id_and_increment('Lane')
+                    laneboxname1 = "%s_Lane%d" % (boxname, sid1)
+                    sid2, _ = self.get_static_id_and_increment('Lane')
+                    laneboxname2 = "%s_Lane%d" % (boxname, sid2)
+                    self.allowed_regions += [wmath.Box(x1, x2, y1, y1+width, laneboxname1)]
+                    self.allowed_regions += [wmath.Box(x1, x2, y1+width, y2, laneboxname2)]
+                    self.set_lane_width(x1, x2, y1, y1+width)
+                    self.set_lane_width(x1, x2, y1+width, y2)
+                self.allowed_regions += [wmath.Box(x1, x2, y1, y2, boxname)]
+
+            else:
+                print('Unsupported static element: %s' % item[0])
+                print('Allowed static elements: %s' % self.ALLOWED_STATIC_ELEMENTS)
+                exit(0)
+
+    def _add_agents(self, *args):
+        ego_taken = False
+        for item in args:
+            assert(type(item) == list)
+
+            if item[0] == 'Ego':
+                assert(not ego_taken)
+                ego_taken = True
+                x, y, v, direction = item[1:]
+                aid, aname = self.get_agent_id_and_increment('Ego')
+                self.agents += [design.Car(x, y, v, True, direction, self, name = aname)]
+
+            elif item[0] == 'Veh':
+                x, y, v, direction = item[1:]
+                aid, aname = self.get_agent_id_and_increment('Car')
+                self.agents += [design.Car(x, y, v, False, direction, self, name = aname)]
+                self.agents[-1].method = 'kinematic_bicycle_Euler' # 'point_mass_Euler'
+
+            else:
+                print('Unsupported agent: %s' % item[0])
+                print('Allowed agents: %s' % self.ALLOWED_AGENTS)
+                exit(0)
+
+    def is_agent_in_bounds(self, agent):
+        return self.minx <= agent.f['x'] <= self.maxx and \
+            self.miny <= agent.f['y'] <= self.maxy
+
+    # Same as is_agent_in_bounds, counted over all agents at once
+    def num_agents_in_bounds(self):
+        x, y = self.dynamics.x, self.dynamics.y
+        return int(np.count_nonzero((self.minx <= x) & (x <= self.maxx) & \
+            (self.miny <= y) & (y <= self.maxy)))
+
+    # Spatial index over the current agent positions (see AgentIndex)
+    def agent_index(self):
+        if self._agent_index is None or self._agent_index.dynamics is not self.dynamics:
+            self._agent_index = design.AgentIndex(self.dynamics)
+        return self._agent_index
+
+    # Lookup table over the static regions (see RegionIndex); rebuilt if
+    # allowed_regions was changed after construction
+    def region_index(self):
+        index = self._region_index
+        if index is None or index.regions is not self.allowed_regions or \
+            len(index.regions) != index.size:
+            self._region_index = design.RegionIndex(self.allowed_regions)
+        return self._region_index
+
+    def transform_x(self, x):
+        return self.ox+x*self.scale
+
+    def transform_y(self, y):
+        return self.oy+y*self.scale
+
+    def transform_x_inv(self, x):
+        return (x-self.ox) / self.scale
+
+    def transform_y_inv(self, y):
+        return (y-self.oy) / self.scale
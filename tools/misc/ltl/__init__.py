@@ -2,4 +2,8 @@ from .parser import * # CocoPy Parser
 from .scanner import * # CocoPy Scanner
 from .bitwise import Bits, AP, SeqAP # Bit-wise manipulation
 from .predicates import SeqPredicates
+from .expression import Expression, P, T, where, minimum, maximum, between, \
+    compile_expression, dependencies # Definitions/propositions as expressions
+from .monitor import CompiledProperty, Monitor, compile_property # Compiled LTL monitors
 from .runtime_verifier import LTLProperty, LTLProperties # LTL property verification
+from .offline import check_traces # Bulk offline trace checking
@@ -1,5 +1,6 @@
 import tools.misc as utilities
 from .predicates import SeqPredicates
+from .expression import compile_items
 from inspect import isfunction
 
 class Bits:
@@ -104,6 +105,7 @@ class SeqAP:
     
     (1) you can also pass extra objects in objs and use them through p.
     (2) you can pass a SeqPredicates object in pre and use it through p.
+    (3) propositions can also be ltl.Expressions (compiled to functions).
 
     class Z: pass
     z = Z()
@@ -132,30 +134,56 @@ class SeqAP:
         assert(type(propositions) == dict)
         assert(type(objs) == dict)
         self._d = Bits()
-        self._p = propositions
+        if pre != None: assert(type(pre) == SeqPredicates)
+        self._p = compile_items(propositions,
+            list(objs)+(pre._k if pre != None else []))
         self._n = len(self._p)
         self._k = list(self._p.keys())
         self.objs = objs
-        if pre != None: assert(type(pre) == SeqPredicates)
         self.pre = pre
+        # After each step, namespace holds objs, pre's predicates and the
+        # propositions (as bits), ie. what RewardChecker passes to the
+        # rewards. It is updated in place, and kept apart from pre's
+        # namespace: predicates never see propositions
+        self.namespace = utilities.combine_dicts({}, objs,
+            pre.get_dict() if pre != None else {})
+        assert(not any([k in self.namespace for k in self._k]))
         self.t = 0
         self.update_data() # initial values
 
     def update_data(self):
-        evaluated = utilities.combine_dicts({}, self.objs)
+        evaluated = self.namespace
         if self.pre != None:
             assert(self.pre.t == self.t)
-            evaluated = utilities.combine_dicts(evaluated, self.pre.get_dict())
-        for i, func in enumerate(self._p.values()):
+            evaluated.update(zip(self.pre._k, self.pre))
+        # later propositions see the values of earlier ones; the bits
+        # are assembled into one integer
+        mask = 0
+        for i, (key, func) in enumerate(self._p.items()):
             if not isfunction(func):
-                evaluated[self._k[i]] = func
-            else:   
-                evaluated[self._k[i]] = func(evaluated, self.t)
-            self._d[i] = evaluated[self._k[i]]          
+                evaluated[key] = func
+            else:
+                evaluated[key] = func(evaluated, self.t)
+            if evaluated[key]: mask |= 1 << i
+        self._d._d = mask
+        for i, key in enumerate(self._k):
+            evaluated[key] = (mask >> i) & 1
 
     def reset(self):
         self.t = 0
 
+    # t and the bits of the last step; pre is saved on its own
+    def save(self):
+        return self.t, self._d._d
+
+    def load(self, t, mask):
+        self.t, self._d._d = t, mask
+        evaluated = self.namespace
+        if self.pre != None:
+            evaluated.update(zip(self.pre._k, self.pre))
+        for i, key in enumerate(self._k):
+            evaluated[key] = (mask >> i) & 1
+
     def step(self):
         self.t += 1
         self.update_data() # initial values
@@ -0,0 +1,296 @@
+import functools
+import operator
+import numpy as np
+
+# Node kinds of an expression
+CONST, NAME, TIME, ITEM, ATTR, CALL, UNARY, BINARY, WHERE = range(9)
+
+# Python operators (numbers) are also elementwise on arrays; logical
+# operators are only numpy's for arrays
+def logical_not(x):
+    return np.logical_not(x) if type(x) == np.ndarray else not x
+
+def logical_and(a, b):
+    if type(a) == np.ndarray or type(b) == np.ndarray: return np.logical_and(a, b)
+    return bool(a) and bool(b)
+
+def logical_or(a, b):
+    if type(a) == np.ndarray or type(b) == np.ndarray: return np.logical_or(a, b)
+    return bool(a) or bool(b)
+
+UNARY_OPS = {
+    'neg': operator.neg, 'abs': abs, 'not': logical_not,
+}
+BINARY_OPS = {
+    'add': operator.add, 'sub': operator.sub, 'mul': operator.mul,
+    'div': operator.truediv, 'pow': operator.pow,
+    'lt': operator.lt, 'le': operator.le, 'gt': operator.gt,
+    'ge': operator.ge, 'eq': operator.eq, 'ne': operator.ne,
+    'and': logical_and, 'or': logical_or,
+    'min': np.minimum, 'max': np.maximum,
+}
+
+def wrap(x):
+    return x if type(x) == Expression else Expression(CONST, x)
+
+class Expression:
+    """
+    Definitions and propositions of a SeqPredicates/SeqAP (and so of
+    a RewardStructure) can be written as expressions instead of lambdas.
+    P stands for p, T for t; operators build a tree, which is compiled
+    once into a function of (p, t). The same function works on numbers
+    and on (N,) numpy arrays (eg. in a design.BatchedRewardStructure).
+    Lambdas are still accepted.
+
+    &, |, ~ are logical and, or, not (both sides are evaluated), and
+    a <= x <= b is between(x, a, b). Attributes and method calls on
+    objects of p, eg. P['ego'].Lp(x, y), are passed through as is.
+
+    "deviation": abs(P['mid_lane']-P['ego'].f['y'])
+        => lambda p, t: abs(p['mid_lane']-p['ego'].f['y'])
+    "stopped": (T > 0) & (P['ego'].f['v'] == 0)
+        => lambda p, t: t > 0 and p['ego'].f['v'] == 0
+    "out": ~P['ego'].any_regions() | ~between(P['ego'].f['y'], -5, 5)
+    compile_expression(e) => kernel, kernel(p, t) => value
+    dependencies({"a": e1, "b": e2}) => {"a": {names e1 reads}, ...}
+    """
+
+    __slots__ = ['op', 'args']
+    __array_ufunc__ = None # numpy defers to our reflected operators
+    __hash__ = None
+
+    def __init__(self, op, *args):
+        self.op, self.args = op, args
+
+    def __getitem__(self, index):
+        return Expression(ITEM, self, index)
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        return Expression(ATTR, self, name)
+
+    # Only for attributes: P['ego'].Lp(x, y)
+    def __call__(self, *args):
+        assert(self.op == ATTR)
+        return Expression(CALL, self, *[wrap(a) for a in args])
+
+    def __repr__(self):
+        k = key(self)
+        return "Expression%s" % (k,) if k != None else "Expression(%d, ...)" % self.op
+
+    def __neg__(self): return Expression(UNARY, 'neg', self)
+    def __abs__(self): return Expression(UNARY, 'abs', self)
+    def __invert__(self): return Expression(UNARY, 'not', self)
+
+    def __add__(self, x): return Expression(BINARY, 'add', self, wrap(x))
+    def __radd__(self, x): return Expression(BINARY, 'add', wrap(x), self)
+    def __sub__(self, x): return Expression(BINARY, 'sub', self, wrap(x))
+    def __rsub__(self, x): return Expression(BINARY, 'sub', wrap(x), self)
+    def __mul__(self, x): return Expression(BINARY, 'mul', self, wrap(x))
+    def __rmul__(self, x): return Expression(BINARY, 'mul', wrap(x), self)
+    def __truediv__(self, x): return Expression(BINARY, 'div', self, wrap(x))
+    def __rtruediv__(self, x): return Expression(BINARY, 'div', wrap(x), self)
+    def __pow__(self, x): return Expression(BINARY, 'pow', self, wrap(x))
+    def __rpow__(self, x): return Expression(BINARY, 'pow', wrap(x), self)
+    def __and__(self, x): return Expression(BINARY, 'and', self, wrap(x))
+    def __rand__(self, x): return Expression(BINARY, 'and', wrap(x), self)
+    def __or__(self, x): return Expression(BINARY, 'or', self, wrap(x))
+    def __ror__(self, x): return Expression(BINARY, 'or', wrap(x), self)
+    def __lt__(self, x): return Expression(BINARY, 'lt', self, wrap(x))
+    def __le__(self, x): return Expression(BINARY, 'le', self, wrap(x))
+    def __gt__(self, x): return Expression(BINARY, 'gt', self, wrap(x))
+    def __ge__(self, x): return Expression(BINARY, 'ge', self, wrap(x))
+    def __eq__(self, x): return Expression(BINARY, 'eq', self, wrap(x))
+    def __ne__(self, x): return Expression(BINARY, 'ne', self, wrap(x))
+
+    def __bool__(self):
+        raise TypeError("use &, |, ~ (or between) instead of and, or, not")
+
+class Names:
+    # P: P['ego'] is p['ego']
+
+    def __getitem__(self, key):
+        return Expression(NAME, key)
+
+P = Names()
+T = Expression(TIME)
+
+def where(condition, a, b):
+    return Expression(WHERE, wrap(condition), wrap(a), wrap(b))
+
+def minimum(a, b):
+    return Expression(BINARY, 'min', wrap(a), wrap(b))
+
+def maximum(a, b):
+    return Expression(BINARY, 'max', wrap(a), wrap(b))
+
+def between(x, a, b):
+    return (wrap(a) <= x) & (wrap(x) <= b)
+
+# A constant (or item index) in a key: numbers, strings and None by
+# type and value, tuples of those, slices as ('slice', start, stop,
+# step); None for anything else (eg. arrays), which is never cached
+def const_key(x):
+    if x is None or isinstance(x, (int, float, bool, str, np.number, np.bool_)):
+        return (type(x).__name__, x)
+    if type(x) == slice:
+        bounds = (x.start, x.stop, x.step)
+        if not all([b is None or isinstance(b, (int, np.integer)) for b in bounds]):
+            return None
+        return ('slice',) + bounds
+    if type(x) == tuple:
+        items = [const_key(v) for v in x]
+        return None if None in items else ('tuple',) + tuple(items)
+    return None
+
+# Hashable structure of an expression, or None if some constant has
+# none (see const_key)
+def key(e):
+    if e.op == CONST:
+        k = const_key(e.args[0])
+        return None if k == None else (CONST,) + k
+    ret = [e.op]
+    for a in e.args:
+        if type(a) == Expression: k = key(a)
+        elif e.op == ITEM: k = const_key(a)
+        else: k = a # names and operators
+        if k == None: return None
+        ret += [k]
+    return tuple(ret)
+
+# Names of p read by an expression
+def names(e):
+    if e.op == NAME: return {e.args[0]}
+    ret = set()
+    for a in e.args:
+        if type(a) == Expression: ret |= names(a)
+    return ret
+
+# Dependency graph of definitions/propositions: key => names it reads,
+# or None for lambdas (not inspected)
+def dependencies(items):
+    return {k: names(v) if type(v) == Expression else None for k, v in items.items()}
+
+def is_path(e):
+    return e.op == NAME or (e.op in [ITEM, ATTR] and is_path(e.args[0]))
+
+# Maximal subexpressions that only read p (or t): the inputs. A method
+# call reads its object and its arguments
+def inputs(e):
+    if e.op == TIME or is_path(e): return [e]
+    args = e.args
+    if e.op == CALL: args = (args[0].args[0],) + args[1:]
+    ret = []
+    for a in args:
+        if type(a) == Expression: ret += inputs(a)
+    return ret
+
+def has_call(e):
+    return e.op == CALL or any([has_call(a) for a in e.args if type(a) == Expression])
+
+def build(e):
+    op, args = e.op, e.args
+    if op == CONST:
+        value = args[0]
+        return lambda p, t: value
+    elif op == NAME:
+        name = args[0]
+        return lambda p, t: p[name]
+    elif op == TIME:
+        return lambda p, t: t
+    elif op == ITEM:
+        obj, index = build(args[0]), args[1]
+        return lambda p, t: obj(p, t)[index]
+    elif op == ATTR:
+        obj, name = build(args[0]), args[1]
+        return lambda p, t: getattr(obj(p, t), name)
+    elif op == CALL:
+        obj, name = build(args[0].args[0]), args[0].args[1]
+        fns = [build(a) for a in args[1:]]
+        return lambda p, t: getattr(obj(p, t), name)(*[f(p, t) for f in fns])
+    elif op == UNARY:
+        fn, x = UNARY_OPS[args[0]], build(args[1])
+        return lambda p, t: fn(x(p, t))
+    elif op == BINARY:
+        fn, a, b = BINARY_OPS[args[0]], build(args[1]), build(args[2])
+        return lambda p, t: fn(a(p, t), b(p, t))
+    elif op == WHERE:
+        c, a, b = [build(x) for x in args]
+        return lambda p, t: np.where(c(p, t), a(p, t), b(p, t))[()]
+    assert(False)
+
+# What an input is compared by: numbers by value, arrays and objects
+# with features (agents) by their values; None if unknown
+def snapshot(value):
+    if isinstance(value, (int, float, bool, str, np.number, np.bool_)):
+        return value
+    if type(value) == np.ndarray:
+        return (value.shape, tuple(value.ravel().tolist()))
+    data = getattr(getattr(value, 'f', None), 'data', None)
+    if type(data) == np.ndarray:
+        return (id(value), tuple(data.tolist()))
+    return None
+
+CACHE_SIZE = 256
+MEMO_SIZE = 1024
+
+def _compile(e):
+    body = build(e)
+    if not has_call(e):
+        return body
+    # Method calls (eg. any_regions) are the expensive part; skip them if
+    # no input changed since the last call with the same p (methods are
+    # taken to depend only on their object's features and arguments)
+    sources = [build(i) for i in inputs(e)]
+    memos = {}
+    def kernel(p, t):
+        state = [snapshot(f(p, t)) for f in sources]
+        if any([s is None for s in state]): return body(p, t)
+        memo = memos.get(id(p))
+        if memo != None and memo[0] == state: return memo[1]
+        result = body(p, t)
+        if len(memos) >= MEMO_SIZE: memos.clear()
+        memos[id(p)] = (state, result)
+        return result
+    return kernel
+
+@functools.lru_cache(maxsize = CACHE_SIZE)
+def _compile_cached(keyed):
+    return _compile(keyed.e)
+
+# Expressions with the same structure share one kernel
+class Keyed:
+    __slots__ = ['k', 'e']
+
+    def __init__(self, e, k):
+        self.k, self.e = k, e
+
+    def __hash__(self):
+        return hash(self.k)
+
+    def __eq__(self, other):
+        return self.k == other.k
+
+# Expressions with constants that have no key (eg. arrays) get a kernel
+# of their own
+def compile_expression(e):
+    assert(type(e) == Expression)
+    k = key(e)
+    if k == None: return _compile(e)
+    return _compile_cached(Keyed(e, k))
+
+compile_expression.cache_info = _compile_cached.cache_info
+compile_expression.cache_clear = _compile_cached.cache_clear
+
+# Definitions/propositions with their expressions compiled; an
+# expression may only read names given (eg. objs) and earlier keys
+def compile_items(items, given = ()):
+    known = set(given)
+    ret = {}
+    for k, v in items.items():
+        if type(v) == Expression:
+            assert(names(v) <= known) # read before it is evaluated
+            v = compile_expression(v)
+        ret[k] = v
+        known.add(k)
+    return ret
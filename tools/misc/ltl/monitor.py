@@ -0,0 +1,363 @@
+import sys
+import functools
+
+from .scanner import Scanner
+from .parser import Parser, Errors
+
+# Node kinds of a compiled property
+LEAF, AP, CONST, NOT, AND, OR, IMPL, TEMPORAL = range(8)
+# Temporal operators
+UNTIL, FINALLY, GLOBALLY, NEXT = range(4)
+
+class CompiledProperty:
+    """
+    An LTL property parsed once into a tree. Maximal subformulas without
+    temporal operators become leaves whose verdict only depends on the
+    bits of the state they read, so they are memoized on (state & mask).
+    Purely propositional properties are a single leaf, i.e. a dict
+    lookup per state. The compiled form is immutable apart from the
+    memo, so it can be shared by any number of Monitors.
+
+    c = CompiledProperty("a => (b U c)", {"a": 0, "b": 1, "c": 2})
+    c.propositional => False
+    c.num_slots => 1 (number of temporal operators)
+    """
+
+    def __init__(self, x, APdict):
+        self.x = x
+        self.APdict = dict(APdict)
+        self.la = Scanner(self.x).tokens.next
+        self.num_slots = 0
+        root = self.Property()
+        if self.la.kind != 0: self.SynErr(0)
+        del self.la
+        self.root = self.leafify(root)
+        self.propositional = self.root[0] == LEAF
+
+    # Same messages (and exit) as Parser, without touching the global
+    # Errors state used by Parser instances
+    def SemErr(self, msg):
+        Errors.printMsg(self.x, self.la.line, self.la.col, msg)
+        Errors.count += 1
+        sys.exit(1)
+
+    def SynErr(self, n):
+        self.SemErr(Parser.errorMessages[n])
+
+    def Get(self):
+        token = self.la
+        self.la = self.la.next
+        return token
+
+    # Property = Implication ["U" Implication] | ("F" | "G" | "X") Implication
+    # An Implication without U is passed through as is
+    def Property(self):
+        if Parser.set[1][self.la.kind]:
+            left = self.Implication()
+            if self.la.kind == 2:
+                self.Get()
+                right = self.Implication()
+                return self.temporal(UNTIL, left, right)
+            return left
+        elif self.la.kind in [3, 4, 5]:
+            op = {3: FINALLY, 4: GLOBALLY, 5: NEXT}[self.Get().kind]
+            return self.temporal(op, self.Implication(), None)
+        self.SynErr(15)
+
+    def temporal(self, op, left, right):
+        self.num_slots += 1
+        return (TEMPORAL, self.num_slots-1, op, left, right)
+
+    def Implication(self):
+        result = self.Disjunction()
+        if self.la.kind == 6:
+            self.Get()
+            result = (IMPL, result, self.Disjunction())
+        return result
+
+    def Disjunction(self):
+        items = [self.Conjunction()]
+        while self.la.kind == 7:
+            self.Get()
+            items += [self.Conjunction()]
+        return items[0] if len(items) == 1 else (OR, items)
+
+    def Conjunction(self):
+        items = [self.Factor()]
+        while self.la.kind == 8:
+            self.Get()
+            items += [self.Factor()]
+        return items[0] if len(items) == 1 else (AND, items)
+
+    def Factor(self):
+        neg = False
+        if self.la.kind == 9:
+            self.Get()
+            neg = True
+        if self.la.kind == 1:
+            if self.la.val not in self.APdict:
+                self.SemErr("unrecognized proposition")
+            result = (AP, 1 << self.APdict[self.Get().val])
+        elif self.la.kind == 10:
+            self.Get()
+            result = (CONST, Parser.TRUE)
+        elif self.la.kind == 11:
+            self.Get()
+            result = (CONST, Parser.FALSE)
+        elif self.la.kind == 12:
+            self.Get()
+            result = self.Property()
+            if self.la.kind != 13: self.SynErr(13)
+            self.Get()
+        else:
+            self.SynErr(16)
+        return (NOT, result) if neg else result
+
+    # Wrap maximal subtrees without temporal operators in memoized leaves
+    def leafify(self, node):
+        mask = self.mask(node)
+        if mask != None: return (LEAF, mask, node, {})
+        kind = node[0]
+        if kind == NOT: return (NOT, self.leafify(node[1]))
+        if kind in [AND, OR]: return (kind, [self.leafify(n) for n in node[1]])
+        if kind == IMPL: return (IMPL, self.leafify(node[1]), self.leafify(node[2]))
+        slot, op, left, right = node[1:]
+        return (TEMPORAL, slot, op, self.leafify(left),
+            None if right == None else self.leafify(right))
+
+    # Bits read by a propositional subtree, None if it is temporal
+    def mask(self, node):
+        kind = node[0]
+        if kind == AP: return node[1]
+        if kind == CONST: return 0
+        if kind == TEMPORAL: return None
+        children = node[1] if kind in [AND, OR] else node[1:]
+        ret = 0
+        for child in children:
+            m = self.mask(child)
+            if m == None: return None
+            ret |= m
+        return ret
+
+# Compiled properties are shared process-wide, keyed by the formula and
+# the AP ordering; the least recently used ones are evicted
+CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize = CACHE_SIZE)
+def _compile_cached(x, APitems):
+    return CompiledProperty(x, dict(APitems))
+
+def compile_property(x, APdict):
+    return _compile_cached(x, tuple(sorted(APdict.items(), key = lambda i: i[1])))
+
+compile_property.cache_info = _compile_cached.cache_info
+compile_property.cache_clear = _compile_cached.cache_clear
+
+class Monitor:
+    """
+    Runtime state of one CompiledProperty over a trace. Gives the same
+    TRUE/FALSE/UNDECIDED verdicts as Parser.CheckIncremental, but only
+    keeps the current state and a few integers per temporal operator
+    instead of re-scanning tokens and growing a trace list.
+
+    m = Monitor(CompiledProperty("a U b", {"a": 0, "b": 1}))
+    m.check_incremental(0b01) => Parser.TRUE
+    m.reset()
+    m.check([0b01, 0b10]) => Parser.TRUE
+    """
+
+    def __init__(self, compiled):
+        assert(type(compiled) == CompiledProperty)
+        self.compiled = compiled
+        n = compiled.num_slots
+        # Per temporal operator; Parser keeps these on the scanner tokens
+        self.result = [None] * n
+        self.index = [0] * n
+        self.until = [None] * n
+        self.reset()
+
+    def reset(self):
+        self.step = 0
+        self.maxfactor = -1
+        self.state = 0
+
+    # Runtime state as size() ints (None as -1), eg. for snapshots
+    def size(self):
+        return 3 + 3*self.compiled.num_slots
+
+    def save(self):
+        ret = [self.step, self.maxfactor, self.state]
+        for r, i, u in zip(self.result, self.index, self.until):
+            ret += [-1 if r == None else r, i, -1 if u == None else int(u)]
+        return ret
+
+    def load(self, values):
+        self.step, self.maxfactor, self.state = values[:3]
+        self.result[:] = [None if r == -1 else r for r in values[3::3]]
+        self.index[:] = values[4::3]
+        self.until[:] = [None if u == -1 else bool(u) for u in values[5::3]]
+
+    # Checks an entire trace, includes reset
+    def check(self, trace):
+        self.reset()
+        result = Parser.UNDECIDED
+        for state in trace:
+            result = self.check_incremental(state)
+            if result != Parser.UNDECIDED: break
+        return result
+
+    # check_incremental of a propositional property whose verdict was
+    # computed elsewhere (eg. for many states at once): same state after
+    def advance(self, state):
+        self.state = state
+        self.step += 1
+        self.maxfactor = 0
+
+    def check_incremental(self, state):
+        root = self.compiled.root
+        self.state = state
+        if root[0] == LEAF: # propositional, decided at every step
+            self.step += 1
+            self.maxfactor = 0
+            return self.leaf(root)
+        result = Parser.UNDECIDED
+        while self.step > self.maxfactor and result == Parser.UNDECIDED:
+            if root[0] == TEMPORAL:
+                result = self.temporal(root, 0)
+            else:
+                result = self.implication(root, 0)
+        self.step += 1
+        return result
+
+    def SemErr(self, msg):
+        Errors.printMsg(self.compiled.x, 0, 0, msg)
+        Errors.count += 1
+        sys.exit(1)
+
+    def leaf(self, node):
+        key = self.state & node[1]
+        memo = node[3]
+        if key not in memo:
+            memo[key] = self.evaluate(node[2], 0)
+        return memo[key]
+
+    # An Implication evaluated at index reads all its factors at index
+    def implication(self, node, index):
+        if index > self.maxfactor:
+            self.maxfactor = index
+        return self.evaluate(node, index)
+
+    def evaluate(self, node, index):
+        kind = node[0]
+        if kind == LEAF:
+            return self.leaf(node)
+        elif kind == AP:
+            return Parser.TRUE if self.state & node[1] else Parser.FALSE
+        elif kind == CONST:
+            return node[1]
+        elif kind == NOT:
+            return Parser.TRUE - self.evaluate(node[1], index)
+        elif kind == AND:
+            # every child is evaluated, temporal children keep state
+            result = self.evaluate(node[1][0], index)
+            for child in node[1][1:]:
+                r2 = self.evaluate(child, index)
+                if result == Parser.FALSE or r2 == Parser.FALSE:
+                    result = Parser.FALSE
+                elif result == Parser.UNDECIDED or r2 == Parser.UNDECIDED:
+                    result = Parser.UNDECIDED
+                else:
+                    result = Parser.TRUE
+            return result
+        elif kind == OR:
+            result = self.evaluate(node[1][0], index)
+            for child in node[1][1:]:
+                r2 = self.evaluate(child, index)
+                if result == Parser.TRUE or r2 == Parser.TRUE:
+                    result = Parser.TRUE
+                elif result == Parser.UNDECIDED or r2 == Parser.UNDECIDED:
+                    result = Parser.UNDECIDED
+                else:
+                    result = Parser.FALSE
+            return result
+        elif kind == IMPL:
+            result = self.evaluate(node[1], index)
+            r2 = self.evaluate(node[2], index)
+            if result == Parser.FALSE or r2 == Parser.TRUE:
+                return Parser.TRUE
+            elif result == Parser.TRUE and r2 == Parser.FALSE:
+                return Parser.FALSE
+            elif result == Parser.UNDECIDED or r2 == Parser.UNDECIDED:
+                return Parser.UNDECIDED
+            self.SemErr("unrecognized argument")
+        return self.temporal(node, index)
+
+    # Mirrors Parser.Property for U, F, G and X
+    def temporal(self, node, index):
+        _, slot, op, left, right = node
+        R, I = self.result, self.index
+        if self.step == 0:
+            R[slot] = Parser.UNDECIDED
+            I[slot] = 0
+        if index > I[slot]:
+            I[slot] = index
+            R[slot] = Parser.UNDECIDED
+
+        if op == UNTIL:
+            result = self.implication(left, I[slot] if self.until[slot] else index)
+            if self.step == 0: R[slot] = result
+            if result == Parser.UNDECIDED:
+                self.SemErr("first argument of U is UNDECIDED")
+            self.until[slot] = True
+            r2 = self.implication(right, I[slot])
+            if R[slot] == Parser.UNDECIDED:
+                if r2 == Parser.TRUE:
+                    result = R[slot] = Parser.TRUE
+                elif result == Parser.FALSE:
+                    R[slot] = result
+                else:
+                    result = Parser.UNDECIDED
+                    I[slot] += 1
+            else:
+                result = R[slot]
+
+        elif op == FINALLY:
+            result = self.implication(left, I[slot])
+            if R[slot] == Parser.UNDECIDED:
+                if result == Parser.TRUE:
+                    R[slot] = result
+                elif result == Parser.FALSE:
+                    result = Parser.UNDECIDED
+                    I[slot] += 1
+                else:
+                    result = Parser.UNDECIDED
+            else:
+                result = R[slot]
+
+        elif op == GLOBALLY:
+            result = self.implication(left, I[slot])
+            if R[slot] == Parser.UNDECIDED:
+                if result == Parser.FALSE:
+                    R[slot] = Parser.FALSE
+                elif result == Parser.TRUE:
+                    result = Parser.UNDECIDED
+                    I[slot] += 1
+                else:
+                    result = Parser.UNDECIDED
+            else:
+                result = R[slot]
+
+        else: # NEXT
+            result = self.implication(left, I[slot])
+            if I[slot] == index + 1:
+                if result != Parser.UNDECIDED:
+                    R[slot] = result
+                    I[slot] += 1
+            elif I[slot] == index:
+                I[slot] += 1
+                result = Parser.UNDECIDED
+            elif index > I[slot]:
+                self.SemErr("X has lost synchronization: index = {}, start.index = {}".
+                    format(index, I[slot]))
+
+        return result
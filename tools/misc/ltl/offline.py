@@ -0,0 +1,99 @@
+import numpy as np
+
+from .parser import Parser
+from .monitor import LEAF, AP, CONST, NOT, AND, OR, IMPL, TEMPORAL, \
+    UNTIL, FINALLY, GLOBALLY, NEXT, Monitor, compile_property
+
+def check_traces(traces, formulas, APdict, lengths = None):
+    """
+    Checks recorded traces offline against a list of formulas, with the
+    same verdicts as running an LTLProperty/Monitor over each episode
+    until it is decided.
+
+    Propositional formulas, and U/F/G/X over propositional operands, are
+    evaluated on whole arrays at once; any other formula falls back to
+    one Monitor run per episode.
+
+    traces => (episodes, timesteps) AP bitmasks, eg. int(ap) per step
+    lengths => (episodes,) valid timesteps per episode (default: all)
+    steps, verdicts = check_traces(traces, ["a U b", "G not c"],
+        {"a": 0, "b": 1, "c": 2}, lengths)
+    steps[e, i] => first step at which formulas[i] is decided on episode
+        e, or -1 if it never is
+    verdicts[e, i] => Parser.TRUE/FALSE/UNDECIDED
+    """
+    traces = np.asarray(traces, dtype = np.int64)
+    assert(traces.ndim == 2)
+    E, T = traces.shape
+    if lengths is None: lengths = np.full(E, T)
+    lengths = np.asarray(lengths, dtype = int)
+    assert(lengths.shape == (E,) and np.all((0 <= lengths) & (lengths <= T)))
+    valid = np.arange(T)[None, :] < lengths[:, None]
+
+    steps = np.full((E, len(formulas)), -1)
+    verdicts = np.full((E, len(formulas)), Parser.UNDECIDED)
+    for i, formula in enumerate(formulas):
+        compiled = compile_property(formula, APdict)
+        if vectorizable(compiled.root):
+            steps[:, i], verdicts[:, i] = check_vectorized(compiled.root,
+                traces, valid)
+        else:
+            monitor = Monitor(compiled)
+            for e in range(E):
+                monitor.reset()
+                for t in range(lengths[e]):
+                    result = monitor.check_incremental(int(traces[e, t]))
+                    if result != Parser.UNDECIDED:
+                        steps[e, i], verdicts[e, i] = t, result
+                        break
+    return steps, verdicts
+
+# A propositional root, or a temporal root over propositional operands
+def vectorizable(root):
+    if root[0] == LEAF: return True
+    if root[0] != TEMPORAL: return False
+    _, slot, op, left, right = root
+    return left[0] == LEAF and (right is None or right[0] == LEAF)
+
+def check_vectorized(root, traces, valid):
+    E, T = traces.shape
+    if T == 0: # nothing is decided on empty traces
+        return np.full(E, -1), np.full(E, Parser.UNDECIDED)
+    op = None if root[0] == LEAF else root[2]
+    if op in [FINALLY, GLOBALLY]:
+        # F is only ever decided TRUE, G only ever FALSE
+        hit = (evaluate(root[3], traces) == (op == FINALLY)) & valid
+        decided = np.any(hit, axis = 1)
+        step = np.argmax(hit, axis = 1)
+        value = np.full(E, op == FINALLY)
+    else:
+        # Propositional formulas and U (on its left operand, like the
+        # monitor) are decided on the first state, X on the second
+        step = 1 if op == NEXT else 0
+        if step >= T:
+            return np.full(E, -1), np.full(E, Parser.UNDECIDED)
+        decided = valid[:, step]
+        value = evaluate(root if op is None else root[3], traces[:, step])
+    steps = np.where(decided, step, -1)
+    verdicts = np.where(decided, np.where(value, Parser.TRUE, Parser.FALSE),
+        Parser.UNDECIDED)
+    return steps, verdicts
+
+# Boolean value of a propositional subtree on an array of states
+def evaluate(node, states):
+    kind = node[0]
+    if kind == LEAF:
+        return evaluate(node[2], states)
+    elif kind == AP:
+        return (states & node[1]) != 0
+    elif kind == CONST:
+        return np.full(states.shape, node[1] == Parser.TRUE)
+    elif kind == NOT:
+        return ~evaluate(node[1], states)
+    elif kind == AND:
+        return np.logical_and.reduce([evaluate(n, states) for n in node[1]])
+    elif kind == OR:
+        return np.logical_or.reduce([evaluate(n, states) for n in node[1]])
+    elif kind == IMPL:
+        return ~evaluate(node[1], states) | evaluate(node[2], states)
+    assert(False)
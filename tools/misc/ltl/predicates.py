@@ -1,5 +1,6 @@
 import tools.misc as utilities
 from inspect import isfunction
+from .expression import compile_items
 
 class SeqPredicates:
     """Sequential predicates. Pass in predicates as
@@ -7,6 +8,7 @@ class SeqPredicates:
     Less efficient than SeqAP (no bitwise storage).
 
     Additionally, you can also pass extra objects and use them through p.
+    Predicates can also be ltl.Expressions (compiled to functions).
 
     class Z: pass
     z = Z()
@@ -32,25 +34,38 @@ class SeqPredicates:
         assert(type(predicates) == dict)
         assert(type(objs) == dict)
         self._d = {}
-        self._p = predicates
+        self._p = compile_items(predicates, objs)
         self._n = len(self._p)
         self._k = list(self._p.keys())
         self.objs = objs
+        # One namespace (objs, then predicates) updated in place on
+        # every step; a SeqAP with this as pre copies the predicates
+        assert(not any([k in objs for k in self._k]))
+        self.namespace = utilities.combine_dicts({}, objs)
         self.t = 0
         self.update_data() # initial values
 
     def update_data(self):
-        evaluated = utilities.combine_dicts({}, self.objs)
-        for i, func in enumerate(self._p.values()):
+        evaluated = self.namespace
+        for i, (key, func) in enumerate(self._p.items()):
             if not isfunction(func):
-                evaluated[self._k[i]] = func
+                evaluated[key] = func
             else:
-                evaluated[self._k[i]] = func(evaluated, self.t)
-            self._d[i] = evaluated[self._k[i]]          
+                evaluated[key] = func(evaluated, self.t)
+            self._d[i] = evaluated[key]
 
     def reset(self):
         self.t = 0
 
+    # t and the values of the last step (they are seen by the next one)
+    def save(self):
+        return self.t, [self._d[i] for i in range(self._n)]
+
+    def load(self, t, values):
+        self.t = t
+        for i, (key, value) in enumerate(zip(self._k, values)):
+            self._d[i] = self.namespace[key] = value
+
     def step(self):
         self.t += 1
         self.update_data() # initial values
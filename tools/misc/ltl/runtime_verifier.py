@@ -1,6 +1,6 @@
-from .scanner import Scanner
-from .parser import Parser, Errors
+from .parser import Parser
 from .bitwise import AP, SeqAP
+from .monitor import Monitor, compile_property
 
 class LTLProperty(object):
     """
@@ -22,22 +22,19 @@ class LTLProperty(object):
     def __init__(self, x, reward = 0, propositions = {}, mode = 'violation', active = True):
         assert(mode in ['violation', 'satisfaction'])
         assert(type(propositions) == dict)
-        self.parser = Parser()
         self.x = x
         self.reward = reward
         self.active = active
         self.mode = mode
 
-        #: initialise the Errors class to give meaningful messages when calling parser.SetProperty
-        Errors.Init(self.x, "", False, self.parser.getParsingPos,
-                    self.parser.errorMessages)
-
         self._p = propositions
 
         # If propositions is {"A": func1(...), "B": func2(...)},
-        # parser.APdict = {"A": 0, "B": 1}
-        self.parser.APdict = {key: i for i, key in enumerate(self._p.keys())}
-        self.parser.SetProperty(Scanner(self.x))
+        # APdict = {"A": 0, "B": 1}
+        # The compiled property is shared by all instances with the same
+        # formula and APs; the monitor only keeps our runtime state
+        APdict = {key: i for i, key in enumerate(self._p.keys())}
+        self.monitor = Monitor(compile_property(self.x, APdict))
         self.mc_status = Parser.UNDECIDED
         self.status = False
 
@@ -56,22 +53,42 @@ class LTLProperty(object):
 
     # Reset property
     def reset(self):
-        self.parser.ResetProperty()
+        self.monitor.reset()
         self.mc_status = Parser.UNDECIDED
         self.status = False
 
+    # Verdict and monitor state as size() ints (see Monitor.save)
+    def size(self):
+        return 2 + self.monitor.size()
+
+    def save(self):
+        return [self.mc_status, int(self.status)] + self.monitor.save()
+
+    def load(self, values):
+        self.mc_status, self.status = values[0], bool(values[1])
+        self.monitor.load(values[2:])
+
     # Check property against complete trace
     def check(self, trace):
         if self.active:
-            self.mc_status = self.parser.Check(trace)
+            self.mc_status = self.monitor.check(trace)
         return self.mc_status
 
     # Add next_state to current trace and re-check
     def check_incremental(self, next_state):
         if self.active:
-            self.mc_status = self.parser.CheckIncremental(next_state)
+            self.mc_status = self.monitor.check_incremental(next_state)
         return self.mc_status
 
+    # Same as check_incremental for a propositional property whose
+    # verdict on next_state is already known, then update_status
+    def set_verdict(self, next_state, mc_status):
+        assert(self.monitor.compiled.propositional)
+        if self.active:
+            self.monitor.advance(next_state)
+            self.mc_status = mc_status
+        return self.update_status()
+
     # Returns status, info
     def __call__(self, next_state = None):
         if next_state != None:
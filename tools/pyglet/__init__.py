@@ -1,3 +1,6 @@
+from .cache import TextureCache, textures
 from .shapes import Shape, Rectangle
-from .groups import Group, Text, Image, InfiniteRepeatImage
+from .groups import Layers, Group, Text, Image, InfiniteRepeatImage
+from .road import Grass, Lane, Intersection, TwoLaneRoad, StopRegion
+from .vehicle import Vehicle
 from .canvas import Canvas
\ No newline at end of file
@@ -0,0 +1,54 @@
+import collections
+import pyglet
+
+class TextureCache:
+    """
+    Process-wide cache of images loaded from files, keyed by path. Each
+    file is read and decoded once, and its texture created once, for all
+    Images, InfiniteRepeatImages (so all road groups and vehicles) of
+    all canvases. Beyond size entries, the least recently used one is
+    dropped; sprites already using it keep it.
+
+    textures = graphics.textures
+    textures.get(url) => texture (shared, do not change its anchor;
+        use texture.get_region(...) for that)
+    textures.get(url, tileable = True) => TileableTexture, for blit_tiled
+    textures.hits, textures.misses
+    textures.clear()
+    """
+
+    def __init__(self, size = 64):
+        assert(size > 0)
+        self.size = size
+        self.entries = collections.OrderedDict() # (url, kind) => image
+        self.hits, self.misses = 0, 0
+
+    @staticmethod
+    def load(url):
+        assert(url[-3:] in ['png'])
+        if url[-3:] == 'png': decoder = pyglet.image.codecs.png.PNGImageDecoder()
+        return pyglet.image.load(url, decoder = decoder)
+
+    def lookup(self, key, create):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = create()
+        self.entries[key] = value
+        while len(self.entries) > self.size:
+            self.entries.popitem(last = False)
+        return value
+
+    def get(self, url, tileable = False):
+        image = self.lookup((url, 'image'), lambda: self.load(url))
+        if tileable:
+            return self.lookup((url, 'tileable'),
+                lambda: pyglet.image.TileableTexture.create_for_image(image))
+        return self.lookup((url, 'texture'), image.get_texture)
+
+    def clear(self):
+        self.entries.clear()
+
+textures = TextureCache()
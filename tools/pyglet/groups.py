@@ -1,7 +1,21 @@
 import pyglet
 from pyglet import gl
 
-# Collection of shapes, and possibly other collections
+import tools.pyglet as graphics
+
+# Draw order within a batch: background below road textures (and
+# sprites), shapes (markings) on top of them, text on top of all
+class Layers:
+
+    def __init__(self):
+        self.background = pyglet.graphics.OrderedGroup(0)
+        self.images = pyglet.graphics.OrderedGroup(1)
+        self.shapes = pyglet.graphics.OrderedGroup(2)
+        self.text = pyglet.graphics.OrderedGroup(3)
+
+# Collection of shapes, and possibly other collections. Either drawn
+# item by item (draw), or added once to a pyglet.graphics.Batch
+# (add_to), which then draws everything with the same state at once
 class Group:
     
     def __init__(self, items = []):
@@ -11,6 +25,14 @@ class Group:
         for item in self.items:
             item.draw()
 
+    def add_to(self, batch, layers):
+        for item in self.items:
+            if isinstance(item, pyglet.sprite.Sprite):
+                item.group = layers.images
+                item.batch = batch
+            else:
+                item.add_to(batch, layers)
+
 # Collection with a single pyglet label
 class Text(Group):
 
@@ -18,18 +40,26 @@ class Text(Group):
         multiline = False, multiline_width = None):
         
         if multiline and multiline_width == None: multiline_width = 300
-        label = pyglet.text.Label(text, font_size = fontsize, color = color,
+        self.args = dict(text = text, font_size = fontsize, color = color,
             x = x, y = y, multiline = multiline, width = multiline_width)
-        super().__init__(items = [label])
+        super().__init__(items = [pyglet.text.Label(**self.args)])
+
+    # Labels cannot change batch, so a new one is made in it
+    def add_to(self, batch, layers):
+        self.items[0].delete()
+        self.items = [pyglet.text.Label(batch = batch, group = layers.text,
+            **self.args)]
 
-# Collection with a single image
+# Collection with a single image; the texture comes from
+# graphics.textures, so each file is only loaded once
 class Image(Group):
 
     def __init__(self, url, x, y, w, h, rotation = 0, anchor_centered = False):
-        assert(url[-3:] in ['png'])
-        if url[-3:] == 'png': decoder = pyglet.image.codecs.png.PNGImageDecoder()
-        image = pyglet.image.load(url, decoder = decoder)
-        if anchor_centered: image.anchor_x, image.anchor_y = image.width//2, image.height//2
+        image = graphics.textures.get(url)
+        if anchor_centered:
+            # own region, the cached texture is shared
+            image = image.get_region(0, 0, image.width, image.height)
+            image.anchor_x, image.anchor_y = image.width//2, image.height//2
         scale_x, scale_y = w/image.width, h/image.height
         sprite = pyglet.sprite.Sprite(img = image)
         sprite.update(x = x, y = y, scale_x = scale_x, scale_y = scale_y,
@@ -39,12 +69,19 @@ class Image(Group):
 class InfiniteRepeatImage(Group):
 
     def __init__(self, url, canvas):
-        assert(url[-3:] in ['png'])
-        if url[-3:] == 'png': decoder = pyglet.image.codecs.png.PNGImageDecoder()
-        image = pyglet.image.load(url, decoder = decoder)
-        self.bg = pyglet.image.TileableTexture.create_for_image(image)
+        self.bg = graphics.textures.get(url, tileable = True)
         self.h, self.w = canvas.width, canvas.height
         super().__init__(items = [self.bg])
     
     def draw(self):
-        self.bg.blit_tiled(0, 0, 0, self.h, self.w)
\ No newline at end of file
+        self.bg.blit_tiled(0, 0, 0, self.h, self.w)
+
+    # Same quad as blit_tiled (textures repeat by default)
+    def add_to(self, batch, layers):
+        bg, w, h = self.bg, self.h, self.w
+        u1, v1 = bg.anchor_x/bg.width, bg.anchor_y/bg.height
+        u2, v2 = u1 + w/bg.width, v1 + h/bg.height
+        t = bg.tex_coords
+        batch.add(4, gl.GL_QUADS, pyglet.graphics.TextureGroup(bg, layers.background),
+            ('v2f', (0, 0, w, 0, w, h, 0, h)),
+            ('t3f', (u1, v1, t[2], u2, v1, t[5], u2, v2, t[8], u1, v2, t[11])))
\ No newline at end of file
@@ -4,18 +4,21 @@ from pyglet import gl
 # Basic shape, dummy class
 class Shape: pass
 
-# Basic rectangle
+# Basic rectangle; a quad of vertex arrays, drawn on its own (draw) or
+# as part of a batch (add_to), never in immediate mode
 class Rectangle(Shape):
     
     def __init__(self, x1, x2, y1, y2, color = (0, 0, 0, 1)):
         self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
         self.color = color
+
+    def vertices(self):
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        return ('v2f', (x1, y1, x1, y2, x2, y2, x2, y1)), \
+            ('c4f', tuple(self.color)*4)
     
     def draw(self):
-        gl.glBegin(gl.GL_QUADS)
-        gl.glColor4f(*self.color)
-        gl.glVertex3f(self.x1, self.y1, 0)
-        gl.glVertex3f(self.x1, self.y2, 0)
-        gl.glVertex3f(self.x2, self.y2, 0)
-        gl.glVertex3f(self.x2, self.y1, 0)
-        gl.glEnd()
+        pyglet.graphics.draw(4, gl.GL_QUADS, *self.vertices())
+
+    def add_to(self, batch, layers):
+        batch.add(4, gl.GL_QUADS, layers.shapes, *self.vertices())
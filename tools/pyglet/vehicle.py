@@ -0,0 +1,29 @@
+import numpy as np
+
+import tools.pyglet as graphics
+import tools.misc as utilities
+
+# Sprite for a single design.Car, kept in sync with its features
+class Vehicle(graphics.Group):
+
+    def __init__(self, agent, world):
+        self.agent = agent
+        self.world = world
+        w = agent.VEHICLE_X * world.scale
+        h = agent.VEHICLE_Y * world.scale
+        vehicle_url = utilities.get_file_from_root('static/vehicle.png')
+        car = graphics.Image(vehicle_url, 0, 0, w, h, anchor_centered = True)
+        super().__init__(items = [car])
+        self.sprite = car.items[0]
+        self.update()
+
+    def update(self):
+        x = self.world.transform_x(self.agent.f['x'])
+        y = self.world.transform_y(self.agent.f['y'])
+        self.sprite.update(x = x, y = y,
+            rotation = np.rad2deg(self.agent.f['theta']))
+
+    # Hidden sprites stay in their batch, but are not drawn
+    def show(self, visible):
+        if self.sprite.visible != visible:
+            self.sprite.visible = visible